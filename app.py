@@ -3,17 +3,16 @@
 # Main application file for YT Media Backup
 
 import os
-import time
+import sqlite3
 import threading
 import atexit
-import webview
 from flask import Flask
 from werkzeug.serving import make_server
 
 # Import modules
 from modules.routes.ui import ui_routes
 from modules.routes.api import api_routes
-from modules.config.settings import SECRET_KEY, window
+from modules.config.settings import SECRET_KEY, SERVER_START_TIMEOUT, window
 
 # Initialize Flask app
 app = Flask(__name__, static_folder='static', template_folder='templates')
@@ -23,19 +22,46 @@ app.config['SECRET_KEY'] = SECRET_KEY
 app.register_blueprint(ui_routes)
 app.register_blueprint(api_routes)
 
+# Set once the server is listening and SERVER_PORT is known
+server_ready = threading.Event()
+
 # Function to start the Flask server
 def start_server():
     server = make_server('127.0.0.1', 0, app)
     port = server.server_port
     app.config['SERVER_PORT'] = port
+    # The socket is bound and listening, so requests from here on queue up
+    # until serve_forever picks them up
+    server_ready.set()
     server.serve_forever()
 
+def warm_up():
+    """Load the download modules and reopen the databases while the window opens
+    
+    Nothing here is needed to show the first page; doing it in the
+    background means the first download or history request finds it ready.
+    """
+    from modules.download.jobs import job_manager
+    from modules.config.history import history_store
+    
+    # Queue again the downloads the last run did not finish
+    job_manager.resume()
+    
+    try:
+        # Opens the history database, importing the old JSON history on first run
+        history_store.version()
+    except sqlite3.Error as e:
+        print(f"Error opening download history: {e}")
+
 # Main function to start the application
 # Function to clean up when application exits
 def cleanup():
-    # Save any pending download history
-    from modules.config.settings import save_download_history
-    save_download_history()
+    # Close the databases so their write-ahead logs are checkpointed; jobs
+    # still in the journal are resumed on the next start
+    from modules.config.history import history_store
+    from modules.download.journal import job_journal
+    history_store.close()
+    job_journal.close()
 
 # Register the cleanup function
 atexit.register(cleanup)
@@ -46,11 +72,17 @@ def main():
     server_thread.daemon = True
     server_thread.start()
     
-    # Give the server a moment to start
-    time.sleep(1)
+    threading.Thread(target=warm_up, name='warm-up', daemon=True).start()
+    
+    # pywebview is only needed for the window, so it loads while the server starts
+    import webview
+    
+    # Wait until the server is listening instead of guessing how long it takes
+    if not server_ready.wait(SERVER_START_TIMEOUT):
+        raise RuntimeError(f'Server did not start within {SERVER_START_TIMEOUT} seconds')
     
     # Get the port Flask is running on
-    port = app.config.get('SERVER_PORT', 5000)
+    port = app.config['SERVER_PORT']
     
     # Start the PyWebView window
     global window
@@ -0,0 +1,192 @@
+#!/usr/bin/env python3
+# benchmarks/async_load.py
+# Load test: /api/download-status latency with many concurrent clients, per server
+#
+# Run from the project root:
+#   python -m benchmarks.async_load                          # 500 pollers against each server
+#   python -m benchmarks.async_load --clients 2000 --streams 200 --servers builtin asyncio
+#
+# Each server runs in its own process with a job whose progress keeps
+# changing, as during a busy download. Pollers here each request the
+# status in a loop, one connection per request; --streams adds clients
+# that hold /api/events open the whole time, as open browser tabs do.
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# threaded: the development server app.py uses; builtin: daemon.py's
+# PooledWSGIServer; asyncio: daemon.py --server asyncio
+SERVER_KINDS = ('threaded', 'builtin', 'asyncio')
+SERVER_THREADS = 16
+REQUEST_TIMEOUT = 30
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+def serve(kind):
+    """Child process: serve the API with a churning job, print the port, run until stdin closes"""
+    from flask import Flask
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from modules.routes.api import api_routes
+    from modules.download.jobs import DownloadJob, job_manager
+    from modules.utils.server import make_daemon_server
+
+    app = Flask(__name__)
+    app.register_blueprint(api_routes)
+    if kind == 'threaded':
+        class QuietHandler(WSGIRequestHandler):
+            def log_request(self, *args, **kwargs):
+                pass
+        server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    elif kind == 'asyncio':
+        from modules.routes.async_api import AsyncAPI
+        server = make_daemon_server(app, '127.0.0.1', 0, SERVER_THREADS, 'asyncio', AsyncAPI().routes())
+    else:
+        server = make_daemon_server(app, '127.0.0.1', 0, SERVER_THREADS, 'builtin')
+
+    job = DownloadJob('https://example.com/load', tempfile.gettempdir())
+    with job_manager.lock:
+        job_manager.jobs[job.id] = job
+        job_manager.latest_job_id = job.id
+
+    def churn():
+        i = 0
+        while True:
+            i += 1
+            job.state.update({'status': 'downloading', 'progress': i % 100, 'total_progress': i % 100})
+            time.sleep(0.01)
+
+    threading.Thread(target=churn, daemon=True).start()
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(server.server_port, flush=True)
+    sys.stdin.read()
+
+async def request(port, path):
+    """One GET on a fresh connection; returns the status code"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(f'GET {path} HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n'.encode('latin-1'))
+        await writer.drain()
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+async def hold_stream(port, opened):
+    """Keep an /api/events stream open, reading what the server pushes"""
+    try:
+        reader, writer = await asyncio.open_connection('127.0.0.1', port)
+        writer.write(b'GET /api/events HTTP/1.0\r\nHost: 127.0.0.1\r\n\r\n')
+        await writer.drain()
+        await reader.readline()
+        opened.append(True)
+        while await reader.read(65536):
+            pass
+    except (OSError, asyncio.CancelledError):
+        pass
+
+async def load(port, clients, streams, duration):
+    latencies = []
+    errors = 0
+    opened = []
+
+    stream_tasks = [asyncio.create_task(hold_stream(port, opened)) for _ in range(streams)]
+    if streams:
+        # Give the streams a moment to connect before polling starts
+        await asyncio.sleep(1)
+
+    async def poll(deadline):
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            try:
+                status = await asyncio.wait_for(request(port, '/api/download-status'), REQUEST_TIMEOUT)
+            except (OSError, asyncio.TimeoutError, IndexError, ValueError):
+                errors += 1
+                continue
+            if status != 200:
+                errors += 1
+                continue
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(poll(deadline) for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+
+    for task in stream_tasks:
+        task.cancel()
+    await asyncio.gather(*stream_tasks, return_exceptions=True)
+
+    return {
+        'clients': clients,
+        'streams': streams,
+        'streams_open': len(opened),
+        'requests': len(latencies),
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / elapsed, 1),
+        'ms_p50': round(percentile(latencies, 0.5), 3),
+        'ms_p99': round(percentile(latencies, 0.99), 3),
+    }
+
+def run_server(kind, clients, streams, duration):
+    """Start a server process of the given kind and load it"""
+    workspace = tempfile.mkdtemp(prefix='ytmb-load-')
+    log = open(os.path.join(workspace, 'server.log'), 'w+')
+    child = subprocess.Popen([sys.executable, '-m', 'benchmarks.async_load', '--serve', kind],
+                             cwd=workspace, env=dict(os.environ, PYTHONPATH=PROJECT_ROOT),
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=log, text=True)
+    try:
+        line = child.stdout.readline()
+        if not line.strip():
+            log.seek(0)
+            raise RuntimeError(f'{kind} server failed to start:\n{log.read()}')
+        return asyncio.run(load(int(line), clients, streams, duration))
+    finally:
+        child.stdin.close()
+        try:
+            child.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            child.kill()
+        log.close()
+        shutil.rmtree(workspace, ignore_errors=True)
+
+def run(servers=SERVER_KINDS, clients=500, streams=0, duration=5.0):
+    return {kind: run_server(kind, clients, streams, duration) for kind in servers}
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compare /api/download-status latency across servers.')
+    parser.add_argument('--servers', nargs='+', choices=SERVER_KINDS, default=list(SERVER_KINDS))
+    parser.add_argument('--clients', type=int, default=500, help='concurrent pollers (default 500)')
+    parser.add_argument('--streams', type=int, default=0, help='/api/events streams held open meanwhile')
+    parser.add_argument('--duration', type=float, default=5.0, help='seconds of polling per server')
+    parser.add_argument('--output', help='also write the results to this JSON file')
+    parser.add_argument('--serve', choices=SERVER_KINDS, help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.serve:
+        serve(args.serve)
+        return
+
+    results = run(args.servers, args.clients, args.streams, args.duration)
+    for kind, result in results.items():
+        print(f"{kind:9} p50 {result['ms_p50']:9.1f} ms  p99 {result['ms_p99']:9.1f} ms  "
+              f"{result['requests_per_second']:8.1f} req/s  {result['errors']} errors"
+              + (f"  {result['streams_open']}/{result['streams']} streams" if result['streams'] else ''))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# benchmarks/progress_hook.py
+# Microbenchmark of DownloadProgress.progress_hook overhead per call
+#
+# Run from the project root:  python -m benchmarks.progress_hook
+
+import time
+from modules.download.jobs import DownloadJob
+from modules.download.media import DownloadProgress
+
+CALLS = 200000
+
+def make_reports(entries=4):
+    """Fake yt-dlp "downloading" reports, cycling through a few entries"""
+    reports = []
+    for i in range(entries):
+        info = {'id': f'video{i}'}
+        for chunk in range(50):
+            reports.append({
+                'status': 'downloading',
+                'filename': f'/tmp/video{i}.webm',
+                'downloaded_bytes': chunk * 1024,
+                'total_bytes': 50 * 1024,
+                'speed': 1024 * 1024,
+                'eta': 50 - chunk,
+                'info_dict': info
+            })
+    return reports
+
+def run(min_interval):
+    """Return (nanoseconds per hook call, state versions published)"""
+    job = DownloadJob('https://example.com/playlist', '/tmp', 'audio', 'playlist')
+    tracker = DownloadProgress(total_files=4, job=job, min_interval=min_interval)
+    reports = make_reports()
+    hook = tracker.progress_hook
+
+    start = time.perf_counter()
+    for i in range(CALLS):
+        hook(reports[i % len(reports)])
+    elapsed = time.perf_counter() - start
+    return elapsed / CALLS * 1e9, job.state.version
+
+def main():
+    for label, interval in (('coalesced (0.2s)', 0.2), ('every call', 0)):
+        ns_per_call, versions = run(interval)
+        print(f"{label:18} {ns_per_call:8.0f} ns/call  {versions:7d} state updates")
+
+if __name__ == '__main__':
+    main()
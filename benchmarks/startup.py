@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# benchmarks/startup.py
+# Cold start benchmark: time from launching the app to the first page being served
+#
+# Run from the project root:  python -m benchmarks.startup
+
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ROUNDS = 5
+
+# Starts the app the way app.main() does, minus the pywebview window, and
+# prints the port once the server is listening
+CHILD = '''
+import sys, threading
+sys.path.insert(0, {root!r})
+import app
+threading.Thread(target=app.start_server, daemon=True).start()
+threading.Thread(target=app.warm_up, daemon=True).start()
+app.server_ready.wait()
+print(app.app.config['SERVER_PORT'], flush=True)
+sys.stdin.read()
+'''
+
+def fetch(url):
+    with urllib.request.urlopen(url) as response:
+        return response.status, response.read()
+
+def wait_for(url, timeout=30):
+    """Request url until it answers 200; the body must be complete"""
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            status, body = fetch(url)
+            if status == 200 and body:
+                return
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+        time.sleep(0.002)
+
+def launch():
+    """Seconds from process start to: server ready, first page served, API answering"""
+    # A fresh working directory, so every launch starts without data/
+    workspace = tempfile.mkdtemp(prefix='ytmb-startup-')
+    log = open(os.path.join(workspace, 'app.log'), 'w+')
+    start = time.perf_counter()
+    child = subprocess.Popen([sys.executable, '-c', CHILD.format(root=PROJECT_ROOT)], cwd=workspace,
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=log, text=True)
+    try:
+        line = child.stdout.readline()
+        if not line.strip():
+            log.seek(0)
+            raise RuntimeError(f'App failed to start:\n{log.read()}')
+        port = int(line)
+        ready = time.perf_counter() - start
+
+        # What the window loads first; once it is served the page can paint
+        base_url = f'http://127.0.0.1:{port}'
+        wait_for(f'{base_url}/')
+        first_paint = time.perf_counter() - start
+
+        # The first status poll needs the download modules, loaded by warm_up
+        wait_for(f'{base_url}/api/download-status')
+        api_ready = time.perf_counter() - start
+    finally:
+        child.stdin.close()
+        child.wait(timeout=10)
+        log.close()
+        shutil.rmtree(workspace, ignore_errors=True)
+    return {'server_ready': ready, 'first_paint': first_paint, 'api_ready': api_ready}
+
+def run(rounds=ROUNDS):
+    """Median and worst of each startup milestone over rounds launches, in milliseconds"""
+    launches = [launch() for _ in range(rounds)]
+    results = {'rounds': rounds}
+    for milestone in launches[0]:
+        values = [launch_times[milestone] * 1000 for launch_times in launches]
+        results[milestone] = {'ms_median': round(statistics.median(values), 1), 'ms_max': round(max(values), 1)}
+    return results
+
+def main():
+    results = run()
+    for milestone in ('server_ready', 'first_paint', 'api_ready'):
+        print(f"{milestone:13} {results[milestone]['ms_median']:8.1f} ms median  "
+              f"{results[milestone]['ms_max']:8.1f} ms max")
+
+if __name__ == '__main__':
+    main()
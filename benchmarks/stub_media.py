@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# benchmarks/stub_media.py
+# Local stand-in for a media site: an HTTP server with synthetic files and
+# a yt-dlp extractor for it, so benchmarks run without network access
+
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import yt_dlp
+from yt_dlp.extractor.common import InfoExtractor
+from yt_dlp.utils import OnDemandPagedList
+
+class MediaHandler(BaseHTTPRequestHandler):
+    """Serves /media/<id>.<ext> as server.file_size bytes of filler, honouring Range"""
+    protocol_version = 'HTTP/1.1'
+    chunk = b'\0' * 65536
+
+    def do_HEAD(self):
+        self.do_GET(body=False)
+
+    def do_GET(self, body=True):
+        if not re.match(r'^/media/[\w-]+\.\w+$', self.path):
+            self.send_error(404)
+            return
+
+        size = self.server.file_size
+        start, end = 0, size - 1
+        match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if match and int(match.group(1)) >= size:
+            # What a real server answers when a resumed .part is already complete
+            self.send_response(416)
+            self.send_header('Content-Range', f'bytes */{size}')
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        if match:
+            start = int(match.group(1))
+            end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            self.send_response(206)
+            self.send_header('Content-Range', f'bytes {start}-{end}/{size}')
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(end - start + 1))
+        self.send_header('Accept-Ranges', 'bytes')
+        self.end_headers()
+
+        remaining = end - start + 1 if body else 0
+        while remaining > 0:
+            data = self.chunk[:min(remaining, len(self.chunk))]
+            self.wfile.write(data)
+            remaining -= len(data)
+
+    def log_message(self, format, *args):
+        pass
+
+class MediaServer:
+    """Threaded HTTP server on a free local port, serving synthetic media"""
+    def __init__(self, file_size=1024 * 1024):
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), MediaHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.file_size = file_size
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        return f'http://127.0.0.1:{self.httpd.server_port}'
+
+    def set_file_size(self, file_size):
+        self.httpd.file_size = file_size
+
+    def video_url(self, video_id):
+        return f'{self.base_url}/video/{video_id}'
+
+    def playlist_url(self, entries):
+        return f'{self.base_url}/playlist/bench{entries}?entries={entries}'
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class StubIE(InfoExtractor):
+    """Extractor for MediaServer URLs: /video/<id> and /playlist/<id>?entries=<n>
+
+    Videos have one opus audio format stored as .opus, so the fast audio
+    profile passes them through and no ffmpeg is needed.
+    """
+    IE_NAME = 'stub'
+    _VALID_URL = r'https?://127\.0\.0\.1:\d+/(?P<kind>video|playlist)/(?P<id>[\w-]+)'
+    # Seconds each video extraction takes, standing in for format and signature resolution
+    extract_delay = 0
+    # Playlists are listed a page at a time, as sites' playlist APIs are:
+    # entries per page, and seconds fetching each page takes
+    page_size = 100
+    page_delay = 0
+
+    def _real_extract(self, url):
+        kind, item_id = self._match_valid_url(url).group('kind', 'id')
+        base_url = re.match(r'https?://[^/]+', url).group(0)
+
+        if kind == 'playlist':
+            count = int(re.search(r'entries=(\d+)', url).group(1))
+
+            def page(pagenum):
+                if self.page_delay:
+                    time.sleep(self.page_delay)
+                for i in range(pagenum * self.page_size, min((pagenum + 1) * self.page_size, count)):
+                    yield self.url_result(f'{base_url}/video/{item_id}-{i}', StubIE, f'{item_id}-{i}',
+                                          f'Stub video {item_id} {i}')
+
+            entries = OnDemandPagedList(page, self.page_size)
+            return self.playlist_result(entries, item_id, f'Stub playlist {item_id}')
+
+        if self.extract_delay:
+            time.sleep(self.extract_delay)
+        return {
+            'id': item_id,
+            'title': f'Stub video {item_id}',
+            'webpage_url': url,
+            'duration': 180,
+            'formats': [{
+                'format_id': 'audio',
+                'url': f'{base_url}/media/{item_id}.opus',
+                'ext': 'opus',
+                'acodec': 'opus',
+                'vcodec': 'none',
+            }],
+        }
+
+_original_add_default_info_extractors = yt_dlp.YoutubeDL.add_default_info_extractors
+
+def install_stub_extractor():
+    """Make every YoutubeDL the app creates try StubIE first
+
+    Only for benchmark processes; the app itself never imports this module.
+    """
+    def add_default_info_extractors(ydl):
+        ydl.add_info_extractor(StubIE())
+        _original_add_default_info_extractors(ydl)
+    yt_dlp.YoutubeDL.add_default_info_extractors = add_default_info_extractors
@@ -0,0 +1,382 @@
+#!/usr/bin/env python3
+# benchmarks/suite.py
+# Offline benchmark suite, writing its results as JSON
+#
+# Run from the project root:
+#   python -m benchmarks.suite                          # everything, results in benchmarks/results/
+#   python -m benchmarks.suite --only download startup  # a subset
+#   python -m benchmarks.suite --compare benchmarks/results/old.json
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESULTS_DIR = os.path.join(PROJECT_ROOT, 'benchmarks', 'results')
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)] if values else 0
+
+def bench_download(server, entries=20, file_size=2 * 1024 * 1024):
+    """End-to-end download_media of a stub playlist, one entry at a time and in parallel"""
+    from modules.download.jobs import DownloadJob
+    from modules.download.media import download_media
+
+    server.set_file_size(file_size)
+    results = {}
+    for parallel in (1, 3):
+        output_dir = tempfile.mkdtemp(prefix='bench-download-')
+        job = DownloadJob(server.playlist_url(entries), output_dir, 'audio', 'playlist', parallel, False, 'fast')
+        start = time.perf_counter()
+        download_media(job.url, output_dir, 'audio', 'playlist', job=job, parallel_entries=parallel,
+                       use_archive=False, audio_profile='fast')
+        elapsed = time.perf_counter() - start
+        succeeded = job.state.get('succeeded_entries', 0)
+        results[f'parallel_{parallel}'] = {
+            'status': job.state['status'],
+            'entries': succeeded,
+            'seconds': round(elapsed, 3),
+            'entries_per_second': round(succeeded / elapsed, 2),
+            'mb_per_second': round(succeeded * file_size / elapsed / 1e6, 2),
+        }
+    return results
+
+def bench_preresolve(server, entries=20, file_size=256 * 1024, resolve_delay=0.3):
+    """Playlist of short tracks that are slow to resolve, with and without resolving ahead"""
+    from benchmarks.stub_media import StubIE
+    from modules.download import media
+    from modules.download.jobs import DownloadJob
+
+    server.set_file_size(file_size)
+    StubIE.extract_delay = resolve_delay
+    default_ahead = media.PRERESOLVE_AHEAD
+    results = {}
+    try:
+        for ahead in (0, max(default_ahead, 1)):
+            media.PRERESOLVE_AHEAD = ahead
+            output_dir = tempfile.mkdtemp(prefix='bench-preresolve-')
+            job = DownloadJob(server.playlist_url(entries), output_dir, 'audio', 'playlist', 1, False, 'fast')
+            start = time.perf_counter()
+            media.download_media(job.url, output_dir, 'audio', 'playlist', job=job, parallel_entries=1,
+                                 use_archive=False, audio_profile='fast')
+            elapsed = time.perf_counter() - start
+            succeeded = job.state.get('succeeded_entries', 0)
+            results[f'ahead_{ahead}'] = {
+                'status': job.state['status'],
+                'entries': succeeded,
+                'seconds': round(elapsed, 3),
+                'entries_per_second': round(succeeded / elapsed, 2),
+            }
+    finally:
+        media.PRERESOLVE_AHEAD = default_ahead
+        StubIE.extract_delay = 0
+    return results
+
+def bench_listing(server, entries=100, page_size=25, page_delay=0.5, file_size=64 * 1024):
+    """Playlist whose pages are slow to list: time until the first file is done, and in all"""
+    from benchmarks.stub_media import StubIE
+    from modules.download.jobs import DownloadJob
+    from modules.download.media import download_media
+
+    server.set_file_size(file_size)
+    StubIE.page_size, StubIE.page_delay = page_size, page_delay
+    output_dir = tempfile.mkdtemp(prefix='bench-listing-')
+    job = DownloadJob(server.playlist_url(entries), output_dir, 'audio', 'playlist', 3, False, 'fast')
+    first_file = []
+
+    def watch():
+        while not first_file and job.state.get('status') not in ('completed', 'completed_with_errors', 'error'):
+            if job.state.get('completed_files'):
+                first_file.append(time.perf_counter())
+            time.sleep(0.01)
+
+    start = time.perf_counter()
+    threading.Thread(target=watch, daemon=True).start()
+    try:
+        download_media(job.url, output_dir, 'audio', 'playlist', job=job, parallel_entries=3,
+                       use_archive=False, audio_profile='fast')
+    finally:
+        StubIE.page_size, StubIE.page_delay = 100, 0
+    elapsed = time.perf_counter() - start
+    return {
+        'status': job.state['status'],
+        'entries': job.state.get('succeeded_entries', 0),
+        'listing_seconds': round(entries / page_size * page_delay, 3),
+        'first_file_seconds': round(first_file[0] - start, 3) if first_file else None,
+        'seconds': round(elapsed, 3),
+    }
+
+def bench_extractions(server, entries=5):
+    """yt-dlp extractions per job, checked against what each kind of URL needs
+
+    A single video is extracted once, by the probe, and downloaded from
+    that info. A playlist is extracted once and each entry once more,
+    whether look-ahead resolves it or the download does; a playlist URL in
+    single mode also extracts its first video. More than that means some
+    path is extracting the same thing twice, which fails the suite.
+    """
+    from modules.download import media
+    from modules.download.jobs import DownloadJob
+
+    server.set_file_size(64 * 1024)
+    cases = (
+        ('single_video', server.video_url('extractions'), 'single', media.PRERESOLVE_AHEAD, 1),
+        ('playlist', server.playlist_url(entries), 'playlist', media.PRERESOLVE_AHEAD, entries + 1),
+        ('playlist_without_lookahead', server.playlist_url(entries), 'playlist', 0, entries + 1),
+        ('playlist_single_mode', server.playlist_url(entries), 'single', media.PRERESOLVE_AHEAD, 2),
+    )
+    default_ahead = media.PRERESOLVE_AHEAD
+    results = {}
+    try:
+        for label, url, mode, ahead, expected in cases:
+            media.PRERESOLVE_AHEAD = ahead
+            output_dir = tempfile.mkdtemp(prefix='bench-extractions-')
+            job = DownloadJob(url, output_dir, 'audio', mode, 3, False, 'fast')
+            media.download_media(url, output_dir, 'audio', mode, job=job, parallel_entries=3,
+                                 use_archive=False, audio_profile='fast')
+            results[label] = {'status': job.state['status'], 'extractions': job.state['extractions'],
+                              'expected': expected}
+    finally:
+        media.PRERESOLVE_AHEAD = default_ahead
+
+    wrong = {label: result for label, result in results.items()
+             if result['extractions'] != result['expected'] or result['status'] != 'completed'}
+    if wrong:
+        raise AssertionError(f'Unexpected extraction counts: {wrong}')
+    return results
+
+def bench_progress_hook():
+    """Cost of one yt-dlp progress report, coalesced and publishing every call"""
+    from benchmarks.progress_hook import run
+    results = {}
+    for label, interval in (('coalesced', 0.2), ('every_call', 0)):
+        ns_per_call, versions = run(interval)
+        results[label] = {'ns_per_call': round(ns_per_call), 'state_versions': versions}
+    return results
+
+def bench_video_info(server, rounds=20):
+    """get_video_info latency against the stub, uncached and from the cache"""
+    from modules.download.media import get_video_info, metadata_cache
+
+    results = {}
+    for label, url in (('video', server.video_url('info')), ('playlist', server.playlist_url(50))):
+        cold = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            get_video_info(url, use_cache=False)
+            cold.append((time.perf_counter() - start) * 1000)
+        warm = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            get_video_info(url)
+            warm.append((time.perf_counter() - start) * 1000)
+        results[label] = {'uncached_ms_p50': round(statistics.median(cold), 3),
+                          'cached_ms_p50': round(statistics.median(warm), 3)}
+    metadata_cache.clear()
+    return results
+
+def bench_sanitize(directory_size=5000, renamed=500, calls=100000):
+    """sanitize_filename speed, and renaming a job's files in a crowded directory"""
+    from modules.utils.file_utils import sanitize_filename
+    from modules.download.media import FileManifest, sanitize_manifest
+
+    names = [f'Artist - Song #{i} (Official Video) [HD].mp3' for i in range(1000)]
+    start = time.perf_counter()
+    for i in range(calls):
+        sanitize_filename(names[i % len(names)])
+    filename_ns = (time.perf_counter() - start) / calls * 1e9
+
+    # A directory full of earlier downloads, plus this job's files, half of them colliding
+    directory = tempfile.mkdtemp(prefix='bench-sanitize-')
+    for i in range(directory_size):
+        open(os.path.join(directory, f'Old_download_{i}.mp3'), 'w').close()
+    manifest = FileManifest()
+    for i in range(renamed):
+        name = f'Old download {i}.mp3' if i % 2 else f'New: download #{i}.mp3'
+        path = os.path.join(directory, name)
+        open(path, 'w').close()
+        manifest.add(path, f'video{i}')
+
+    start = time.perf_counter()
+    sanitize_manifest(manifest)
+    rename_seconds = time.perf_counter() - start
+    return {
+        'sanitize_filename_ns': round(filename_ns),
+        'directory_files': directory_size + renamed,
+        'renamed_files': renamed,
+        'manifest_rename_ms': round(rename_seconds * 1000, 2),
+        'ms_per_renamed_file': round(rename_seconds * 1000 / renamed, 4),
+    }
+
+def bench_status(pollers=8, duration=3.0):
+    """/api/download-status latency with concurrent pollers while a job's state keeps changing"""
+    from flask import Flask
+    from werkzeug.serving import WSGIRequestHandler, make_server
+    from modules.routes.api import api_routes
+    from modules.download.jobs import DownloadJob, job_manager
+
+    app = Flask(__name__)
+    app.register_blueprint(api_routes)
+    class QuietHandler(WSGIRequestHandler):
+        def log_request(self, *args, **kwargs):
+            pass
+
+    server = make_server('127.0.0.1', 0, app, threaded=True, request_handler=QuietHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f'http://127.0.0.1:{server.server_port}/api/download-status'
+
+    # A running job publishing progress as fast as a busy download would
+    job = DownloadJob('https://example.com/bench', tempfile.gettempdir())
+    with job_manager.lock:
+        job_manager.jobs[job.id] = job
+        job_manager.latest_job_id = job.id
+    stop = threading.Event()
+
+    def churn():
+        i = 0
+        while not stop.is_set():
+            i += 1
+            job.state.update({'status': 'downloading', 'progress': i % 100, 'total_progress': i % 100})
+            time.sleep(0.001)
+
+    latencies = []
+    lock = threading.Lock()
+
+    def poll():
+        mine = []
+        deadline = time.perf_counter() + duration
+        while time.perf_counter() < deadline:
+            start = time.perf_counter()
+            with urllib.request.urlopen(url) as response:
+                response.read()
+            mine.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(mine)
+
+    churner = threading.Thread(target=churn, daemon=True)
+    churner.start()
+    threads = [threading.Thread(target=poll) for _ in range(pollers)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    stop.set()
+    server.shutdown()
+
+    return {
+        'pollers': pollers,
+        'requests': len(latencies),
+        'requests_per_second': round(len(latencies) / duration, 1),
+        'ms_p50': round(percentile(latencies, 0.5), 3),
+        'ms_p99': round(percentile(latencies, 0.99), 3),
+    }
+
+def bench_startup():
+    """Cold start of the app in a fresh process, up to the first page and the first API answer"""
+    from benchmarks.startup import run
+    return run()
+
+BENCHMARKS = {
+    'download': bench_download,
+    'preresolve': bench_preresolve,
+    'listing': bench_listing,
+    'extractions': bench_extractions,
+    'progress_hook': bench_progress_hook,
+    'video_info': bench_video_info,
+    'sanitize': bench_sanitize,
+    'status': bench_status,
+    'startup': bench_startup,
+}
+
+# Benchmarks that need the local media server
+NEEDS_SERVER = ('download', 'preresolve', 'listing', 'extractions', 'video_info')
+
+def environment():
+    """What the numbers were measured on, so runs can be told apart"""
+    import yt_dlp
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'yt_dlp': yt_dlp.version.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+def flatten(results, prefix=''):
+    """{'a': {'b': 1}} -> {'a.b': 1}, numbers only"""
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{key}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{key}'] = value
+    return flat
+
+def compare(baseline, current):
+    """Print each metric next to its baseline value and the change"""
+    old = flatten(baseline['results'])
+    new = flatten(current['results'])
+    print(f"\n{'metric':48} {'baseline':>12} {'current':>12} {'change':>8}")
+    for key in sorted(new):
+        if key in old:
+            change = f'{(new[key] - old[key]) / old[key] * 100:+.1f}%' if old[key] else ''
+            print(f'{key:48} {old[key]:>12} {new[key]:>12} {change:>8}')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run the offline benchmarks.')
+    parser.add_argument('--only', nargs='+', choices=sorted(BENCHMARKS), help='benchmarks to run')
+    parser.add_argument('--output', help='JSON file to write (default: benchmarks/results/<time>-<commit>.json)')
+    parser.add_argument('--compare', metavar='BASELINE', help='earlier results file to compare against')
+    args = parser.parse_args(argv)
+
+    output = os.path.abspath(args.output) if args.output else None
+    baseline_path = os.path.abspath(args.compare) if args.compare else None
+
+    # The app keeps its databases and caches under the working directory;
+    # run in a scratch one so benchmarks never touch real data
+    sys.path.insert(0, PROJECT_ROOT)
+    os.chdir(tempfile.mkdtemp(prefix='ytmb-bench-'))
+
+    from benchmarks.stub_media import MediaServer, install_stub_extractor
+    install_stub_extractor()
+
+    names = args.only or list(BENCHMARKS)
+    report = {'environment': environment(), 'results': {}}
+    with MediaServer() as server:
+        for name in names:
+            print(f'Running {name}...', flush=True)
+            benchmark = BENCHMARKS[name]
+            start = time.perf_counter()
+            report['results'][name] = benchmark(server) if name in NEEDS_SERVER else benchmark()
+            print(f'  {json.dumps(report["results"][name])} ({time.perf_counter() - start:.1f}s)')
+
+    if output is None:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S')
+        output = os.path.join(RESULTS_DIR, f"{stamp}-{report['environment']['commit'] or 'local'}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {output}')
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            compare(json.load(f), report)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
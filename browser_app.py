@@ -36,6 +36,10 @@ if __name__ == '__main__':
         )
     )
     
+    # Queue again the downloads the last run did not finish
+    from modules.download.jobs import job_manager
+    job_manager.resume()
+    
     # Show startup message
     print("\nYT Media Backup is running in browser mode.")
     print("Open your browser and navigate to: http://127.0.0.1:5000")
@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# cli.py
+# Command line client for YT Media Backup
+#
+#   python cli.py submit URL [--type video] [--playlist-mode playlist] [--watch]
+#   python cli.py list
+#   python cli.py watch [JOB_ID]
+#   python cli.py cancel JOB_ID
+#   python cli.py download URL --output-dir DIR     # one-shot, no server needed
+#
+# submit, list, watch and cancel talk to a running daemon.py (or app) at
+# --server, default $YTMB_SERVER or http://127.0.0.1:<YTMB_PORT>.
+
+import argparse
+import json
+import os
+import sys
+import threading
+import urllib.error
+import urllib.request
+from modules.config.settings import default_download_path, SERVER_PORT, PLAYLIST_WORKERS, AUDIO_PROFILE
+
+DEFAULT_SERVER = os.environ.get('YTMB_SERVER', f'http://127.0.0.1:{SERVER_PORT}')
+
+# Statuses after which a job no longer changes (as in modules.download.jobs)
+FINISHED_STATUSES = ('completed', 'completed_with_errors', 'error', 'cancelled')
+
+class ServerError(Exception):
+    pass
+
+def api(server, path, payload=None, stream=False):
+    """Call the API; returns the decoded JSON, or the open response when stream is set"""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    http_request = urllib.request.Request(server.rstrip('/') + path, data=data,
+                                          headers={'Content-Type': 'application/json'})
+    try:
+        response = urllib.request.urlopen(http_request)
+    except urllib.error.HTTPError as e:
+        try:
+            message = json.loads(e.read()).get('error', e.reason)
+        except ValueError:
+            message = e.reason
+        raise ServerError(f'{e.code}: {message}')
+    except urllib.error.URLError as e:
+        raise ServerError(f'Cannot reach {server}: {e.reason} (is daemon.py running?)')
+    if stream:
+        return response
+    with response:
+        result = json.loads(response.read())
+    if isinstance(result, dict) and result.get('error'):
+        raise ServerError(result['error'])
+    return result
+
+def progress_line(job):
+    """One line summing up a job's state"""
+    line = f"[{job.get('status')}] {job.get('total_progress') or 0:5.1f}%"
+    if (job.get('total_files') or 0) > 1:
+        # A playlist still being listed has more entries to come
+        more = '+' if job.get('is_playlist') and job.get('listing_complete') is False else ''
+        line += f"  {job.get('completed_files', 0)}/{job.get('total_files')}{more} files"
+    if job.get('speed'):
+        line += f"  {job['speed'] / 1e6:.2f} MB/s"
+    return f"{line}  {job.get('message', '')}"
+
+def exit_code(job):
+    return 0 if job.get('status') == 'completed' else 1
+
+def watch(server, job_id):
+    """Print a job's progress as the server pushes it, until it finishes"""
+    job = api(server, f'/api/jobs/{job_id}')
+    print(f"Job {job_id}: {job.get('url')}")
+    if job.get('status') in FINISHED_STATUSES:
+        print(progress_line(job))
+        return exit_code(job)
+
+    # Server-Sent Events: the stream ends once the job has finished
+    with api(server, f'/api/events?job_id={job_id}', stream=True) as events:
+        for raw_line in events:
+            line = raw_line.decode('utf-8').rstrip('\n')
+            if not line.startswith('data: '):
+                continue
+            job = json.loads(line[len('data: '):])
+            print(progress_line(job), flush=True)
+    return exit_code(job)
+
+def command_submit(args):
+    payload = {'url': args.url, 'output_dir': args.output_dir, 'download_type': args.type,
+               'playlist_mode': args.playlist_mode, 'audio_profile': args.audio_profile,
+               'use_archive': not args.no_archive}
+    if args.parallel_entries:
+        payload['parallel_entries'] = args.parallel_entries
+    job_id = api(args.server, '/api/download', payload)['job_id']
+    print(job_id)
+    return watch(args.server, job_id) if args.watch else 0
+
+def command_list(args):
+    jobs = api(args.server, '/api/jobs')['jobs']
+    if args.json:
+        print(json.dumps(jobs, indent=2))
+        return 0
+    for job in jobs:
+        if args.active and job.get('status') in FINISHED_STATUSES:
+            continue
+        print(f"{job['job_id']}  {job.get('status', ''):22} {job.get('total_progress') or 0:5.1f}%  {job['url']}")
+    return 0
+
+def command_watch(args):
+    job_id = args.job_id
+    if job_id is None:
+        job_id = api(args.server, '/api/download-status').get('job_id')
+        if not job_id:
+            print('No jobs to watch')
+            return 1
+    return watch(args.server, job_id)
+
+def command_cancel(args):
+    result = api(args.server, f'/api/jobs/{args.job_id}/cancel', {})
+    print(f"{result['job_id']}: {result['status']}")
+    return 0
+
+def command_download(args):
+    """Run one download in this process, without a server or the job queue"""
+    from modules.download.jobs import DownloadJob
+    from modules.download.media import download_media
+
+    job = DownloadJob(args.url, args.output_dir, args.type, args.playlist_mode,
+                      args.parallel_entries or PLAYLIST_WORKERS, not args.no_archive, args.audio_profile)
+    thread = threading.Thread(target=download_media, name='download',
+                              args=(job.url, job.output_dir, job.download_type, job.playlist_mode),
+                              kwargs={'job': job, 'parallel_entries': job.parallel_entries,
+                                      'use_archive': job.use_archive, 'audio_profile': job.audio_profile},
+                              daemon=True)
+    thread.start()
+
+    last_line = None
+    try:
+        while thread.is_alive():
+            thread.join(0.5)
+            line = progress_line(job.to_dict())
+            if line != last_line:
+                print(line, flush=True)
+                last_line = line
+    except KeyboardInterrupt:
+        # Let the download stop at its next progress report
+        job.cancel_requested = True
+        print('Cancelling...', flush=True)
+        thread.join()
+        print(progress_line(job.to_dict()))
+    return exit_code(job.to_dict())
+
+def add_download_options(parser):
+    parser.add_argument('url')
+    parser.add_argument('--output-dir', default=default_download_path, help='where to save downloads')
+    parser.add_argument('--type', choices=('audio', 'video'), default='audio')
+    parser.add_argument('--playlist-mode', choices=('single', 'playlist'), default='single')
+    parser.add_argument('--audio-profile', choices=('mp3', 'fast'), default=AUDIO_PROFILE)
+    parser.add_argument('--parallel-entries', type=int, help='playlist entries downloaded at once')
+    parser.add_argument('--no-archive', action='store_true', help='download again what was already downloaded')
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Control YT Media Backup from the command line.')
+    parser.add_argument('--server', default=DEFAULT_SERVER, help=f'daemon address (default {DEFAULT_SERVER})')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    submit = commands.add_parser('submit', help='queue a download on the server')
+    add_download_options(submit)
+    submit.add_argument('--watch', action='store_true', help='follow the job until it finishes')
+    submit.set_defaults(handler=command_submit)
+
+    listing = commands.add_parser('list', help='list the jobs on the server')
+    listing.add_argument('--active', action='store_true', help='only jobs not finished yet')
+    listing.add_argument('--json', action='store_true', help='print the full job records as JSON')
+    listing.set_defaults(handler=command_list)
+
+    watching = commands.add_parser('watch', help='follow a job until it finishes (default: the latest)')
+    watching.add_argument('job_id', nargs='?')
+    watching.set_defaults(handler=command_watch)
+
+    cancel = commands.add_parser('cancel', help='cancel a queued or running job')
+    cancel.add_argument('job_id')
+    cancel.set_defaults(handler=command_cancel)
+
+    download = commands.add_parser('download', help='download in this process, without a server')
+    add_download_options(download)
+    download.set_defaults(handler=command_download)
+
+    args = parser.parse_args(argv)
+    try:
+        return args.handler(args)
+    except ServerError as e:
+        print(f'Error: {e}', file=sys.stderr)
+        return 2
+
+if __name__ == '__main__':
+    sys.exit(main())
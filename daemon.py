@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# daemon.py
+# Headless version of the app for servers: the API and job engine, no window
+#
+#   python daemon.py --host 0.0.0.0 --port 5000 --threads 32 --download-workers 4
+#
+# Control it with cli.py, the web UI, or the HTTP API directly.
+
+import argparse
+import signal
+import sys
+from flask import Flask
+
+# Import modules
+from modules.routes.ui import ui_routes
+from modules.routes.api import api_routes
+from modules.config.settings import (SECRET_KEY, SERVER_HOST, SERVER_PORT, SERVER_THREADS, DOWNLOAD_WORKERS,
+                                     WORKER_PROCESSES)
+from modules.utils.server import make_daemon_server, SERVERS
+
+# Initialize Flask app
+app = Flask(__name__, static_folder='static', template_folder='templates')
+app.config['SECRET_KEY'] = SECRET_KEY
+
+# Register blueprints
+app.register_blueprint(ui_routes)
+app.register_blueprint(api_routes)
+
+def stop(signum, frame):
+    # serve_forever() returns on KeyboardInterrupt, for SIGTERM as for Ctrl+C
+    raise KeyboardInterrupt
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Run YT Media Backup headless, serving the API and web UI.')
+    parser.add_argument('--host', default=SERVER_HOST, help=f'address to bind (default {SERVER_HOST})')
+    parser.add_argument('--port', type=int, default=SERVER_PORT, help=f'port to listen on (default {SERVER_PORT})')
+    parser.add_argument('--threads', type=int, default=SERVER_THREADS,
+                        help=f'HTTP worker threads (default {SERVER_THREADS})')
+    parser.add_argument('--download-workers', type=int, default=DOWNLOAD_WORKERS,
+                        help=f'jobs downloading at the same time (default {DOWNLOAD_WORKERS})')
+    parser.add_argument('--worker-processes', action='store_true', default=WORKER_PROCESSES,
+                        help='run each job in a worker process of its own, to use every core')
+    parser.add_argument('--server', choices=SERVERS, default='auto',
+                        help="'auto' (default): waitress if installed, else the built-in thread pool server; "
+                             "'asyncio' for many concurrent status and event stream clients")
+    args = parser.parse_args(argv)
+
+    from modules.download.jobs import job_manager
+    from modules.download.journal import job_journal
+    from modules.config.history import history_store
+
+    # The pool starts on the first job, so it can still be resized here
+    job_manager.workers = max(1, args.download_workers)
+    job_manager.processes = args.worker_processes
+
+    async_routes = ()
+    if args.server == 'asyncio':
+        from modules.routes.async_api import AsyncAPI
+        async_routes = AsyncAPI().routes()
+    server = make_daemon_server(app, args.host, args.port, max(1, args.threads), args.server, async_routes)
+    signal.signal(signal.SIGTERM, stop)
+
+    # Queue again the downloads the last run did not finish
+    resumed = job_manager.resume()
+
+    print(f"YT Media Backup daemon listening on http://{args.host}:{server.server_port} "
+          f"({type(server).__name__}, {server.threads} threads, {job_manager.workers} download "
+          f"{'processes' if job_manager.processes else 'workers'})")
+    if resumed:
+        print(f"Resumed {len(resumed)} interrupted job(s)")
+    sys.stdout.flush()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        # Running jobs stay in the journal and are resumed on the next start
+        unfinished = sum(1 for job in job_manager.list_jobs() if not job.is_finished)
+        print(f"Shutting down; {unfinished} unfinished job(s) will resume on the next start")
+        history_store.close()
+        job_journal.close()
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
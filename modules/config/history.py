@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# modules/config/history.py
+# Download history storage for YT Media Backup
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from modules.config.settings import HISTORY_DB, HISTORY_FILE, HISTORY_RETENTION
+
+# Columns stored for every history entry, besides id and created_at
+HISTORY_FIELDS = ('job_id', 'url', 'output_dir', 'download_type', 'is_playlist', 'title', 'status',
+                  'succeeded', 'failed', 'skipped', 'archived', 'entries')
+
+# Prune old entries once every this many inserts rather than on each one
+PRUNE_EVERY = 100
+
+class HistoryStore:
+    """SQLite-backed download history
+
+    Every finished job is one INSERT in its own transaction, with the
+    database in WAL mode and synchronous=FULL, so a crash loses at most
+    the entry being written. Only the newest `retention` entries are kept
+    (0 keeps everything). The old JSON history file is imported once.
+    """
+    def __init__(self, db_path=HISTORY_DB, retention=HISTORY_RETENTION, legacy_file=HISTORY_FILE):
+        self.db_path = db_path
+        self.retention = retention
+        self.legacy_file = legacy_file
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        # Opened on first use so importing this module stays cheap
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            with connection:
+                connection.execute('''
+                    CREATE TABLE IF NOT EXISTS history (
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        created_at REAL NOT NULL,
+                        job_id TEXT,
+                        url TEXT,
+                        output_dir TEXT,
+                        download_type TEXT,
+                        is_playlist INTEGER,
+                        title TEXT,
+                        status TEXT,
+                        succeeded INTEGER,
+                        failed INTEGER,
+                        skipped INTEGER,
+                        archived INTEGER,
+                        entries TEXT
+                    )
+                ''')
+                connection.execute('CREATE INDEX IF NOT EXISTS history_created_at ON history (created_at)')
+                connection.execute('CREATE INDEX IF NOT EXISTS history_status ON history (status)')
+                connection.execute('CREATE INDEX IF NOT EXISTS history_download_type ON history (download_type)')
+                connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+            self.connection = connection
+            self._migrate_json()
+            self._prune()
+        return self.connection
+
+    def _migrate_json(self):
+        """Import the entries of the old JSON history file, once"""
+        connection = self.connection
+        done = connection.execute("SELECT value FROM meta WHERE key = 'json_migrated'").fetchone()
+        if done or not self.legacy_file or not os.path.exists(self.legacy_file):
+            return
+
+        try:
+            with open(self.legacy_file, 'r') as f:
+                entries = json.load(f)
+            # The JSON file kept no dates; its last write is the best we have
+            created_at = os.path.getmtime(self.legacy_file)
+        except (OSError, ValueError) as e:
+            print(f"Error loading download history: {e}")
+            return
+
+        with connection:
+            connection.executemany(
+                f"INSERT INTO history (created_at, {', '.join(HISTORY_FIELDS)}) "
+                f"VALUES (?, {', '.join('?' * len(HISTORY_FIELDS))})",
+                [self._row(entry, created_at) for entry in entries if isinstance(entry, dict)])
+            connection.execute("INSERT INTO meta (key, value) VALUES ('json_migrated', ?)", (str(time.time()),))
+
+    def _row(self, entry, created_at):
+        values = [created_at]
+        for field in HISTORY_FIELDS:
+            value = entry.get(field)
+            if field == 'entries' and value is not None:
+                value = json.dumps(value)
+            elif field == 'is_playlist' and value is not None:
+                value = int(bool(value))
+            values.append(value)
+        return values
+
+    def _prune(self):
+        """Delete entries beyond the retention limit (oldest first)"""
+        if not self.retention:
+            return
+        with self.connection:
+            self.connection.execute(
+                'DELETE FROM history WHERE id <= (SELECT MAX(id) FROM history) - ?', (self.retention,))
+
+    def add(self, entry):
+        """Append one history entry; returns its ID"""
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                cursor = connection.execute(
+                    f"INSERT INTO history (created_at, {', '.join(HISTORY_FIELDS)}) "
+                    f"VALUES (?, {', '.join('?' * len(HISTORY_FIELDS))})",
+                    self._row(entry, time.time()))
+            entry_id = cursor.lastrowid
+            if entry_id % PRUNE_EVERY == 0:
+                self._prune()
+        return entry_id
+
+    def recent(self, limit=100):
+        """The newest `limit` entries, oldest first"""
+        with self.lock:
+            rows = self._connect().execute(
+                'SELECT * FROM history ORDER BY id DESC LIMIT ?', (limit,)).fetchall()
+        return [self.to_dict(row) for row in reversed(rows)]
+
+    def version(self):
+        """Token that changes whenever entries are added or pruned
+
+        Rows are never updated, only appended at the top and pruned at
+        the bottom, so the lowest and highest IDs identify the contents.
+        """
+        with self.lock:
+            low, high = self._connect().execute('SELECT MIN(id), MAX(id) FROM history').fetchone()
+        return f'{low or 0}-{high or 0}'
+
+    def query(self, limit=50, before=None, status=None, download_type=None, since=None, until=None,
+              search=None, include_entries=False):
+        """One page of entries, newest first
+
+        Pages are keyed on the entry ID rather than an offset, so deep pages
+        cost the same as the first: pass the returned next_cursor as `before`
+        to get the following page. since/until are Unix timestamps and
+        search matches anywhere in the title, case-insensitively.
+        Returns (entries, next_cursor), next_cursor being None on the last page.
+        """
+        clauses = []
+        params = []
+        if before is not None:
+            clauses.append('id < ?')
+            params.append(before)
+        if status:
+            clauses.append('status = ?')
+            params.append(status)
+        if download_type:
+            clauses.append('download_type = ?')
+            params.append(download_type)
+        if since is not None:
+            clauses.append('created_at >= ?')
+            params.append(since)
+        if until is not None:
+            clauses.append('created_at < ?')
+            params.append(until)
+        if search:
+            escaped = search.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+            clauses.append("title LIKE ? ESCAPE '\\'")
+            params.append(f'%{escaped}%')
+
+        columns = '*' if include_entries else f"id, created_at, {', '.join(f for f in HISTORY_FIELDS if f != 'entries')}"
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        # One extra row tells us whether another page follows
+        sql = f'SELECT {columns} FROM history {where} ORDER BY id DESC LIMIT ?'
+        with self.lock:
+            rows = self._connect().execute(sql, params + [limit + 1]).fetchall()
+
+        entries = [self.to_dict(row) for row in rows[:limit]]
+        next_cursor = entries[-1]['id'] if len(rows) > limit else None
+        return entries, next_cursor
+
+    def get(self, entry_id):
+        """A single entry with its per-entry results, or None"""
+        with self.lock:
+            row = self._connect().execute('SELECT * FROM history WHERE id = ?', (entry_id,)).fetchone()
+        return self.to_dict(row) if row else None
+
+    def close(self):
+        """Close the database connection; it is reopened on next use"""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+    @staticmethod
+    def to_dict(row):
+        entry = dict(row)
+        entry['is_playlist'] = bool(entry.get('is_playlist'))
+        if entry.get('entries'):
+            entry['entries'] = json.loads(entry['entries'])
+        return entry
+
+# Shared history store
+history_store = HistoryStore()
+
+def record_download(entry):
+    """Add a finished download to the history, logging rather than raising on failure"""
+    try:
+        return history_store.add(entry)
+    except sqlite3.Error as e:
+        print(f"Error saving download history: {e}")
+        return None
@@ -28,17 +28,14 @@ def get_downloads_folder():
         return home_downloads
     
     # Last resort, use the current directory's downloads folder
-    return os.path.join(os.getcwd(), 'downloads')
+    downloads = os.path.join(os.getcwd(), 'downloads')
+    os.makedirs(downloads, exist_ok=True)
+    return downloads
 
 # Default download path
 default_download_path = get_downloads_folder()
 
-# Create necessary directories
-os.makedirs('downloads', exist_ok=True)
-os.makedirs('backups', exist_ok=True)
-
 # Global state variables
-download_history = []
 current_download = {
     'output_path': '',
     'status': None, 
@@ -54,46 +51,105 @@ current_download = {
 }
 
 # Global control variables
-download_thread = None
-cancel_requested = False
 window = None
 
-# Import JSON module for history persistence
-import json
+# Seconds app.py waits for the local server to come up before giving up
+SERVER_START_TIMEOUT = 10
+
+# Headless daemon (daemon.py): bind address, port and HTTP worker threads;
+# the CLI (cli.py) talks to YTMB_SERVER, or to this address by default
+SERVER_HOST = os.environ.get('YTMB_HOST', '127.0.0.1')
+SERVER_PORT = int(os.environ.get('YTMB_PORT', '5000'))
+SERVER_THREADS = int(os.environ.get('YTMB_SERVER_THREADS', '16'))
+
+# yt-dlp metadata lookups running at once under the asyncio server (daemon.py --server asyncio)
+ASYNC_EXTRACT_WORKERS = int(os.environ.get('YTMB_EXTRACT_WORKERS', '4'))
+
+# Number of worker threads draining the download job queue
+DOWNLOAD_WORKERS = int(os.environ.get('YTMB_DOWNLOAD_WORKERS', '2'))
+
+# Run each job in a worker process of its own instead of a worker thread, so
+# downloads use every core (YTMB_WORKER_PROCESSES=1 or daemon.py --worker-processes);
+# seconds without a heartbeat before a worker process counts as hung and is
+# killed, seconds a job may go without any progress before its worker process
+# counts as stalled and is killed (0 never; long conversions report none), and
+# how many times a job whose worker was lost is queued again
+WORKER_PROCESSES = os.environ.get('YTMB_WORKER_PROCESSES', '') in ('1', 'true')
+WORKER_HANG_TIMEOUT = 120
+WORKER_STALL_TIMEOUT = int(os.environ.get('YTMB_WORKER_STALL_TIMEOUT', str(15 * 60)))
+WORKER_JOB_RETRIES = 2
+
+# Number of playlist entries downloaded at the same time within one job, and
+# the most a download request may ask for
+PLAYLIST_WORKERS = int(os.environ.get('YTMB_PLAYLIST_WORKERS', '3'))
+MAX_PLAYLIST_WORKERS = 16
+
+# Playlist entries resolved (formats, signatures) ahead of the one downloading
+# (0 turns look-ahead off), seconds a resolved entry is assumed usable when its
+# URLs carry no expiry, and how close to expiring it may be when its download starts
+PRERESOLVE_AHEAD = int(os.environ.get('YTMB_PRERESOLVE_AHEAD', '3'))
+PRERESOLVE_TTL = 60 * 60
+PRERESOLVE_MARGIN = 5 * 60
+
+# Playlists are listed while their entries download: entries a URL check lists
+# to count them, and listed entries held waiting for a download slot at most
+PLAYLIST_PROBE_ENTRIES = 100
+PLAYLIST_BUFFER = 500
+
+# Number of files post-processed (converted) at the same time across all jobs
+TRANSCODE_WORKERS = int(os.environ.get('YTMB_TRANSCODE_WORKERS', str(os.cpu_count() or 2)))
+
+# Default audio profile: 'mp3' converts everything, 'fast' keeps streams already in a common codec
+AUDIO_PROFILE = os.environ.get('YTMB_AUDIO_PROFILE', 'mp3')
+
+# Global download bandwidth cap in bytes per second ('500K', '2M', ...; 0 is unlimited),
+# changeable at runtime through /api/bandwidth, and how many seconds of it a job may burst
+BANDWIDTH_LIMIT = os.environ.get('YTMB_BANDWIDTH_LIMIT', '0')
+BANDWIDTH_BURST = 1.0
 
-# Path to store download history
+# Retries of failed entries: total retries allowed per job, and backoff bounds in seconds
+RETRY_BUDGET = int(os.environ.get('YTMB_RETRY_BUDGET', '20'))
+RETRY_BASE_DELAY = 2
+RETRY_MAX_DELAY = 60
+
+# Minimum seconds between progress updates from yt-dlp's hook (0 publishes every chunk)
+PROGRESS_UPDATE_INTERVAL = 0.2
+
+# Server-Sent Events: minimum seconds between pushes per client, and keepalive period
+SSE_COALESCE_INTERVAL = 0.25
+SSE_KEEPALIVE_INTERVAL = 15
+
+# Jobs submitted per journal write by the bulk URL import
+BULK_BATCH_SIZE = 100
+
+# Number of finished jobs kept in memory for the jobs API
+MAX_TRACKED_JOBS = 200
+
+# Legacy JSON download history, imported once into the history database
 HISTORY_FILE = os.path.join(os.getcwd(), 'data', 'download_history.json')
 
-# Ensure data directory exists
-os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+# SQLite download history, and how many entries it keeps (0 keeps all)
+HISTORY_DB = os.path.join(os.getcwd(), 'data', 'history.db')
+HISTORY_RETENTION = int(os.environ.get('YTMB_HISTORY_RETENTION', '1000'))
 
-# Function to save history (limited to 100 entries)
-def save_download_history():
-    """Save download history to JSON file, keeping only the 100 most recent entries"""
-    global download_history
-    # Limit to 100 most recent downloads
-    if len(download_history) > 100:
-        download_history = download_history[-100:]
-    
-    try:
-        with open(HISTORY_FILE, 'w') as f:
-            json.dump(download_history, f, indent=2)
-    except Exception as e:
-        print(f"Error saving download history: {e}")
-
-# Function to load history
-def load_download_history():
-    """Load download history from JSON file"""
-    global download_history
-    if os.path.exists(HISTORY_FILE):
-        try:
-            with open(HISTORY_FILE, 'r') as f:
-                download_history = json.load(f)
-        except (json.JSONDecodeError, Exception) as e:
-            print(f"Error loading download history: {e}")
-            download_history = []
-    else:
-        download_history = []
-
-# Load history when this module is imported
-load_download_history()
+# Entries per page of the history API: default and most a client may ask for
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Metadata cache for URL lookups (set METADATA_CACHE_DIR to None to keep it in memory only)
+METADATA_CACHE_ENTRIES = 256
+METADATA_CACHE_TTL = 6 * 60 * 60  # seconds
+METADATA_CACHE_DIR = os.path.join(os.getcwd(), 'data', 'metadata_cache')
+METADATA_CACHE_MAX_BYTES = 20 * 1024 * 1024
+
+# Journal of unfinished jobs, resumed on the next start
+JOB_JOURNAL_DB = os.path.join(os.getcwd(), 'data', 'jobs.db')
+
+# Job profiles (cProfile and tracemalloc reports), how many are kept, and
+# whether every job is profiled from startup (also switchable through /api/profiling)
+PROFILES_DIR = os.path.join(os.getcwd(), 'data', 'profiles')
+PROFILES_KEEP = 20
+PROFILE_JOBS = os.environ.get('YTMB_PROFILE_JOBS', '') in ('1', 'true')
+
+# SQLite index of media already downloaded
+ARCHIVE_DB = os.path.join(os.getcwd(), 'data', 'archive.db')
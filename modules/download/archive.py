@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# modules/download/archive.py
+# Download archive index for YT Media Backup
+
+import os
+import sqlite3
+import threading
+import time
+from modules.config.settings import ARCHIVE_DB
+from modules.utils.file_utils import sanitize_filename
+from modules.utils.url_utils import canonical_media_id
+
+# Extensions a finished file can have, per download type
+MEDIA_EXTENSIONS = {
+    'audio': ('.mp3', '.m4a', '.opus', '.ogg', '.aac', '.flac', '.wav', '.webm'),
+    'video': ('.mp4', '.mkv', '.webm', '.mov', '.avi'),
+}
+
+def archive_key(target):
+    """Return (extractor, video_id) for a flat entry, info dict or URL, or None"""
+    if isinstance(target, dict):
+        extractor = target.get('ie_key') or target.get('extractor_key') or target.get('extractor')
+        video_id = target.get('id')
+        if extractor and video_id and target.get('_type', 'video') in ('video', 'url'):
+            return extractor.lower(), video_id
+        target = target.get('webpage_url') or target.get('url')
+
+    # Plain YouTube video URLs carry their ID
+    media_id = canonical_media_id(target) if target else None
+    if media_id and media_id.startswith('youtube:video:') and ':playlist:' not in media_id:
+        return 'youtube', media_id[len('youtube:video:'):]
+    return None
+
+class DownloadArchive:
+    """SQLite index of media already downloaded, by extractor, video ID and download type"""
+    def __init__(self, db_path=ARCHIVE_DB):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        # Opened on first use so importing this module stays cheap
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            self.connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self.connection.execute('PRAGMA journal_mode=WAL')
+            self.connection.execute('''
+                CREATE TABLE IF NOT EXISTS archive (
+                    extractor TEXT NOT NULL,
+                    video_id TEXT NOT NULL,
+                    download_type TEXT NOT NULL,
+                    title TEXT,
+                    filepath TEXT,
+                    added_at REAL NOT NULL,
+                    source TEXT NOT NULL DEFAULT 'download',
+                    PRIMARY KEY (extractor, video_id, download_type)
+                )
+            ''')
+            self.connection.commit()
+        return self.connection
+
+    def contains(self, extractor, video_id, download_type):
+        """Check if this media was already downloaded as this type"""
+        with self.lock:
+            row = self._connect().execute(
+                'SELECT 1 FROM archive WHERE extractor = ? AND video_id = ? AND download_type = ?',
+                (extractor, video_id, download_type)).fetchone()
+        return row is not None
+
+    def add_many(self, records, download_type, source='download'):
+        """Record (extractor, video_id, title, filepath) tuples as downloaded"""
+        now = time.time()
+        rows = [(extractor, video_id, download_type, title, filepath, now, source)
+                for extractor, video_id, title, filepath in records]
+        if not rows:
+            return 0
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO archive '
+                    '(extractor, video_id, download_type, title, filepath, added_at, source) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        return len(rows)
+
+    def remove(self, extractor, video_id, download_type=None):
+        """Forget an entry so it will be downloaded again"""
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                if download_type:
+                    cursor = connection.execute(
+                        'DELETE FROM archive WHERE extractor = ? AND video_id = ? AND download_type = ?',
+                        (extractor, video_id, download_type))
+                else:
+                    cursor = connection.execute(
+                        'DELETE FROM archive WHERE extractor = ? AND video_id = ?', (extractor, video_id))
+        return cursor.rowcount
+
+    def stats(self):
+        """Number of archived items per download type"""
+        with self.lock:
+            rows = self._connect().execute(
+                'SELECT download_type, COUNT(*) FROM archive GROUP BY download_type').fetchall()
+        counts = {download_type: count for download_type, count in rows}
+        return {'total': sum(counts.values()), 'by_type': counts}
+
+    def backfill(self, entries, output_dir, download_type):
+        """Archive entries whose file already exists in output_dir
+
+        Our output template names files after the sanitized title, so an
+        entry counts as present when a file with that name and a media
+        extension for the download type is in the directory. Returns the
+        number of entries added.
+        """
+        if not os.path.isdir(output_dir):
+            return 0
+
+        extensions = MEDIA_EXTENSIONS.get(download_type, ())
+        existing = {}
+        for filename in os.listdir(output_dir):
+            base, extension = os.path.splitext(filename)
+            if extension.lower() in extensions:
+                existing.setdefault(base, os.path.join(output_dir, filename))
+
+        records = []
+        for entry in entries:
+            key = archive_key(entry)
+            title = entry.get('title') if isinstance(entry, dict) else None
+            if not key or not title:
+                continue
+            base = os.path.splitext(sanitize_filename(title + '.x'))[0]
+            if base in existing:
+                records.append((key[0], key[1], title, existing[base]))
+        return self.add_many(records, download_type, source='backfill')
+
+# Shared archive used by downloads and the API
+download_archive = DownloadArchive()
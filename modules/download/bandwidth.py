@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+# modules/download/bandwidth.py
+# Bandwidth governor for YT Media Backup
+
+import math
+import threading
+import time
+from yt_dlp.utils import parse_bytes
+from modules.config.settings import BANDWIDTH_LIMIT, BANDWIDTH_BURST
+
+def parse_rate(value):
+    """Bytes per second from a number or a string like '500K' or '2M'; 0 means unlimited"""
+    if value is None or value == '':
+        return 0
+    if isinstance(value, bool):
+        raise ValueError(f'Invalid bandwidth limit: {value}')
+    if isinstance(value, (int, float)):
+        rate = value
+    else:
+        rate = parse_bytes(str(value).strip())
+        if rate is None:
+            raise ValueError(f'Invalid bandwidth limit: {value}')
+    if not math.isfinite(rate) or rate < 0:
+        raise ValueError(f'Invalid bandwidth limit: {value}')
+    return int(rate)
+
+class BandwidthGovernor:
+    """Token bucket shared by every download in the process
+
+    The global rate is split between the jobs currently downloading in
+    proportion to their weights, and each job draws from its own bucket
+    refilled at its share. Transfers report the bytes they received with
+    consume(), which sleeps once the job's bucket runs dry. Buckets hold
+    at most `burst` seconds of their share, so an idle job cannot save up
+    a burst. A rate of 0 turns the governor off.
+    """
+    def __init__(self, rate=0, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.jobs = {}  # job key -> {'weight', 'tokens', 'updated', 'throttled'}
+        self.throttled = 0.0  # Seconds transfers spent waiting, in total
+        self.lock = threading.Lock()
+
+    def set_rate(self, rate):
+        """Change the global cap; takes effect on the next chunk of every transfer"""
+        with self.lock:
+            self.rate = rate
+
+    def register(self, key, weight=1):
+        """Count a job as downloading, with its share weight"""
+        with self.lock:
+            self.jobs[key] = {'weight': max(float(weight), 0.01), 'tokens': 0.0,
+                              'updated': time.monotonic(), 'throttled': 0.0}
+
+    def unregister(self, key):
+        """Stop counting a job, giving its share back to the others"""
+        with self.lock:
+            self.jobs.pop(key, None)
+
+    def set_weight(self, key, weight):
+        """Change a downloading job's weight; returns False if it is not downloading"""
+        with self.lock:
+            job = self.jobs.get(key)
+            if job is None:
+                return False
+            job['weight'] = max(float(weight), 0.01)
+            return True
+
+    def _share(self, job):
+        total = sum(j['weight'] for j in self.jobs.values())
+        return self.rate * job['weight'] / total
+
+    def share(self, key):
+        """Bytes per second a downloading job may use now; 0 when uncapped or it is not downloading"""
+        with self.lock:
+            job = self.jobs.get(key)
+            if not self.rate or job is None:
+                return 0
+            return self._share(job)
+
+    def consume(self, key, nbytes, is_cancelled=None):
+        """Account for nbytes received by a job, sleeping as long as its share requires"""
+        if nbytes <= 0:
+            return
+        with self.lock:
+            job = self.jobs.get(key)
+            if not self.rate or job is None:
+                return
+
+            share = self._share(job)
+            now = time.monotonic()
+            job['tokens'] = min(job['tokens'] + (now - job['updated']) * share, share * self.burst)
+            job['updated'] = now
+            job['tokens'] -= nbytes
+            if job['tokens'] >= 0:
+                return
+            # Sleep off the debt; the tokens refill meanwhile
+            wait = -job['tokens'] / share
+            job['throttled'] += wait
+            self.throttled += wait
+
+        deadline = time.monotonic() + wait
+        while not (is_cancelled and is_cancelled()):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            time.sleep(min(remaining, 0.5))
+
+    def stats(self):
+        """Current cap and each downloading job's weight and share"""
+        with self.lock:
+            jobs = {str(key): {'weight': job['weight'],
+                               'share': self._share(job) if self.rate else 0,
+                               'throttled_seconds': round(job['throttled'], 3)}
+                    for key, job in self.jobs.items()}
+            return {'rate': self.rate, 'burst': self.burst, 'jobs': jobs,
+                    'throttled_seconds': round(self.throttled, 3)}
+
+# Shared governor every download reports to
+bandwidth_governor = BandwidthGovernor(parse_rate(BANDWIDTH_LIMIT), BANDWIDTH_BURST)
@@ -0,0 +1,156 @@
+#!/usr/bin/env python3
+# modules/download/bulk.py
+# Bulk URL import for YT Media Backup
+#
+# Command line:  python -m modules.download.bulk urls.txt --output-dir ~/Music
+
+import argparse
+import csv
+import json
+import sys
+import time
+from modules.config.settings import default_download_path, BULK_BATCH_SIZE
+from modules.utils.url_utils import canonical_media_id
+
+# Invalid lines reported back in full; the rest are only counted
+MAX_REPORTED_INVALID = 20
+
+def parse_line(line, url_column=None):
+    """Pull the URL out of one line of plain text, CSV or JSON lines
+
+    Returns (url, url_column): url is None when the line holds no URL, and
+    url_column is the CSV column URLs were found in, for the lines after.
+    """
+    line = line.strip().lstrip('\ufeff')
+    if not line or line.startswith('#'):
+        return '', url_column
+
+    if line.startswith('{'):
+        try:
+            record = json.loads(line)
+        except ValueError:
+            return None, url_column
+        url = record.get('url') if isinstance(record, dict) else None
+        return (url if isinstance(url, str) else None), url_column
+
+    if ',' in line or '\t' in line:
+        fields = next(csv.reader([line], delimiter='\t' if '\t' in line else ','))
+        if url_column is not None and url_column < len(fields):
+            return fields[url_column].strip(), url_column
+        for index, field in enumerate(fields):
+            field = field.strip()
+            if field.lower() == 'url':
+                # A header row: URLs are in this column from now on
+                return '', index
+            if canonical_media_id(field):
+                return field, index
+        return None, url_column
+
+    return line, url_column
+
+def iter_urls(lines):
+    """Yield (line_number, url, line) for each non-empty line, url None for invalid ones
+
+    Works on any iterable of lines, so an upload or a file is read one line
+    at a time and never held in memory as a whole.
+    """
+    url_column = None
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8', errors='replace')
+        url, url_column = parse_line(line, url_column)
+        if url == '':
+            continue
+        yield number, url, line
+
+def job_request(url, media_id, options):
+    """submit() arguments for one imported URL"""
+    playlist_mode = options.get('playlist_mode', 'auto')
+    if playlist_mode == 'auto':
+        # Playlist links download the whole playlist, video links just the video
+        playlist_mode = 'playlist' if media_id.startswith('youtube:playlist:') else 'single'
+    request = {key: value for key, value in options.items() if key != 'playlist_mode'}
+    request.update({'url': url, 'playlist_mode': playlist_mode})
+    return request
+
+def import_urls(lines, manager, options, batch_size=BULK_BATCH_SIZE, dry_run=False):
+    """Queue a job for every distinct URL in lines
+
+    URLs are canonicalized with canonical_media_id, so the same video or
+    playlist pasted in different forms, or already queued or running,
+    counts as a duplicate. Jobs are submitted in batches of batch_size,
+    one journal write per batch. options are submit() arguments shared by
+    every job; playlist_mode 'auto' picks it from each URL.
+    """
+    summary = {'lines': 0, 'accepted': 0, 'duplicates': 0, 'invalid': 0,
+               'invalid_lines': [], 'job_ids': []}
+    seen = {canonical_media_id(job.url) for job in manager.list_jobs() if not job.is_finished}
+    batch = []
+
+    def flush():
+        if batch and not dry_run:
+            summary['job_ids'].extend(job.id for job in manager.submit_many(batch))
+        batch.clear()
+
+    for number, url, line in iter_urls(lines):
+        summary['lines'] += 1
+        media_id = canonical_media_id(url) if url else None
+        if media_id is None:
+            summary['invalid'] += 1
+            if len(summary['invalid_lines']) < MAX_REPORTED_INVALID:
+                summary['invalid_lines'].append({'line': number, 'text': line.strip()[:200]})
+            continue
+        if media_id in seen:
+            summary['duplicates'] += 1
+            continue
+
+        seen.add(media_id)
+        summary['accepted'] += 1
+        batch.append(job_request(url.strip(), media_id, options))
+        if len(batch) >= batch_size:
+            flush()
+    flush()
+    return summary
+
+def main(argv=None):
+    """Import a file of URLs from the command line and run the jobs until done"""
+    parser = argparse.ArgumentParser(description='Queue a download for every URL in a text, CSV or JSON lines file.')
+    parser.add_argument('file', help="file of URLs, or '-' for standard input")
+    parser.add_argument('--output-dir', default=default_download_path, help='where to save downloads')
+    parser.add_argument('--type', dest='download_type', choices=('audio', 'video'), default='audio')
+    parser.add_argument('--playlist-mode', choices=('auto', 'single', 'playlist'), default='auto',
+                        help="'auto' downloads whole playlists for playlist links only")
+    parser.add_argument('--dry-run', action='store_true', help='only count accepted, duplicate and invalid URLs')
+    args = parser.parse_args(argv)
+
+    from modules.download.jobs import job_manager
+
+    options = {'output_dir': args.output_dir, 'download_type': args.download_type,
+               'playlist_mode': args.playlist_mode}
+    if args.file == '-':
+        summary = import_urls(sys.stdin, job_manager, options, dry_run=args.dry_run)
+    else:
+        with open(args.file, 'r', encoding='utf-8', errors='replace') as f:
+            summary = import_urls(f, job_manager, options, dry_run=args.dry_run)
+
+    print(f"{summary['accepted']} accepted, {summary['duplicates']} duplicate, {summary['invalid']} invalid "
+          f"({summary['lines']} lines)")
+    for invalid in summary['invalid_lines']:
+        print(f"  line {invalid['line']}: {invalid['text']}")
+    if args.dry_run or not summary['job_ids']:
+        return 0
+
+    # Run the queued jobs here, reporting as each one finishes
+    pending = set(summary['job_ids'])
+    while pending:
+        time.sleep(1)
+        for job_id in list(pending):
+            job = job_manager.get(job_id)
+            if job is None or job.is_finished:
+                pending.discard(job_id)
+                if job is not None:
+                    print(f"[{job.state['status']}] {job.url}: {job.state['message']}")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# modules/download/jobs.py
+# Download job queue for YT Media Backup
+
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from modules.config.settings import (current_download, DOWNLOAD_WORKERS, PLAYLIST_WORKERS, MAX_TRACKED_JOBS,
+                                     AUDIO_PROFILE, WORKER_PROCESSES, WORKER_JOB_RETRIES)
+from modules.download.media import download_media
+from modules.download.bandwidth import bandwidth_governor
+from modules.download.journal import job_journal
+from modules.download.profiling import JobProfiler, profiling
+from modules.download.workers import ProgressBoard, WorkerProcess, WorkerLost
+from modules.utils.metrics import metrics, JOB_SECONDS, JOBS
+
+# Statuses after which a job no longer changes
+FINISHED_STATUSES = ('completed', 'completed_with_errors', 'error', 'cancelled')
+
+class ChangeNotifier:
+    """Global change counter that event streams can wait on"""
+    def __init__(self):
+        self.condition = threading.Condition()
+        self.version = 0
+        self.listeners = []
+
+    def notify(self):
+        with self.condition:
+            self.version += 1
+            self.condition.notify_all()
+        for listener in self.listeners:
+            listener()
+
+    def subscribe(self, listener):
+        """Call listener() after every change, from the changing thread; it must not block"""
+        self.listeners = self.listeners + [listener]
+
+    def wait(self, last_version, timeout=None):
+        """Block until something changed after last_version; return the new version"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.version != last_version, timeout)
+            return self.version
+
+def journal(method, *args):
+    """Call a job journal method, logging rather than failing the job on errors"""
+    try:
+        return getattr(job_journal, method)(*args)
+    except sqlite3.Error as e:
+        print(f"Error writing job journal: {e}")
+        return None
+
+# Woken whenever any job's state changes
+job_events = ChangeNotifier()
+
+class ProgressState:
+    """Job status record published as versioned, immutable snapshots
+
+    Writers build a new snapshot dict under a lock and swap it in with a
+    single attribute assignment, so readers always see a consistent set
+    of fields without taking the lock. Writes that change nothing do not
+    bump the version or wake event listeners.
+    """
+    __slots__ = ('_lock', '_snapshot', 'version')
+
+    def __init__(self, initial=None):
+        self._lock = threading.Lock()
+        self._snapshot = dict(initial or {})
+        self.version = 0
+
+    def snapshot(self):
+        """Current state; treat it as read-only"""
+        return self._snapshot
+
+    def get(self, key, default=None):
+        return self._snapshot.get(key, default)
+
+    def __getitem__(self, key):
+        return self._snapshot[key]
+
+    def __setitem__(self, key, value):
+        self.update({key: value})
+
+    def update(self, changes):
+        """Apply several fields as one change; return whether anything changed"""
+        with self._lock:
+            current = self._snapshot
+            changed = {key: value for key, value in changes.items()
+                       if key not in current or current[key] != value}
+            if not changed:
+                return False
+            snapshot = dict(current)
+            snapshot.update(changed)
+            self._snapshot = snapshot
+            self.version += 1
+        job_events.notify()
+        return True
+
+class DownloadJob:
+    """A single download request and its own progress state"""
+    def __init__(self, url, output_dir, download_type='audio', playlist_mode='single',
+                 parallel_entries=PLAYLIST_WORKERS, use_archive=True, audio_profile=AUDIO_PROFILE, weight=1,
+                 profile=False, job_id=None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.url = url
+        self.output_dir = output_dir
+        self.download_type = download_type
+        self.playlist_mode = playlist_mode
+        self.parallel_entries = parallel_entries
+        self.use_archive = use_archive
+        self.audio_profile = audio_profile
+        self.weight = weight  # Share of the bandwidth cap relative to other jobs
+        self.profile = profile  # Capture a CPU and memory profile of this job
+        self.profiler = None  # Its JobProfiler while it runs
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.cancel_requested = False
+        # Times the job was queued again after its worker process was lost
+        self.worker_restarts = 0
+        # Set once the job is in the journal; completed_entries then survive a restart
+        self.journalled = False
+        self.completed_entries = set()
+
+        # Start from the same fields the UI already reads for a download
+        self.state = ProgressState(current_download)
+        self.state.update({
+            'job_id': self.id,
+            'status': 'queued',
+            'message': 'Waiting in queue...',
+            'output_path': output_dir,
+            'selected_mode': playlist_mode
+        })
+
+    @property
+    def is_finished(self):
+        return self.state.get('status') in FINISHED_STATUSES
+
+    def entry_done(self, video_id):
+        """Record an entry as fully downloaded, so a resumed job skips it"""
+        if not video_id:
+            return
+        self.completed_entries.add(video_id)
+        if self.journalled:
+            journal('entry_done', self.id, video_id)
+
+    def to_dict(self):
+        """Flat view of the job: request fields plus the current state"""
+        data = dict(self.state.snapshot())
+        data.update({
+            'job_id': self.id,
+            'url': self.url,
+            'download_type': self.download_type,
+            'playlist_mode': self.playlist_mode,
+            'parallel_entries': self.parallel_entries,
+            'use_archive': self.use_archive,
+            'audio_profile': self.audio_profile,
+            'weight': self.weight,
+            'profile': self.profile,
+            'worker_restarts': self.worker_restarts,
+            'created_at': self.created_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'version': self.state.version
+        })
+        return data
+
+class JobManager:
+    """Queue of download jobs drained by a fixed pool of worker threads
+
+    With processes set, each worker thread runs its jobs in a worker
+    process of its own (see modules/download/workers.py) and follows their
+    progress through a shared-memory board; a job whose process dies,
+    hangs or stops making progress is queued again, up to
+    WORKER_JOB_RETRIES times.
+    """
+    def __init__(self, workers=DOWNLOAD_WORKERS, max_tracked=MAX_TRACKED_JOBS, processes=WORKER_PROCESSES):
+        self.workers = max(1, workers)
+        self.max_tracked = max_tracked
+        self.processes = processes
+        self.board = None
+        self.jobs = OrderedDict()
+        self.latest_job_id = None
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.threads = []
+
+    def start(self):
+        """Start the worker threads (only once)"""
+        with self.lock:
+            if self.threads:
+                return
+            if self.processes:
+                self.board = ProgressBoard(self.workers)
+            for i in range(self.workers):
+                process = WorkerProcess(self.board, i) if self.processes else None
+                thread = threading.Thread(target=self._worker, args=(process,), name=f'download-worker-{i}')
+                thread.daemon = True
+                thread.start()
+                self.threads.append(thread)
+
+    def submit(self, url, output_dir, download_type='audio', playlist_mode='single',
+               parallel_entries=PLAYLIST_WORKERS, use_archive=True, audio_profile=AUDIO_PROFILE, weight=1,
+               profile=False):
+        """Create a job and put it on the queue"""
+        job = DownloadJob(url, output_dir, download_type, playlist_mode, parallel_entries, use_archive,
+                          audio_profile, weight, profile)
+        # Journal the job before queueing it, so a crash cannot lose it
+        job.journalled = bool(journal('add', job))
+        self._enqueue([job])
+        return job
+
+    def submit_many(self, requests):
+        """Create and queue a job for each dict of submit() arguments, journalling them together"""
+        jobs = [DownloadJob(**request) for request in requests]
+        journalled = bool(journal('add_many', jobs))
+        for job in jobs:
+            job.journalled = journalled
+        self._enqueue(jobs)
+        return jobs
+
+    def _enqueue(self, jobs):
+        with self.lock:
+            for job in jobs:
+                self.jobs[job.id] = job
+                self.latest_job_id = job.id
+            self._prune()
+
+        self.start()
+        for job in jobs:
+            self.queue.put(job.id)
+
+    def resume(self):
+        """Queue again the jobs an earlier run left unfinished; returns them
+
+        Entries those jobs completed are skipped, and yt-dlp continues
+        partly downloaded files from their .part files.
+        """
+        try:
+            interrupted = job_journal.take_interrupted()
+        except sqlite3.Error as e:
+            print(f"Error reading job journal: {e}")
+            return []
+
+        resumed = []
+        for fields, done in interrupted:
+            job = DownloadJob(fields['url'], fields['output_dir'], fields['download_type'],
+                              fields['playlist_mode'], fields['parallel_entries'], bool(fields['use_archive']),
+                              fields['audio_profile'], fields['weight'], job_id=fields['job_id'])
+            job.created_at = fields['created_at']
+            job.journalled = True
+            job.completed_entries = done
+            job.state.update({'message': 'Waiting in queue (resuming after restart)...',
+                              'resumed_entries': len(done)})
+            resumed.append(job)
+        self._enqueue(resumed)
+        return resumed
+
+    def get(self, job_id):
+        """Return a job by ID, or None"""
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def latest(self):
+        """Return the most recently submitted job, or None"""
+        with self.lock:
+            return self.jobs.get(self.latest_job_id)
+
+    def list_jobs(self):
+        """Return all tracked jobs, oldest first"""
+        with self.lock:
+            return list(self.jobs.values())
+
+    def cancel(self, job_id):
+        """Request cancellation of a queued or running job"""
+        job = self.get(job_id)
+        if job is None or job.is_finished:
+            return job
+
+        job.cancel_requested = True
+
+        # Queued jobs never reach a progress hook, so mark them right away
+        if job.state['status'] == 'queued':
+            job.state.update({'status': 'cancelled', 'message': 'Download cancelled by user'})
+            job.finished_at = time.time()
+        return job
+
+    def set_weight(self, job_id, weight):
+        """Change a job's bandwidth weight, taking effect at once if it is downloading"""
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.weight = weight
+        bandwidth_governor.set_weight(job.id, weight)
+        return job
+
+    def _prune(self):
+        """Forget the oldest finished jobs once we track too many"""
+        excess = len(self.jobs) - self.max_tracked
+        if excess <= 0:
+            return
+        for job_id in [j.id for j in self.jobs.values() if j.is_finished][:excess]:
+            del self.jobs[job_id]
+
+    def _worker(self, process=None):
+        """Take jobs off the queue and run them one at a time, in process when given"""
+        while True:
+            job_id = self.queue.get()
+            job = self.get(job_id)
+            requeued = False
+            try:
+                if job is None or job.cancel_requested:
+                    continue
+
+                job.started_at = time.time()
+                if job.journalled:
+                    journal('started', job.id)
+                if process is not None:
+                    # The worker process profiles the job itself
+                    job.profile = job.profile or profiling['all_jobs']
+                    try:
+                        process.run(job)
+                    except WorkerLost as e:
+                        requeued = self._retry_lost(job, e)
+                elif job.profile or profiling['all_jobs']:
+                    job.profile = True
+                    job.profiler = JobProfiler(job)
+                    with job.profiler:
+                        self._run(job)
+                else:
+                    self._run(job)
+            except Exception as e:
+                job.state.update({'status': 'error', 'message': f'Error: {str(e)}'})
+            finally:
+                # A job queued again is not finished yet
+                if job is not None and not requeued:
+                    self._finished(job)
+                self.queue.task_done()
+
+    def _finished(self, job):
+        if job.finished_at is None:
+            job.finished_at = time.time()
+        if job.started_at is not None:
+            JOB_SECONDS.observe(job.finished_at - job.started_at, download_type=job.download_type)
+            JOBS.inc(status=job.state.get('status'))
+        # Finished jobs need no resuming; anything else stays journalled
+        if job.journalled and job.is_finished:
+            journal('finish', job.id)
+
+    def _retry_lost(self, job, error):
+        """Queue a job again after its worker process was lost; returns whether it was"""
+        if job.cancel_requested:
+            job.state.update({'status': 'cancelled', 'message': 'Download cancelled by user'})
+            return False
+        if job.worker_restarts >= WORKER_JOB_RETRIES:
+            job.state.update({'status': 'error', 'message': f'Error: {error}'})
+            return False
+
+        job.worker_restarts += 1
+        # Entries the lost process completed are skipped on the next attempt
+        job.state.update({'status': 'queued',
+                          'message': f'{error}; queued again ({job.worker_restarts}/{WORKER_JOB_RETRIES})...'})
+        self.queue.put(job.id)
+        return True
+
+    def _run(self, job):
+        download_media(job.url, job.output_dir, job.download_type, job.playlist_mode,
+                       job=job, parallel_entries=job.parallel_entries,
+                       use_archive=job.use_archive, audio_profile=job.audio_profile,
+                       weight=job.weight)
+
+    def counts(self):
+        """Number of tracked jobs that are queued and that are running"""
+        jobs = self.list_jobs()
+        queued = sum(1 for job in jobs if job.state.get('status') == 'queued')
+        running = sum(1 for job in jobs if not job.is_finished) - queued
+        return queued, running
+
+# Shared job manager used by the API routes
+job_manager = JobManager()
+
+metrics.gauge('ytmb_jobs_queued', 'Jobs waiting for a download worker', lambda: job_manager.counts()[0])
+metrics.gauge('ytmb_jobs_active', 'Jobs downloading or converting', lambda: job_manager.counts()[1])
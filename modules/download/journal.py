@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+# modules/download/journal.py
+# Job journal for YT Media Backup
+
+import os
+import sqlite3
+import threading
+import time
+from modules.config.settings import JOB_JOURNAL_DB
+
+# A job that keeps dying mid-download is dropped after this many restarts
+MAX_RESUMES = 3
+
+# Request fields stored for every job, enough to queue it again
+JOB_FIELDS = ('url', 'output_dir', 'download_type', 'playlist_mode', 'parallel_entries', 'use_archive',
+              'audio_profile', 'weight')
+
+class JobJournal:
+    """Write-ahead record of unfinished download jobs
+
+    A job is written before it is queued, each of its entries as soon as
+    it is complete, and the job is removed once it finishes, is cancelled
+    or fails. Whatever is left on startup was interrupted and can be queued
+    again, skipping the entries already done. Writes are single
+    transactions on a WAL database with synchronous=FULL.
+    """
+    def __init__(self, db_path=JOB_JOURNAL_DB):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.connection = None
+
+    def _connect(self):
+        # Opened on first use so importing this module stays cheap
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+            connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            connection.row_factory = sqlite3.Row
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=FULL')
+            with connection:
+                connection.execute('''
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        job_id TEXT PRIMARY KEY,
+                        url TEXT NOT NULL,
+                        output_dir TEXT NOT NULL,
+                        download_type TEXT,
+                        playlist_mode TEXT,
+                        parallel_entries INTEGER,
+                        use_archive INTEGER,
+                        audio_profile TEXT,
+                        weight REAL,
+                        created_at REAL NOT NULL,
+                        started_at REAL,
+                        resumes INTEGER NOT NULL DEFAULT 0
+                    )
+                ''')
+                connection.execute('''
+                    CREATE TABLE IF NOT EXISTS done_entries (
+                        job_id TEXT NOT NULL,
+                        video_id TEXT NOT NULL,
+                        PRIMARY KEY (job_id, video_id)
+                    )
+                ''')
+            self.connection = connection
+        return self.connection
+
+    def add(self, job):
+        """Record a job before it is queued; returns True"""
+        return self.add_many([job])
+
+    def add_many(self, jobs):
+        """Record several jobs in one transaction; returns True"""
+        rows = [[job.id] + [getattr(job, field) for field in JOB_FIELDS] + [job.created_at] for job in jobs]
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.executemany(
+                    f"INSERT OR REPLACE INTO jobs (job_id, {', '.join(JOB_FIELDS)}, created_at) "
+                    f"VALUES (?, {', '.join('?' * len(JOB_FIELDS))}, ?)", rows)
+        return True
+
+    def started(self, job_id):
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('UPDATE jobs SET started_at = ? WHERE job_id = ?', (time.time(), job_id))
+
+    def entry_done(self, job_id, video_id):
+        """Record that one entry of a job is downloaded and converted"""
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('INSERT OR IGNORE INTO done_entries (job_id, video_id) VALUES (?, ?)',
+                                   (job_id, video_id))
+
+    def finish(self, job_id):
+        """Forget a job that will not need resuming"""
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                connection.execute('DELETE FROM done_entries WHERE job_id = ?', (job_id,))
+                connection.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+
+    def take_interrupted(self):
+        """Jobs left over from the last run, oldest first, as (fields, done video IDs)
+
+        A job that had started counts one more restart, and is dropped
+        instead of returned once past MAX_RESUMES; one that was still
+        waiting in the queue did not crash anything and is always
+        returned. started_at is cleared, so it only says whether the job
+        started during the run now being recovered from.
+        """
+        with self.lock:
+            connection = self._connect()
+            with connection:
+                # Entries recorded while their job was being removed
+                connection.execute('DELETE FROM done_entries WHERE job_id NOT IN (SELECT job_id FROM jobs)')
+                for (job_id,) in connection.execute(
+                        'SELECT job_id FROM jobs WHERE started_at IS NOT NULL AND resumes >= ?',
+                        (MAX_RESUMES,)).fetchall():
+                    print(f"Not resuming job {job_id}: interrupted {MAX_RESUMES} times")
+                    connection.execute('DELETE FROM done_entries WHERE job_id = ?', (job_id,))
+                    connection.execute('DELETE FROM jobs WHERE job_id = ?', (job_id,))
+                connection.execute('UPDATE jobs SET resumes = resumes + 1, started_at = NULL '
+                                   'WHERE started_at IS NOT NULL')
+
+            jobs = []
+            for row in connection.execute('SELECT * FROM jobs ORDER BY created_at').fetchall():
+                done = {video_id for (video_id,) in connection.execute(
+                    'SELECT video_id FROM done_entries WHERE job_id = ?', (row['job_id'],))}
+                jobs.append((dict(row), done))
+        return jobs
+
+    def close(self):
+        """Close the database connection; it is reopened on next use"""
+        with self.lock:
+            if self.connection is not None:
+                self.connection.close()
+                self.connection = None
+
+# Shared journal used by the job manager
+job_journal = JobJournal()
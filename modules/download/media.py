@@ -6,12 +6,72 @@ import os
 import re
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 import yt_dlp
-from modules.utils.file_utils import sanitize_filename
-from modules.config.settings import current_download, download_history, cancel_requested
+from modules.utils.file_utils import sanitize_filename, sanitize_file, move_file, claim_name
+from modules.utils.url_utils import canonical_media_id
+from modules.utils.cache import MetadataCache
+from modules.utils.metrics import (PHASE_SECONDS, DOWNLOADED_BYTES, FILES, RETRIES, ERRORS, postprocessor_timer,
+                                   count_extractions)
+from modules.download.retry import RetryEngine, is_permanent_error, new_entry_result, public_entry_result
+from modules.download.archive import download_archive, archive_key
+from modules.download.bandwidth import bandwidth_governor
+from modules.download.transcode import TranscodeStage, TranscodeHandoffPP, audio_plan
+from modules.download.profiling import profiled_thread
+from modules.download.resolve import EntryResolver
+from modules.download.playlist import open_url_info, compact_entry, PlaylistListing, PlaylistStream
+from modules.config.history import record_download
+from modules.config.settings import (current_download, PLAYLIST_WORKERS, AUDIO_PROFILE, PROGRESS_UPDATE_INTERVAL,
+                                     PRERESOLVE_AHEAD, PLAYLIST_PROBE_ENTRIES, METADATA_CACHE_ENTRIES,
+                                     METADATA_CACHE_TTL, METADATA_CACHE_DIR, METADATA_CACHE_MAX_BYTES)
 
-def get_video_info(url):
-    """Get information about the video or playlist"""
+# Cache of get_video_info results, keyed by canonical video/playlist ID
+metadata_cache = MetadataCache(METADATA_CACHE_ENTRIES, METADATA_CACHE_TTL,
+                               METADATA_CACHE_DIR, METADATA_CACHE_MAX_BYTES)
+
+def extract_url_info(url, ydl_opts, state=None):
+    """Run one yt-dlp metadata extraction, counting it against the job state"""
+    with PHASE_SECONDS.time(phase='extract'), yt_dlp.YoutubeDL(ydl_opts) as ydl:
+        # Jobs expose how many extractions they needed, so duplicates are easy to spot
+        return count_extractions(ydl, state).extract_info(url, download=False)
+
+def open_listing(url, ydl_opts, state=None):
+    """Extract url, leaving a playlist's entries to be listed lazily
+
+    Returns (info, listing): a playlist comes back as a PlaylistListing
+    (and info None), anything else as its info dict, processed the way
+    extract_url_info would have.
+    """
+    ydl, info = open_url_info(url, ydl_opts, state)
+    if info and info.get('_type') == 'playlist':
+        return None, PlaylistListing(ydl, info)
+    try:
+        return ydl.process_ie_result(info, download=False), None
+    finally:
+        ydl.close()
+
+def playlist_summary(listing, peek_entries):
+    """Entry count of a listing for the summary: (count, whether it is final)
+
+    Up to peek_entries entries are listed to count them; past that the
+    count is what the site reported, or the entries listed so far.
+    """
+    listing.peek(peek_entries)
+    if listing.total is not None:
+        return listing.total, listing.complete
+    return listing.count, False
+
+def probe_url(url, state=None, want_video=True, want_playlist=True, peek_entries=PLAYLIST_PROBE_ENTRIES):
+    """Get information about the video or playlist, keeping what was extracted
+    
+    Returns (summary, video_info, listing). The summary is what
+    get_video_info reports; video_info and the PlaylistListing are None
+    when they were not extracted, and are reused by download_media
+    instead of extracting again. A listing holds its YoutubeDL open until
+    listed to the end or closed, which the caller does.
+    want_video/want_playlist skip lookups the caller has no use for, and
+    playlists are only listed as far as peek_entries to count them.
+    """
     ydl_opts = {
         'quiet': True,
         'extract_flat': True,
@@ -19,170 +79,696 @@ def get_video_info(url):
     }
     
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
+        info, listing = open_listing(url, ydl_opts, state)
+        
+        # Check if it's a playlist
+        if listing is not None:
+            try:
+                entries, entries_complete = playlist_summary(listing, peek_entries)
+                first = listing.peek(1) if want_video else []
+            except Exception:
+                listing.close()
+                raise
             
-            # Check if it's a playlist
-            if '_type' in info and info['_type'] == 'playlist':
-                # Get info for the first video to determine if this is a video within a playlist
-                if len(info.get('entries', [])) > 0 and 'url' in info['entries'][0]:
-                    first_video_url = info['entries'][0]['url']
-                    try:
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl2:
-                            video_info = ydl2.extract_info(first_video_url, download=False)
-                            
-                            return {
-                                'is_playlist': True,
-                                'is_video_in_playlist': True,
-                                'title': info.get('title', 'Playlist'),
-                                'video_title': video_info.get('title', 'Video'),
-                                'entries': len(info.get('entries', [])),
-                                'url': url,
-                                'video_url': first_video_url
-                            }
-                    except Exception:
-                        # If fetching individual video info fails, continue with playlist info
-                        pass
-                
-                return {
-                    'is_playlist': True,
-                    'is_video_in_playlist': False,
-                    'title': info.get('title', 'Playlist'),
-                    'entries': len(info.get('entries', [])),
-                    'url': url
-                }
-            else:
-                # Check if this URL is part of a playlist by looking for the playlist parameter
-                if 'list=' in url and 'youtube.com' in url:
-                    # Try to get playlist info
-                    playlist_url = url
-                    if '&list=' in url:
-                        playlist_url = 'https://www.youtube.com/playlist?list=' + url.split('&list=')[1].split('&')[0]
-                    elif '?list=' in url:
-                        playlist_url = 'https://www.youtube.com/playlist?list=' + url.split('?list=')[1].split('&')[0]
+            # Get info for the first video to determine if this is a video within a playlist
+            if first and isinstance(first[0], dict) and 'url' in first[0]:
+                first_video_url = first[0]['url']
+                try:
+                    video_info = extract_url_info(first_video_url, ydl_opts, state)
                     
-                    try:
-                        with yt_dlp.YoutubeDL(ydl_opts) as ydl2:
-                            playlist_info = ydl2.extract_info(playlist_url, download=False)
-                            
-                            if '_type' in playlist_info and playlist_info['_type'] == 'playlist':
-                                return {
-                                    'is_playlist': True,
-                                    'is_video_in_playlist': True,
-                                    'title': playlist_info.get('title', 'Playlist'),
-                                    'video_title': info.get('title', 'Video'),
-                                    'entries': len(playlist_info.get('entries', [])),
-                                    'url': url,
-                                    'playlist_url': playlist_url
-                                }
-                    except Exception:
-                        # If fetching playlist info fails, continue with single video info
-                        pass
+                    return {
+                        'is_playlist': True,
+                        'is_video_in_playlist': True,
+                        'title': listing.title or 'Playlist',
+                        'video_title': video_info.get('title', 'Video'),
+                        'entries': entries,
+                        'entries_complete': entries_complete,
+                        'url': url,
+                        'video_url': first_video_url
+                    }, video_info, listing
+                except Exception:
+                    # If fetching individual video info fails, continue with playlist info
+                    pass
+            
+            return {
+                'is_playlist': True,
+                'is_video_in_playlist': False,
+                'title': listing.title or 'Playlist',
+                'entries': entries,
+                'entries_complete': entries_complete,
+                'url': url
+            }, None, listing
+        else:
+            # Check if this URL is part of a playlist by looking for the playlist parameter
+            if want_playlist and 'list=' in url and 'youtube.com' in url:
+                # Try to get playlist info
+                playlist_url = url
+                if '&list=' in url:
+                    playlist_url = 'https://www.youtube.com/playlist?list=' + url.split('&list=')[1].split('&')[0]
+                elif '?list=' in url:
+                    playlist_url = 'https://www.youtube.com/playlist?list=' + url.split('?list=')[1].split('&')[0]
                 
-                # Not a playlist
-                return {
-                    'is_playlist': False,
-                    'title': info.get('title', 'Video'),
-                    'url': url
-                }
+                try:
+                    _, listing = open_listing(playlist_url, ydl_opts, state)
+                    
+                    if listing is not None:
+                        try:
+                            entries, entries_complete = playlist_summary(listing, peek_entries)
+                        except Exception:
+                            listing.close()
+                            raise
+                        return {
+                            'is_playlist': True,
+                            'is_video_in_playlist': True,
+                            'title': listing.title or 'Playlist',
+                            'video_title': info.get('title', 'Video'),
+                            'entries': entries,
+                            'entries_complete': entries_complete,
+                            'url': url,
+                            'playlist_url': playlist_url
+                        }, info, listing
+                except Exception:
+                    # If fetching playlist info fails, continue with single video info
+                    pass
+            
+            # Not a playlist
+            return {
+                'is_playlist': False,
+                'title': info.get('title', 'Video'),
+                'url': url
+            }, info, None
     except Exception as e:
+        ERRORS.inc(phase='extract')
         return {
             'is_playlist': False,
             'title': 'Unknown',
             'error': str(e),
             'url': url
-        }
+        }, None, None
+
+def get_video_info(url, use_cache=True):
+    """Get information about the video or playlist
+    
+    Results are cached by canonical video/playlist ID; use_cache=False
+    skips the lookup and refreshes the cached entry.
+    """
+    with PHASE_SECONDS.time(phase='video_info'):
+        return _get_video_info(url, use_cache)
+
+def _get_video_info(url, use_cache):
+    key = canonical_media_id(url)
+    if use_cache and key:
+        cached = metadata_cache.get(key)
+        if cached is not None:
+            # The same media may have been looked up through another URL form
+            return dict(cached, url=url, cached=True)
+    
+    info, _, listing = probe_url(url)
+    if listing is not None:
+        listing.close()
+    
+    # Failed lookups are worth retrying, so only successes are kept
+    if key and 'error' not in info:
+        metadata_cache.set(key, info)
+    return info
 
 class DownloadProgress:
-    """Progress callback for YT-DLP"""
-    def __init__(self, total_files=1):
+    """Progress callback for YT-DLP, tracking each playlist entry separately
+    and rolling them up into playlist-level progress, speed and ETA
+    
+    yt-dlp can report thousands of chunks per second, so "downloading"
+    reports are only folded into the job state every min_interval seconds;
+    in between, the hook just keeps the latest report for each entry.
+    Only entries downloading now are tracked one by one: a finished entry
+    is folded into running totals, so neither memory nor the work per
+    update grows with the size of the playlist.
+    """
+    def __init__(self, total_files=1, job=None, min_interval=PROGRESS_UPDATE_INTERVAL, manifest=None):
         self.current_file = ""
         self.total_files = total_files
         self.completed_files = 0
+        self.job = job
+        self.manifest = manifest
+        self.min_interval = min_interval
+        self.last_publish = 0
+        # Write into the job's own state record, or the global one for direct calls
+        self.state = job.state if job else current_download
+        # Progress of the entries downloading now, keyed by video ID (hooks fire from several threads)
+        self.entries = {}
+        self.pending = {}
+        # Total size of the finished entries whose size was known, and how many those were
+        self.finished_bytes = 0
+        self.finished_sized = 0
+        # Bytes already reported per file being downloaded, by entry, to tell
+        # the bandwidth governor what each chunk added
+        self.received = {}
+        self.lock = threading.Lock()
+    
+    def _entry_key(self, d):
+        """Key a hook call by its video ID, so merged formats count as one entry"""
+        info = d.get('info_dict') or {}
+        return info.get('id') or d.get('filename', '')
+    
+    def _fold_pending(self):
+        """Turn the latest raw report of each entry into its progress record"""
+        pending, self.pending = self.pending, {}
+        for key, d in pending.items():
+            downloaded_bytes = d.get("downloaded_bytes", 0) or 0
+            total_bytes = d.get("total_bytes", 0) or d.get("total_bytes_estimate", 0) or 0
+            self.entries[key] = {
+                'file': os.path.basename(d.get("filename", "")),
+                'path': d.get("filename", ""),
+                'downloaded_bytes': downloaded_bytes,
+                'total_bytes': total_bytes,
+                'speed': d.get("speed", 0) or 0,
+                'eta': d.get("eta", 0) or 0,
+                'progress': (downloaded_bytes / total_bytes * 100) if total_bytes else 0
+            }
+    
+    def _is_last_part(self, d):
+        """Whether a "finished" report ends its entry: a merged video reports
+        one per format, and only the last format's ends it"""
+        info = d.get('info_dict') or {}
+        parts = [f.get('format_id') for f in info.get('requested_formats') or []]
+        return info.get('format_id') not in parts[:-1]
+    
+    def _rollup(self):
+        """Combine the records of the active entries and the finished totals into playlist-level figures"""
+        active = list(self.entries.values())
+        speed = sum(e['speed'] for e in active)
+        
+        # Finished entries count in full, active ones by their own progress
+        partial = sum(e['progress'] for e in active) / 100
+        total_progress = min((self.completed_files + partial) * 100 / self.total_files, 100) if self.total_files else 0
+        
+        # Estimate entries not started yet from the average size seen so far
+        known_sizes = [e['total_bytes'] for e in active if e['total_bytes']]
+        sized = self.finished_sized + len(known_sizes)
+        average_size = (self.finished_bytes + sum(known_sizes)) / sized if sized else 0
+        not_started = max(self.total_files - self.completed_files - len(active), 0)
+        remaining = sum(max(e['total_bytes'] - e['downloaded_bytes'], 0) for e in active) + not_started * average_size
+        
+        return {
+            'speed': speed,
+            'eta': int(remaining / speed) if speed else 0,
+            'total_progress': total_progress,
+            'active_files': [{'file': e['file'], 'progress': e['progress']} for e in active]
+        }
+    
+    def _publish(self, key):
+        """Write one consistent update for the entry that reported last"""
+        self._fold_pending()
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        
+        update = {
+            'status': 'downloading',
+            'downloaded_bytes': entry['downloaded_bytes'],
+            'total_bytes': entry['total_bytes'],
+            'progress': entry['progress']
+        }
+        
+        # Update current file info
+        if entry['file'] and entry['path'] != self.current_file:
+            self.current_file = entry['path']
+            update['current_file'] = entry['file']
+            update['message'] = f"Downloading: {entry['file']}"
+        
+        update.update(self._rollup())
+        self.state.update(update)
         
     def progress_hook(self, d):
         """Handle download progress updates"""
         if d["status"] == "downloading":
-            # Update current file info
-            if "filename" in d and d["filename"] != self.current_file:
-                self.current_file = d["filename"]
-                filename = os.path.basename(d["filename"])
-                current_download["current_file"] = filename
-                current_download["message"] = f"Downloading: {filename}"
+            if self.job and self.job.cancel_requested:
+                self.state.update({"status": "cancelled", "message": "Download cancelled by user"})
+                # Abort the transfer; download_media turns this into a cancelled job
+                raise yt_dlp.utils.DownloadCancelled()
             
-            # Calculate download progress
-            downloaded_bytes = d.get("downloaded_bytes", 0)
-            total_bytes = d.get("total_bytes", 0) or d.get("total_bytes_estimate", 0)
-            speed = d.get("speed", 0)
-            eta = d.get("eta", 0)
+            key = self._entry_key(d)
             
-            # Always provide consistent progress data
-            current_download.update({
-                'status': 'downloading',
-                'downloaded_bytes': downloaded_bytes,
-                'total_bytes': total_bytes,
-                'speed': speed,
-                'eta': eta,
-                'progress': (downloaded_bytes / total_bytes * 100) if total_bytes else 0
-            })
+            # Hold this transfer to its job's share of the global bandwidth cap
+            path = d.get('filename') or d.get('tmpfilename', '')
+            downloaded_bytes = d.get('downloaded_bytes') or 0
+            files = self.received.setdefault(key, {})
+            received = downloaded_bytes - files.get(path, 0)
+            files[path] = downloaded_bytes
+            if received > 0:
+                DOWNLOADED_BYTES.inc(received)
+            bandwidth_governor.consume(self.job.id if self.job else None, received,
+                                       lambda: bool(self.job and self.job.cancel_requested))
             
-            if cancel_requested:
-                current_download["status"] = "cancelled"
-                current_download["message"] = "Download cancelled by user"
-                return
+            # Under the lock, or the entry threads could add to a pending
+            # dict while another thread is folding it
+            with self.lock:
+                self.pending[key] = d
+                
+                # Coalesce chunk reports to at most one state update per min_interval
+                now = time.monotonic()
+                if now - self.last_publish < self.min_interval:
+                    return
+                
+                self.last_publish = now
+                self._publish(key)
         
         elif d['status'] == 'finished':
-            self.completed_files += 1
-            current_download.update({
-                'status': 'processing',
-                'completed_files': self.completed_files,
-                'progress': 100,
-                'message': f"Processing {os.path.basename(d['filename'])}..."
-            })
+            key = self._entry_key(d)
             
-            # Update total progress for playlist
-            if self.total_files > 1:
-                current_download['total_progress'] = min((self.completed_files * 100) / self.total_files, 100)
+            # Record the file in case no post-processor gets to rename it
+            if self.manifest is not None:
+                self.manifest.add(d.get('filename'), (d.get('info_dict') or {}).get('id'))
             
-            # Check if this was the last file
-            if self.completed_files >= self.total_files:
-                current_download.update({
-                    'status': 'completed',
-                    'total_progress': 100,
-                    'message': 'Download completed successfully!'
-                })
+            with self.lock:
+                self._fold_pending()
+                
+                # The entry, or this format of it, leaves the active set; its size goes into the totals
+                entry = self.entries.pop(key, None)
+                self.received.get(key, {}).pop(d.get('filename'), None)
+                if self._is_last_part(d):
+                    self.received.pop(key, None)
+                    self.completed_files += 1
+                    if entry and entry['total_bytes']:
+                        self.finished_bytes += entry['total_bytes']
+                        self.finished_sized += 1
+                
+                update = {
+                    'status': 'processing',
+                    'completed_files': self.completed_files,
+                    'progress': 100,
+                    'message': f"Processing {os.path.basename(d['filename'])}..."
+                }
+                update.update(self._rollup())
+                
+                # Converting and bookkeeping still follow; download_media sets the final status
+                if self.completed_files >= self.total_files:
+                    update['total_progress'] = 100
+                self.state.update(update)
         
         elif d['status'] == 'error':
-            current_download.update({
+            self.forget(self._entry_key(d))
+            self.state.update({
                 'status': 'error',
                 'message': f"Error: {d.get('error', 'Unknown error')}"
             })
+    
+    def forget(self, key):
+        """Stop tracking an entry whose download failed; a retry starts it afresh"""
+        with self.lock:
+            self.pending.pop(key, None)
+            self.entries.pop(key, None)
+            self.received.pop(key, None)
+
+
+class FileManifest:
+    """Files a job produced, so only those are sanitized afterwards
+    
+    Files are tracked until their entry's file is final: final(video_id)
+    stops tracking the entry and hands its last file to on_final, so the
+    manifest only holds the entries still downloading or converting.
+    """
+    def __init__(self, on_final=None):
+        # Path -> video ID it belongs to (None when unknown)
+        self.paths = {}
+        # Sanitized name -> (video ID, path) of the files that found it taken
+        self.collisions = {}
+        self.on_final = on_final
+        self.lock = threading.Lock()
+    
+    def add(self, path, video_id=None):
+        with self.lock:
+            if path and (path not in self.paths or video_id):
+                self.paths[path] = video_id
+    
+    def replace(self, old_path, new_path):
+        with self.lock:
+            self.paths[new_path] = self.paths.pop(old_path, None)
+    
+    def collided(self, wanted, video_id, path):
+        """Record that the file for video_id went to path because wanted was taken"""
+        with self.lock:
+            self.collisions.setdefault(wanted, []).append((video_id, path))
+    
+    def final(self, video_id):
+        """Stop tracking an entry whose file is final, passing that file to on_final"""
+        if not video_id:
+            return
+        with self.lock:
+            # The last file recorded is the one left after post-processing
+            paths = [path for path, path_video_id in self.paths.items() if path_video_id == video_id]
+            for path in paths:
+                del self.paths[path]
+        if paths and self.on_final:
+            self.on_final(video_id, paths[-1])
+    
+    def files(self):
+        with self.lock:
+            return list(self.paths)
+    
+    def items(self):
+        with self.lock:
+            return list(self.paths.items())
+    
+    def video_id(self, path):
+        with self.lock:
+            return self.paths.get(path)
+    
+    def path_for(self, video_id):
+        """Final file recorded for a video ID, or None"""
+        found = None
+        with self.lock:
+            # The last file recorded is the one left after post-processing
+            for path, path_video_id in self.paths.items():
+                if path_video_id == video_id:
+                    found = path
+        return found
 
+def sanitize_recorded(path, video_id, manifest=None):
+    """Sanitize the name of a file a job produced, recording it and any
+    collision in the job's manifest; returns the new path"""
+    new_path = sanitize_file(path, video_id)
+    if manifest is not None:
+        if new_path != path:
+            manifest.replace(path, new_path)
+        manifest.add(new_path, video_id)
+        wanted = os.path.join(os.path.dirname(path), sanitize_filename(os.path.basename(path)))
+        if new_path not in (path, wanted) and video_id:
+            manifest.collided(wanted, video_id, new_path)
+    return new_path
 
-def download_media(url, output_dir, download_type='audio', playlist_mode='single'):
-    """Download media from YouTube"""
-    global cancel_requested
-    cancel_requested = False
-    
-    current_download['status'] = 'starting'
-    # Keep progress property for compatibility but we don't update it anymore
-    current_download['progress'] = 0
-    current_download['total_progress'] = 0
-    current_download['completed_files'] = 0
-    current_download['message'] = 'Preparing download...'
-    current_download['current_file'] = ''
-    
-    # Get video info to check if it's a playlist
-    info = get_video_info(url)
-    current_download['is_playlist'] = info['is_playlist']
-    current_download['output_path'] = output_dir
+def settle_collisions(manifest, finished):
+    """Give each name several of a job's files wanted to the same file on every run
+    
+    Entries finishing in parallel reach a name in any order, so whichever
+    got there first is moved aside for the one with the lowest video ID.
+    finished yields the (video ID, path) of the job's files; a converted
+    file is named after its download, so contenders are looked up by the
+    file they ended up with. Names held by files of other jobs stay
+    theirs. Returns {video ID: new path} for the files moved.
+    """
+    if not manifest.collisions:
+        return {}
+    wanted_bases = {os.path.splitext(wanted)[0]: wanted for wanted in manifest.collisions}
+    contender_ids = {video_id for contenders in manifest.collisions.values() for video_id, _ in contenders}
+    
+    # One pass over the job's files, keeping only those in a contest
+    final_paths = {}
+    holders = {}
+    for video_id, path in finished:
+        if video_id in contender_ids:
+            final_paths[video_id] = path
+        if os.path.splitext(path)[0] in wanted_bases:
+            holders[path] = video_id
+    
+    contests = {}
+    for wanted, contenders in manifest.collisions.items():
+        for video_id in {video_id for video_id, _ in contenders}:
+            path = final_paths.get(video_id)
+            if path and os.path.isfile(path):
+                target = os.path.splitext(wanted)[0] + os.path.splitext(path)[1]
+                contests.setdefault(target, set()).add((video_id, path))
+    
+    moved = {}
+    for target, contenders in contests.items():
+        holder_id = holders.get(target)
+        if holder_id is None or not os.path.isfile(target):
+            continue
+        video_id, path = min(contenders)
+        if video_id >= holder_id:
+            continue
+        # The holder's name is taken by itself, so it moves to its ID-derived one
+        moved[holder_id] = move_file(target, target, holder_id)
+        if claim_name(path, target):
+            moved[video_id] = target
+    return moved
+
+def sanitize_manifest(manifest):
+    """Sanitize the names of the files a job recorded that still exist"""
+    for path in manifest.files():
+        if os.path.isfile(path):
+            sanitize_recorded(path, manifest.video_id(path), manifest)
+
+class SanitizeFilenamePP(yt_dlp.postprocessor.PostProcessor):
+    """Post-processor that renames each finished file with sanitize_filename
+    and records it in the job's manifest"""
+    def __init__(self, manifest=None):
+        super().__init__()
+        self.manifest = manifest
+    
+    def run(self, info):
+        if 'filepath' in info:
+            new_path = sanitize_recorded(info['filepath'], info.get('id'), self.manifest)
+            
+            if info['filepath'] != new_path:
+                info['filepath'] = new_path
+                
+                # Update the filename in the info dictionary
+                if 'filename' in info:
+                    info['filename'] = new_path
+        
+        return [], info
+
+def download_info(ydl, info):
+    """Download from an already extracted info dict instead of extracting its URL again"""
+    if info.get('_type', 'video') == 'video':
+        # Drop the probe's own format selection so the download options choose again
+        info = ydl.sanitize_info(info, remove_private_keys=True)
+    
+    try:
+        ydl.process_ie_result(info, download=True)
+    except (yt_dlp.utils.DownloadError, yt_dlp.utils.ReExtractInfo):
+        # Expired stream URLs and the like need a fresh extraction
+        webpage_url = info.get('webpage_url') or info.get('url')
+        if not webpage_url:
+            raise
+        ydl.download([webpage_url])
+    
+    # Same return code YoutubeDL.download reports
+    return ydl._download_retcode
+
+def download_target(ydl, target):
+    """Download an extracted info dict, or a plain URL when nothing was extracted"""
+    if isinstance(target, dict):
+        return download_info(ydl, target)
+    return ydl.download([target])
+
+def target_url(target):
+    """URL to extract again for an info dict or plain URL target"""
+    if isinstance(target, dict):
+        return target.get('webpage_url') or target.get('url')
+    return target
+
+class EntryLogger:
+    """yt-dlp logger that keeps the error messages of one entry"""
+    def __init__(self):
+        self.errors = []
+    
+    def debug(self, msg):
+        pass
     
+    def info(self, msg):
+        pass
+    
+    def warning(self, msg):
+        pass
+    
+    def error(self, msg):
+        self.errors.append(msg)
+        print(msg)
+
+def download_entry(entry, ydl_opts, job=None, manifest=None, transcodes=None, progress=None):
+    """Download one entry with its own YoutubeDL instance
+    
+    Returns (status, error) with status 'succeeded', 'failed' or 'skipped';
+    entries that can never succeed (private, removed, ...) are skipped.
+    With a TranscodeStage, finished files are handed to it for conversion.
+    An entry that does not succeed stops counting in the DownloadProgress.
+    """
+    # Entries still waiting for a slot are dropped once the job is cancelled
+    if job and job.cancel_requested:
+        return 'skipped', 'Download cancelled by user'
+    
+    logger = EntryLogger()
+    try:
+        with yt_dlp.YoutubeDL(dict(ydl_opts, logger=logger)) as ydl:
+            # Flat entries and plain URLs are extracted here, as is a retry of an expired one
+            count_extractions(ydl, job.state if job else current_download)
+            ydl.add_post_processor(SanitizeFilenamePP(manifest))
+            if transcodes is not None:
+                ydl.add_post_processor(TranscodeHandoffPP(transcodes))
+            with PHASE_SECONDS.time(phase='download'):
+                retcode = download_target(ydl, entry)
+    except yt_dlp.utils.DownloadCancelled:
+        raise
+    except Exception as e:
+        # One broken entry must not take the rest of the job down with it
+        ERRORS.inc(phase='download')
+        forget_entry(entry, progress)
+        return 'failed', str(e)
+    
+    if retcode == 0:
+        # With a transcode stage the entry is only done once its file is converted
+        if transcodes is None and isinstance(entry, dict):
+            if job:
+                job.entry_done(entry.get('id'))
+            if manifest is not None:
+                manifest.final(entry.get('id'))
+        return 'succeeded', None
+    
+    error = logger.errors[-1] if logger.errors else 'Unknown error'
+    ERRORS.inc(phase='download')
+    forget_entry(entry, progress)
+    if is_permanent_error(error):
+        return 'skipped', error
+    return 'failed', error
+
+def forget_entry(entry, progress):
+    """Drop a failed entry's partial progress, when it is known by ID"""
+    if progress is not None and isinstance(entry, dict) and entry.get('id'):
+        progress.forget(entry['id'])
+
+def run_entries(entries, ydl_opts, job=None, manifest=None, parallel_entries=1, transcodes=None, progress=None):
+    """Download entries, several at a time, returning (status, error) for each"""
+    if len(entries) <= 1 or parallel_entries <= 1:
+        return [download_entry(entry, ydl_opts, job, manifest, transcodes, progress) for entry in entries]
+    
+    def run_entry(entry):
+        with profiled_thread(job):
+            return download_entry(entry, ydl_opts, job, manifest, transcodes, progress)
+    
+    with ThreadPoolExecutor(max_workers=parallel_entries) as executor:
+        return list(executor.map(run_entry, entries))
+
+def run_stream(pairs, ydl_opts, job=None, manifest=None, parallel_entries=1, transcodes=None, resolver=None,
+               progress=None):
+    """First pass over (result, target) pairs, downloading each as it arrives
+    
+    pairs may still be growing, as a playlist being listed is: each of
+    the parallel_entries threads takes the next pair when it is free, and
+    records the outcome in the pair's result. With an EntryResolver, each
+    target is taken from it, already resolved while the entries before
+    it were downloading.
+    """
+    pairs = iter(pairs)
+    if resolver is not None:
+        pairs = resolver.iterate(pairs)
+    lock = threading.Lock()
+    
+    def consume():
+        while True:
+            with lock:
+                pair = next(pairs, None)
+            if pair is None:
+                return
+            result, target = pair
+            status, error = download_entry(target, ydl_opts, job, manifest, transcodes, progress)
+            result.update({'status': status, 'error': error, 'attempts': 1})
+    
+    if parallel_entries <= 1:
+        consume()
+        return
+    
+    def run_consumer():
+        with profiled_thread(job):
+            consume()
+    
+    with ThreadPoolExecutor(max_workers=parallel_entries) as executor:
+        for future in [executor.submit(run_consumer) for _ in range(parallel_entries)]:
+            future.result()
+
+def record_final_file(info, manifest):
+    """Sanitize the name of a converted file and record it in the job's manifest"""
+    path = info.get('filepath')
+    if path:
+        sanitize_recorded(path, info.get('id'), manifest)
+
+def backfill_archive(url, output_dir, download_type='audio'):
+    """Archive the entries of a URL whose files already exist in output_dir
+    
+    Full playlists are looked for in their "<name>_playlist" folder when
+    there is one, since that is where download_media puts them.
+    """
+    info, video_info, listing = probe_url(url, want_video=False, peek_entries=0)
+    if info.get('error'):
+        return {'error': info['error']}
+    
+    listing_errors = []
+    
+    def listed():
+        # Checked as they are listed, without holding the whole playlist;
+        # a listing that breaks off still archives what it got to
+        try:
+            for entry in listing:
+                if entry:
+                    yield entry
+        except Exception as e:
+            ERRORS.inc(phase='listing')
+            listing_errors.append(str(e))
+    
+    if listing is not None:
+        entries = listed()
+        playlist_dir = os.path.join(output_dir, f"{sanitize_filename(info['title'])}_playlist")
+        if os.path.isdir(playlist_dir):
+            output_dir = playlist_dir
+    else:
+        entries = [video_info] if video_info is not None else []
+    
+    try:
+        added = download_archive.backfill(entries, output_dir, download_type)
+    finally:
+        if listing is not None:
+            listing.close()
+    checked = listing.count if listing is not None else len(entries)
+    result = {'checked': checked, 'added': added, 'output_dir': output_dir}
+    if listing_errors:
+        result['listing_error'] = listing_errors[0]
+    return result
+
+def download_media(url, output_dir, download_type='audio', playlist_mode='single', job=None,
+                   parallel_entries=PLAYLIST_WORKERS, use_archive=True, audio_profile=AUDIO_PROFILE, weight=1):
+    """Download media from YouTube
+    
+    audio_profile 'mp3' converts every audio file to mp3; 'fast' keeps
+    aac, opus, vorbis, mp3 and flac streams, only changing the container.
+    weight sets the job's share of the global bandwidth cap against the
+    other jobs downloading at the same time.
+    """
+    # Each queued job reports into its own state record
+    state = job.state if job else current_download
+    
+    state.update({
+        'status': 'starting',
+        # Keep progress property for compatibility but we don't update it anymore
+        'progress': 0,
+        'total_progress': 0,
+        'completed_files': 0,
+        'message': 'Preparing download...',
+        'current_file': '',
+        'extractions': 0
+    })
+    
+    # Get video info to check if it's a playlist, only looking up what this mode needs
+    # (a full playlist is only listed as it downloads, further down)
+    info, video_info, listing = probe_url(url, state,
+                                          want_video=playlist_mode == 'single',
+                                          want_playlist=playlist_mode == 'playlist',
+                                          peek_entries=0)
+    streaming = info['is_playlist'] and playlist_mode == 'playlist' and listing is not None
+    if listing is not None and not streaming:
+        listing.close()
     if info['is_playlist']:
-        current_download['playlist_title'] = info['title']
-        current_download['total_files'] = info.get('entries', 1)
+        playlist_title = info['title']
+        total_files = info.get('entries', 1)
     else:
-        current_download['playlist_title'] = ''
-        current_download['total_files'] = 1
+        playlist_title = ''
+        total_files = 1
+    
+    state.update({
+        'is_playlist': info['is_playlist'],
+        'output_path': output_dir,
+        'playlist_title': playlist_title,
+        'total_files': total_files
+    })
     
     # If it's a playlist but user selected single video, modify URL
     if info['is_playlist'] and playlist_mode == 'single':
@@ -193,8 +779,7 @@ def download_media(url, output_dir, download_type='audio', playlist_mode='single
             # Extract the first video from the playlist
             url = url.split('&list=')[0] if '&list=' in url else url
         
-        current_download['is_playlist'] = False
-        current_download['total_files'] = 1
+        state.update({'is_playlist': False, 'total_files': 1})
     
     # Create a directory for playlist if needed
     if info['is_playlist'] and playlist_mode == 'playlist':
@@ -202,53 +787,51 @@ def download_media(url, output_dir, download_type='audio', playlist_mode='single
         output_dir = os.path.join(output_dir, f"{playlist_name}_playlist")
         os.makedirs(output_dir, exist_ok=True)
     
-    progress_tracker = DownloadProgress(current_download['total_files'])
-    
-    # Create a sanitize filename post-processor
-    class SanitizeFilenamePP(yt_dlp.postprocessor.PostProcessor):
-        def run(self, info):
-            if 'filepath' in info:
-                path_dir, path_file = os.path.split(info['filepath'])
-                sanitized_file = sanitize_filename(path_file)
-                new_path = os.path.join(path_dir, sanitized_file)
-                
-                if info['filepath'] != new_path:
-                    try:
-                        os.rename(info['filepath'], new_path)
-                        info['filepath'] = new_path
-                        
-                        # Update the filename in the info dictionary
-                        if 'filename' in info:
-                            info['filename'] = new_path
-                    except Exception as e:
-                        print(f"Error renaming file: {e}")
-            
-            return [info], None
+    # Files this job produces; only these get sanitized afterwards, and each
+    # entry's final file is kept on its result once the manifest lets go of it
+    manifest = FileManifest(on_final=lambda video_id, path: file_final(video_id, path))
+    progress_tracker = DownloadProgress(state['total_files'], job, manifest=manifest)
     
     # Setup common yt-dlp options
     ydl_opts = {
         'restrictfilenames': False,  # Don't restrict filenames - we'll sanitize them ourselves
         'progress_hooks': [progress_tracker.progress_hook],
+        'postprocessor_hooks': [postprocessor_timer],
         'ignoreerrors': True,
         'no_warnings': True,
         'geo_bypass': True,
         'extractor_retries': 5,
+        # Continue .part files left by an interrupted run instead of starting over
+        'continuedl': True,
     }
     
+    # Conversion runs in its own stage on the shared transcode pool, so the
+    # next entry downloads while ffmpeg works on the previous one
+    transcodes = None
+    
+    def finish_file(final_info):
+        record_final_file(final_info, manifest)
+        if job:
+            job.entry_done(final_info.get('id'))
+        manifest.final(final_info.get('id'))
+    
     if download_type == 'audio':
         # For audio, set specific options to only download and process audio
         audio_output_template = os.path.join(output_dir, '%(title)s.%(ext)s')
         ydl_opts.update({
             'outtmpl': audio_output_template,
             'format': 'bestaudio',  # Only select audio streams
-            'postprocessors': [{
-                'key': 'FFmpegExtractAudio',
-                'preferredcodec': 'mp3',
-                'preferredquality': '192',
-            }],
             'keepvideo': False,  # Important: Don't keep the video file after extraction
         })
+        transcodes = TranscodeStage(
+            lambda downloaded: audio_plan(downloaded, audio_profile),
+            state,
+            is_cancelled=lambda: bool(job and job.cancel_requested),
+            on_finished=finish_file,
+            profiler=getattr(job, 'profiler', None),
+            on_outcome=lambda video_id, outcome: file_converted(video_id, outcome))
     else:  # video
+        # Merging is a stream copy, so it stays inline with the download
         # For video, set specific options to download video
         video_output_template = os.path.join(output_dir, '%(title)s.%(ext)s')
         ydl_opts.update({
@@ -270,94 +853,241 @@ def download_media(url, output_dir, download_type='audio', playlist_mode='single
         if 'playlist_url' in info:
             url = info['playlist_url']
     
+    # Reuse what probe_url extracted instead of extracting the URL again;
+    # playlists are downloaded from their flat entries as they are listed,
+    # each resolved once when downloaded
+    if streaming:
+        targets = []
+    elif not info['is_playlist'] or playlist_mode == 'single':
+        targets = [video_info if video_info is not None else url]
+    else:
+        targets = [url]
+    
+    # Outcome of every entry, updated by the first pass and each retry round;
+    # listed entries only keep what it takes to archive or extract them again
+    results = []
+    archived_count = [0]
+    # Results of the entries still to download or convert, by video ID, so a
+    # finished file finds its entry without searching the whole playlist
+    unfinished = {}
+    
+    def result_for(video_id):
+        result = unfinished.get(video_id)
+        # A plain URL target has no ID until it is extracted
+        if result is None and not streaming:
+            result = unfinished.get(None)
+        return result
+    
+    def file_final(video_id, path):
+        result = result_for(video_id)
+        if result is not None:
+            result['path'] = path
+            # Converted files are done once their outcome is in
+            if transcodes is None:
+                unfinished.pop(result['id'], None)
+    
+    def file_converted(video_id, outcome):
+        result = result_for(video_id)
+        if result is not None:
+            result['transcode'] = outcome
+            unfinished.pop(result['id'], None)
+    
+    def admit(target):
+        """Record an entry's result; returns (result, target) when it still needs downloading"""
+        result = new_entry_result(compact_entry(target) if streaming else target)
+        results.append(result)
+        
+        # Entries already downloaded as this type are skipped before any media request
+        if use_archive:
+            key = archive_key(result['target'])
+            if key and download_archive.contains(key[0], key[1], download_type):
+                result.update({'status': 'archived', 'error': 'Already archived'})
+                archived_count[0] += 1
+                return None
+        
+        # A job resumed after a restart skips the entries it had already completed
+        if job and job.completed_entries and result['id'] in job.completed_entries:
+            result.update({'status': 'succeeded', 'attempts': 0})
+            return None
+        unfinished[result['id']] = result
+        return result, target
+    
+    def on_listed(stream):
+        # The total grows as the playlist is listed; entries not listed yet
+        # count as the site reported them, when it did
+        total = stream.queued
+        if not stream.finished and listing.reported_count:
+            total += max(listing.reported_count - listing.count, 0)
+        progress_tracker.total_files = total
+        state.update({'total_files': total, 'archived_entries': archived_count[0],
+                      'listed_entries': listing.count, 'listing_complete': stream.finished})
+    
+    stream = None
+    resolver = None
+    if streaming:
+        state.update({'listed_entries': 0, 'listing_complete': False})
+    else:
+        pending = [pair for pair in map(admit, targets) if pair is not None]
+        progress_tracker.total_files = len(pending)
+        state.update({'total_files': len(pending), 'archived_entries': archived_count[0]})
+    
+    governor_key = job.id if job else None
+    bandwidth_governor.register(governor_key, weight)
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Add sanitize filename post-processor
-            ydl.add_post_processor(SanitizeFilenamePP())
-            
-            # Start the download
-            error_code = ydl.download([url])
-        
-        # Final pass to sanitize all filenames in the output directory
-        for filename in os.listdir(output_dir):
-            filepath = os.path.join(output_dir, filename)
-            if os.path.isfile(filepath):
-                sanitized = sanitize_filename(filename)
-                if filename != sanitized:
-                    try:
-                        sanitized_path = os.path.join(output_dir, sanitized)
-                        if not os.path.exists(sanitized_path):  # Avoid overwriting existing files
-                            os.rename(filepath, sanitized_path)
-                    except Exception as e:
-                        print(f"Error renaming {filename}: {e}")
-        
-        # If status is still not completed (due to errors), try alternative method
-        if current_download['status'] != 'completed':
-            # If we're missing files or there was an error code, try alternative method
-            current_download['message'] = 'Trying alternative download method...'
-            
-            # Modify options for alternative method
-            if download_type == 'audio':
-                ydl_opts.update({
-                    'extractor_args': {'youtube': {'player_client': ['android']}},
-                })
-            
-            with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-                # Add sanitize filename post-processor
-                ydl.add_post_processor(SanitizeFilenamePP())
-                
-                # Try the download again
-                error_code = ydl.download([url])
-            
-            # If status is not already set to completed by the progress hook, handle any errors
-            if current_download['status'] != 'completed':
-                # Check if we had partial success (some files downloaded)
-                actual_count = current_download['completed_files']
-                expected_count = current_download['total_files']
-                
-                if actual_count < expected_count and info['is_playlist']:
-                    current_download['status'] = 'completed_with_errors'
-                    current_download['message'] = f'Download incomplete. Only {actual_count} of {expected_count} files were downloaded.'
-                else:
-                    current_download['status'] = 'completed_with_errors'
-                    current_download['message'] = 'Download completed with some errors or skipped files.'
-            
-            # Final filename sanitization for alternative method
-            for filename in os.listdir(output_dir):
-                filepath = os.path.join(output_dir, filename)
-                if os.path.isfile(filepath):
-                    sanitized = sanitize_filename(filename)
-                    if filename != sanitized:
-                        try:
-                            sanitized_path = os.path.join(output_dir, sanitized)
-                            if not os.path.exists(sanitized_path):  # Avoid overwriting existing files
-                                os.rename(filepath, sanitized_path)
-                        except Exception as e:
-                            print(f"Error renaming {filename}: {e}")
+        # First pass; full playlists download several entries at once,
+        # starting with the first entries listed
+        try:
+            if streaming:
+                stream = PlaylistStream(listing, admit, on_listed=on_listed,
+                                        is_cancelled=lambda: bool(job and job.cancel_requested))
+                # Playlist entries are resolved a few ahead of the ones downloading
+                if PRERESOLVE_AHEAD > 0:
+                    resolver = EntryResolver(ydl_opts, PRERESOLVE_AHEAD, job=job)
+                run_stream(stream, ydl_opts, job, manifest, parallel_entries, transcodes, resolver,
+                           progress_tracker)
+            else:
+                # A single video or URL
+                run_stream(pending, ydl_opts, job, manifest, 1, transcodes, progress=progress_tracker)
+        finally:
+            if resolver is not None:
+                resolver.close()
+            if stream is not None:
+                stream.close()
+        archived = archived_count[0]
+        
+        # Retry only the entries that failed, switching strategy each round
+        def retry_round(retry_targets, strategy):
+            round_opts, reextract = strategy(ydl_opts, download_type)
+            if reextract:
+                retry_targets = [target_url(target) or target for target in retry_targets]
+            return run_entries(retry_targets, round_opts, job, manifest, parallel_entries, transcodes,
+                               progress_tracker)
+        
+        def on_round(attempt, name, count):
+            state['message'] = f'Retrying {count} failed item(s) (attempt {attempt + 1}, {name.replace("_", " ")})...'
+        
+        retry_engine = RetryEngine(is_cancelled=lambda: bool(job and job.cancel_requested))
+        retry_engine.retry(results, retry_round, on_round)
+        
+        # Nothing left to transfer, so give this job's bandwidth share to the others
+        bandwidth_governor.unregister(governor_key)
+        
+        # Downloads are done; wait for the files still being converted
+        if transcodes is not None:
+            if transcodes.pending():
+                state.update({'status': 'processing',
+                              'message': f'Converting {transcodes.pending()} remaining file(s)...'})
+            with PHASE_SECONDS.time(phase='transcode_wait'):
+                transcodes.wait()
+            for result in results:
+                outcome = result.pop('transcode', None)
+                if result['status'] != 'succeeded' or outcome is None:
+                    continue
+                result['postprocess'] = outcome['path']
+                if outcome['error']:
+                    result.update({'status': 'failed', 'error': outcome['error']})
+        
+        def job_files():
+            for result in results:
+                if result.get('path'):
+                    yield result['id'], result['path']
+            for path, video_id in manifest.items():
+                yield video_id, path
+        
+        # Final pass over the files this job produced that are still unsanitized,
+        # then over the names several of them wanted
+        with PHASE_SECONDS.time(phase='sanitize'):
+            sanitize_manifest(manifest)
+            moved = settle_collisions(manifest, job_files())
+        
+        # Remember what was downloaded so later jobs can skip it
+        records = []
+        for result in results:
+            key = archive_key(result['target'])
+            path = result.pop('path', None)
+            if result['status'] == 'succeeded' and key:
+                path = moved.get(key[1]) or path or manifest.path_for(key[1])
+                records.append((key[0], key[1], result['title'], path))
+        download_archive.add_many(records, download_type)
+        
+        # A cancel between entries leaves no exception behind, only skipped entries
+        if job and job.cancel_requested:
+            raise yt_dlp.utils.DownloadCancelled()
+        
+        succeeded = sum(1 for r in results if r['status'] == 'succeeded')
+        failed = sum(1 for r in results if r['status'] == 'failed')
+        skipped = sum(1 for r in results if r['status'] == 'skipped')
+        for result_name, count in (('succeeded', succeeded), ('failed', failed), ('skipped', skipped),
+                                   ('archived', archived)):
+            if count:
+                FILES.inc(count, result=result_name)
+        RETRIES.inc(retry_engine.used)
+        
+        # A playlist whose listing broke off was not downloaded in full
+        listing_error = stream.error if stream is not None else None
+        if succeeded + archived == len(results) and listing_error is None:
+            message = 'Download completed successfully!'
+            if archived:
+                message = f'Download completed successfully! {archived} skipped (already archived).'
+            final = {'status': 'completed', 'total_progress': 100, 'message': message}
+        elif info['is_playlist'] and playlist_mode == 'playlist':
+            final = {'status': 'completed_with_errors',
+                     'message': f'Download incomplete. {succeeded} of {len(results) - archived} files downloaded, '
+                                f'{failed} failed, {skipped} skipped, {archived} already archived.'}
+            if listing_error is not None:
+                final['message'] += f' Listing the playlist stopped after {listing.count} entries: {listing_error}'
+        else:
+            final = {'status': 'completed_with_errors',
+                     'message': 'Download completed with some errors or skipped files.'}
+        
+        final.update({
+            'succeeded_entries': succeeded,
+            'failed_entries': failed,
+            'skipped_entries': skipped,
+            'retries': retry_engine.used,
+            'entry_results': [public_entry_result(r) for r in results]
+        })
+        state.update(final)
         
         # Add to download history
-        download_history.append({
+        record_download({
+            'job_id': job.id if job else None,
+            'url': url,
+            'output_dir': output_dir,
+            'download_type': download_type,
+            'is_playlist': info['is_playlist'],
+            'title': info.get('title', 'Unknown'),
+            'status': state['status'],
+            'succeeded': succeeded,
+            'failed': failed,
+            'skipped': skipped,
+            'archived': archived,
+            # Outcome of each entry, individually
+            'entries': [public_entry_result(r) for r in results]
+        })
+        
+    except yt_dlp.utils.DownloadCancelled:
+        state.update({'status': 'cancelled', 'message': 'Download cancelled by user'})
+        
+        # Keep a record of the cancelled download
+        record_download({
+            'job_id': job.id if job else None,
             'url': url,
             'output_dir': output_dir,
             'download_type': download_type,
             'is_playlist': info['is_playlist'],
             'title': info.get('title', 'Unknown'),
-            'status': current_download['status']
+            'status': 'cancelled'
         })
-        # Save history to persistent storage
-        from modules.config.settings import save_download_history
-        save_download_history()
         
     except Exception as e:
-        current_download['status'] = 'error'
-        current_download['message'] = f'Error: {str(e)}'
+        ERRORS.inc(phase='job')
+        state.update({'status': 'error', 'message': f'Error: {str(e)}'})
+    
+    finally:
+        bandwidth_governor.unregister(governor_key)
 
 def start_download_thread(url, output_dir, download_type='audio', playlist_mode='single'):
-    """Start the download process in a separate thread"""
-    download_thread = threading.Thread(
-        target=download_media,
-        args=(url, output_dir, download_type, playlist_mode)
-    )
-    download_thread.daemon = True
-    download_thread.start()
-    return download_thread
+    """Queue a download on the shared worker pool and return its job"""
+    from modules.download.jobs import job_manager
+    return job_manager.submit(url, output_dir, download_type, playlist_mode)
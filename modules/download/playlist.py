@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+# modules/download/playlist.py
+# Lazy playlist listing for YT Media Backup
+
+import queue
+import threading
+import time
+import yt_dlp
+from yt_dlp.utils import PagedList, InAdvancePagedList
+from modules.config.settings import PLAYLIST_BUFFER
+from modules.utils.metrics import PHASE_SECONDS, ERRORS, count_extractions
+
+# URL results followed to get from a URL to the video or playlist it stands for
+MAX_REDIRECTS = 5
+
+def open_url_info(url, ydl_opts, state=None):
+    """Extract url without processing the result; returns (ydl, info)
+
+    Playlist entries are left as yt-dlp's extractor produced them, a
+    generator or paged list that fetches each page only when iterated,
+    instead of all being listed up front. Later pages are fetched
+    through the returned YoutubeDL, so the caller closes it once done
+    with the entries (PlaylistListing does). Extractions, the URL's and
+    the redirects', are counted against state.
+    """
+    ydl = count_extractions(yt_dlp.YoutubeDL(ydl_opts), state)
+    try:
+        with PHASE_SECONDS.time(phase='extract'):
+            info = ydl.extract_info(url, download=False, process=False)
+            # Processing would follow URL results (channel pages, short links) itself
+            for _ in range(MAX_REDIRECTS):
+                if not info or info.get('_type') not in ('url', 'url_transparent'):
+                    break
+                target = ydl.extract_info(info['url'], download=False, ie_key=info.get('ie_key'), process=False)
+                if info['_type'] == 'url_transparent' and target:
+                    target = dict(target, **{key: value for key, value in info.items()
+                                             if value is not None and key not in ('_type', 'url', 'ie_key')})
+                info = target
+    except BaseException:
+        ydl.close()
+        raise
+    return ydl, info
+
+def iter_entries(entries):
+    """Iterate playlist entries in whatever form the extractor returned them"""
+    if entries is None:
+        return iter(())
+    if isinstance(entries, PagedList):
+        return _iter_pages(entries)
+    return iter(entries)
+
+def _iter_pages(paged):
+    # A PagedList keeps every page it fetched by default; read once, they need not be kept
+    paged._use_cache = False
+    if isinstance(paged, InAdvancePagedList):
+        # The page count is known, and pages need not be full
+        for pagenum in range(paged._pagecount):
+            yield from paged.getpage(pagenum)
+        return
+    # Other lists know best where they end
+    yield from paged._getslice(0, None)
+
+def compact_entry(entry):
+    """What an entry's result keeps of it: enough to archive it and to extract it again"""
+    if not isinstance(entry, dict):
+        return entry
+    return {
+        '_type': 'url',
+        'url': entry.get('webpage_url') or entry.get('url'),
+        'ie_key': entry.get('ie_key') or entry.get('extractor_key'),
+        'id': entry.get('id'),
+        'title': entry.get('title'),
+    }
+
+class PlaylistListing:
+    """The entries of a playlist, listed as they are iterated
+
+    count is the number listed so far; total is the size the site
+    reported, or count once the listing is complete, and None until
+    then. peek(n) lists the first n entries without handing them out, so
+    a URL check can look at the start of a playlist and the download
+    then carries on from there instead of listing it again.
+    """
+    def __init__(self, ydl, info):
+        self.ydl = ydl
+        self.info = info
+        self.title = info.get('title')
+        self.reported_count = info.get('playlist_count')
+        self.head = []
+        self.entries = iter_entries(info.get('entries'))
+        self.count = 0
+        self.complete = False
+
+    @property
+    def total(self):
+        if self.complete:
+            return self.count
+        return self.reported_count
+
+    def _next(self):
+        if self.complete:
+            raise StopIteration
+        try:
+            entry = next(self.entries)
+        except StopIteration:
+            self.complete = True
+            self.close()
+            raise
+        self.count += 1
+        return entry
+
+    def peek(self, n):
+        """The first n entries (fewer if the playlist is shorter), leaving them to be iterated"""
+        while len(self.head) < n:
+            try:
+                self.head.append(self._next())
+            except StopIteration:
+                break
+        return self.head[:n]
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self.head:
+            return self.head.pop(0)
+        return self._next()
+
+    def close(self):
+        if self.ydl is not None:
+            self.ydl.close()
+            self.ydl = None
+
+_END = object()
+
+class PlaylistStream:
+    """A playlist listed on a thread of its own while its entries download
+
+    The listing thread runs admit(entry) on each entry and queues what it
+    returns (None skips the entry, e.g. one already archived). The queue
+    holds at most `buffer` entries, so memory stays bounded however long
+    the playlist, and downloads start as soon as the first entry is
+    listed. on_listed(stream) is called as the listing goes on, at most
+    twice a second, and once more when it ends. A listing that fails
+    part way ends the stream early, with the exception in error.
+    """
+    def __init__(self, listing, admit, buffer=PLAYLIST_BUFFER, on_listed=None, is_cancelled=None):
+        self.listing = listing
+        self.admit = admit
+        self.on_listed = on_listed
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.queue = queue.Queue(maxsize=buffer)
+        self.queued = 0
+        self.error = None
+        self.finished = False
+        self.closed = False
+        self.thread = threading.Thread(target=self._list, name='playlist-listing', daemon=True)
+        self.thread.start()
+
+    def _put(self, item):
+        # Waits for room in the buffer, but not on a consumer that has gone away
+        while not self.closed:
+            try:
+                self.queue.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def _list(self):
+        last_report = 0
+        try:
+            for entry in self.listing:
+                if self.is_cancelled() or self.closed:
+                    break
+                if not entry:
+                    continue
+                item = self.admit(entry)
+                if item is not None:
+                    if not self._put(item):
+                        break
+                    self.queued += 1
+                now = time.monotonic()
+                if self.on_listed and now - last_report >= 0.5:
+                    last_report = now
+                    self.on_listed(self)
+        except Exception as e:
+            ERRORS.inc(phase='listing')
+            self.error = e
+        finally:
+            self.listing.close()
+            self.finished = True
+            if self.on_listed:
+                self.on_listed(self)
+            self._put(_END)
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                return
+            yield item
+
+    def close(self):
+        """Stop listing; entries not handed out yet are dropped"""
+        self.closed = True
+        self.thread.join()
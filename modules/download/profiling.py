@@ -0,0 +1,294 @@
+#!/usr/bin/env python3
+# modules/download/profiling.py
+# On-demand profiling of download jobs for YT Media Backup
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import resource
+import shutil
+import sys
+import threading
+import time
+import tracemalloc
+from contextlib import nullcontext
+from modules.config.settings import PROFILES_DIR, PROFILES_KEEP, PROFILE_JOBS
+
+# Runtime switch, changed through /api/profiling: profile every job that starts
+profiling = {'all_jobs': PROFILE_JOBS}
+
+# Lines reported in the text reports
+TOP_FUNCTIONS = 60
+TOP_ALLOCATIONS = 40
+TRACEMALLOC_FRAMES = 10
+
+# tracemalloc is process-wide; it runs while any profiled job does, and is
+# only stopped again when it was started here rather than by someone else
+_tracing_jobs = 0
+_tracing_started = False
+_tracing_lock = threading.Lock()
+
+# From Python 3.12 cProfile runs on sys.monitoring, which covers every
+# thread of the process and takes one profiler at a time
+PROCESS_WIDE_PROFILER = sys.version_info >= (3, 12)
+
+# JobProfiler holding the process's one profiler, when it is process-wide
+_process_profiler = None
+_process_profiler_lock = threading.Lock()
+
+def _start_tracing():
+    global _tracing_jobs, _tracing_started
+    with _tracing_lock:
+        if _tracing_jobs == 0 and not tracemalloc.is_tracing():
+            tracemalloc.start(TRACEMALLOC_FRAMES)
+            _tracing_started = True
+        _tracing_jobs += 1
+
+def _stop_tracing():
+    global _tracing_jobs, _tracing_started
+    with _tracing_lock:
+        _tracing_jobs -= 1
+        if _tracing_jobs == 0 and _tracing_started:
+            tracemalloc.stop()
+            _tracing_started = False
+
+def _claim_process_profiler(owner):
+    """Make owner the job profiling this process; returns the job already doing so instead, if any"""
+    global _process_profiler
+    with _process_profiler_lock:
+        if _process_profiler is None:
+            _process_profiler = owner
+            return None
+        return _process_profiler.job
+
+def _release_process_profiler(owner):
+    global _process_profiler
+    with _process_profiler_lock:
+        if _process_profiler is owner:
+            _process_profiler = None
+
+def max_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class JobProfiler:
+    """cProfile and tracemalloc capture of one job, written to PROFILES_DIR/<job id>/
+
+    Before Python 3.12, cProfile only sees the thread it is enabled on,
+    so every thread that works for the job (the worker, playlist entry
+    threads, transcode pool threads) runs its share inside thread(); the
+    per-thread profiles are merged when the job ends. From 3.12 one
+    profiler, enabled when the job starts, sees every thread of the
+    process, and only one may run at a time: jobs running alongside a
+    profiled one show up in its report, and a job starting while another
+    is profiled runs unprofiled, with the reason in its profile_warning.
+    In worker process mode each job has a process to itself, so neither
+    happens. tracemalloc covers the whole process, so jobs running
+    alongside a profiled one show up in its memory report on any version.
+    profile_path is set in the job state as the job starts; the reports
+    are there once it has finished.
+
+    Files written: cpu.prof (pstats dump, for snakeviz or pstats),
+    cpu.txt (functions by cumulative time), memory.txt (largest
+    allocations and growth since the job started) and summary.json.
+    """
+    def __init__(self, job):
+        self.job = job
+        self.directory = os.path.join(PROFILES_DIR, job.id)
+        self.profiles = []
+        self.active_threads = set()
+        self.lock = threading.Lock()
+        self.started = None
+        self.start_snapshot = None
+        self.start_rss = 0
+        self.warning = None
+
+    def thread(self):
+        """Context manager profiling the calling thread for this job"""
+        ident = threading.get_ident()
+        with self.lock:
+            # A thread already profiled (the worker running an entry inline) keeps its profiler
+            if self.started is None or ident in self.active_threads:
+                return nullcontext()
+            # A process-wide profiler already sees this thread
+            if PROCESS_WIDE_PROFILER and self.active_threads:
+                return nullcontext()
+        return self._profile_thread(ident)
+
+    def _profile_thread(self, ident):
+        profile = cProfile.Profile()
+        profile.enable()
+        with self.lock:
+            self.active_threads.add(ident)
+        return _ThreadProfile(self, profile, ident)
+
+    def _skip(self, reason):
+        """Run the job unprofiled, saying why in its state"""
+        self.warning = f'Not profiled: {reason}'
+        self.job.state['profile_warning'] = self.warning
+        print(f"Job {self.job.id}: {self.warning}")
+        return self
+
+    def _thread_done(self, profile, ident):
+        with self.lock:
+            self.active_threads.discard(ident)
+            self.profiles.append(profile)
+
+    def __enter__(self):
+        if PROCESS_WIDE_PROFILER:
+            profiled_job = _claim_process_profiler(self)
+            if profiled_job is not None:
+                return self._skip(f'job {profiled_job.id} is already being profiled in this process, '
+                                  f'and on Python 3.12+ one profiler covers every thread of it')
+        self.started = time.time()
+        try:
+            self.worker = self.thread()
+        except ValueError as e:
+            # sys.monitoring's profiler slot is held by another tool (a debugger, another profiler)
+            self.started = None
+            _release_process_profiler(self)
+            return self._skip(str(e))
+        self.worker.__enter__()
+        _start_tracing()
+        self.start_snapshot = tracemalloc.take_snapshot()
+        self.start_rss = max_rss_bytes()
+        # Known now, so it is part of the job's final state wherever the reports are written from
+        self.job.state['profile_path'] = self.directory
+        return self
+
+    def __exit__(self, *exc):
+        if self.started is None:
+            return False
+        self.worker.__exit__(*exc)
+        try:
+            # Capture now, but analyse on another thread: grouping a
+            # snapshot takes seconds, and the worker has the next job to run
+            capture = self.capture()
+        finally:
+            _stop_tracing()
+            _release_process_profiler(self)
+        threading.Thread(target=self.write, args=(capture,), name=f'profile-{self.job.id}', daemon=True).start()
+        return False
+
+    def capture(self):
+        """Everything the reports need, taken while tracemalloc still runs"""
+        current, peak = tracemalloc.get_traced_memory()
+        with self.lock:
+            profiles = list(self.profiles)
+        return {
+            'duration': time.time() - self.started,
+            'snapshot': tracemalloc.take_snapshot(),
+            'current': current,
+            'peak': peak,
+            'rss': max_rss_bytes(),
+            'profiles': profiles,
+            'status': self.job.state.get('status'),
+        }
+
+    def write(self, capture):
+        """Write the reports for the finished job"""
+        try:
+            self._write(capture)
+        except OSError as e:
+            print(f"Error writing profile of job {self.job.id}: {e}")
+        finally:
+            self.start_snapshot = None
+
+    def _write(self, capture):
+        os.makedirs(self.directory, exist_ok=True)
+
+        profiles = capture['profiles']
+        if profiles:
+            stats = pstats.Stats(profiles[0])
+            for profile in profiles[1:]:
+                stats.add(profile)
+            stats.dump_stats(os.path.join(self.directory, 'cpu.prof'))
+
+            report = io.StringIO()
+            pstats.Stats(os.path.join(self.directory, 'cpu.prof'), stream=report) \
+                .sort_stats('cumulative').print_stats(TOP_FUNCTIONS)
+            with open(os.path.join(self.directory, 'cpu.txt'), 'w') as f:
+                f.write(f"Job {self.job.id}: {self.job.url}\n")
+                if PROCESS_WIDE_PROFILER:
+                    f.write("Note: profiling covers every thread, including other jobs running at the same time\n")
+                else:
+                    f.write(f"{len(profiles)} thread(s) profiled\n")
+                f.write(report.getvalue())
+
+        # One grouping pass serves both lists; it is the slow part
+        differences = capture['snapshot'].compare_to(self.start_snapshot, 'traceback')
+        largest = sorted(differences, key=lambda stat: stat.size, reverse=True)
+        with open(os.path.join(self.directory, 'memory.txt'), 'w') as f:
+            f.write(f"Job {self.job.id}: {self.job.url}\n")
+            f.write(f"Traced memory at end: {capture['current'] / 1e6:.1f} MB, "
+                    f"peak {capture['peak'] / 1e6:.1f} MB\n")
+            f.write("Note: tracing covers every thread, including other jobs running at the same time\n")
+            for title, stats in (('Growth since the job started', differences),
+                                 ('Largest allocations still held', largest)):
+                f.write(f"\n{title} (top {TOP_ALLOCATIONS}):\n")
+                for stat in stats[:TOP_ALLOCATIONS]:
+                    f.write(f"{stat}\n")
+                    for line in stat.traceback.format(limit=TRACEMALLOC_FRAMES):
+                        f.write(f"    {line}\n")
+
+        summary = {
+            'job_id': self.job.id,
+            'url': self.job.url,
+            'status': capture['status'],
+            'started_at': self.started,
+            'duration': round(capture['duration'], 3),
+            'threads_profiled': len(profiles),
+            'process_wide': PROCESS_WIDE_PROFILER,
+            'traced_current_bytes': capture['current'],
+            'traced_peak_bytes': capture['peak'],
+            'max_rss_bytes_before': self.start_rss,
+            'max_rss_bytes_after': capture['rss'],
+        }
+        # Written last: a profile is listed once its summary exists
+        with open(os.path.join(self.directory, 'summary.json'), 'w') as f:
+            json.dump(summary, f, indent=2)
+        prune_profiles()
+
+class _ThreadProfile:
+    """Stops one thread's profiler and hands it to its JobProfiler"""
+    def __init__(self, owner, profile, ident):
+        self.owner = owner
+        self.profile = profile
+        self.ident = ident
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.profile.disable()
+        self.owner._thread_done(self.profile, self.ident)
+        return False
+
+def profiled_thread(job):
+    """Profile the calling thread for job when the job is being profiled"""
+    profiler = getattr(job, 'profiler', None)
+    return profiler.thread() if profiler is not None else nullcontext()
+
+def list_profiles():
+    """Summaries of the stored profiles, newest first"""
+    if not os.path.isdir(PROFILES_DIR):
+        return []
+    profiles = []
+    for name in os.listdir(PROFILES_DIR):
+        summary_path = os.path.join(PROFILES_DIR, name, 'summary.json')
+        try:
+            with open(summary_path) as f:
+                summary = json.load(f)
+        except (OSError, ValueError):
+            continue
+        summary['files'] = sorted(os.listdir(os.path.join(PROFILES_DIR, name)))
+        profiles.append(summary)
+    profiles.sort(key=lambda summary: summary.get('started_at') or 0, reverse=True)
+    return profiles
+
+def prune_profiles(keep=PROFILES_KEEP):
+    """Remove the oldest profiles beyond the newest keep"""
+    for summary in list_profiles()[keep:]:
+        shutil.rmtree(os.path.join(PROFILES_DIR, summary['job_id']), ignore_errors=True)
@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# modules/download/resolve.py
+# Resolving playlist entries ahead of their download for YT Media Backup
+
+import collections
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qs
+import yt_dlp
+from modules.config.settings import PRERESOLVE_AHEAD, PRERESOLVE_TTL, PRERESOLVE_MARGIN
+from modules.download.profiling import profiled_thread
+from modules.utils.metrics import PHASE_SECONDS, PRERESOLVED, count_extractions
+
+class QuietLogger:
+    """yt-dlp logger for look-ahead resolutions; a failure is reported when the entry downloads"""
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        pass
+
+def entry_url(entry):
+    """URL to resolve a flat playlist entry from"""
+    return entry.get('webpage_url') or entry.get('url')
+
+def expires_at(info, resolved_at, ttl=PRERESOLVE_TTL):
+    """When the stream URLs of a resolved entry stop working
+
+    YouTube signs the time into each URL ('expire=<unix time>'); other
+    sites get resolved_at + ttl.
+    """
+    formats = info.get('requested_formats') or info.get('formats') or [info]
+    expiries = []
+    for fmt in formats:
+        expire = parse_qs(urlparse(fmt.get('url') or '').query).get('expire')
+        if expire and expire[0].isdigit():
+            expiries.append(int(expire[0]))
+    return min(expiries) if expiries else resolved_at + ttl
+
+class EntryResolver:
+    """Extracts the next playlist entries while the current ones transfer
+
+    An entry's extraction (format lists, signatures, player JS) used to
+    run just before its transfer, so the two alternated. iterate(pairs)
+    takes (key, flat entry) pairs, as the playlist is listed, and yields
+    (key, entry resolved to a full info dict), keeping the `ahead`
+    entries after the one handed out resolving on a pool of its own. A
+    resolved entry whose stream URLs expire within `margin` seconds of
+    being used is resolved again; one that failed to resolve comes back
+    as the flat entry, which the download then extracts as it always
+    did (and reports the error of).
+    """
+    def __init__(self, ydl_opts, ahead=PRERESOLVE_AHEAD, margin=PRERESOLVE_MARGIN, job=None):
+        self.ahead = ahead
+        self.margin = margin
+        self.job = job
+        # Same extraction options as the download, without its hooks and output
+        self.ydl_opts = dict(ydl_opts, progress_hooks=[], postprocessor_hooks=[], logger=QuietLogger(),
+                             quiet=True, skip_download=True)
+        # Entries resolving or resolved, in playlist order, not handed out yet
+        self.window = collections.deque()
+        # A YoutubeDL per resolving thread, kept for every entry it resolves:
+        # creating one costs more than resolving a simple entry
+        self.local = threading.local()
+        self.instances = []
+        self.lock = threading.Lock()
+        self.closed = False
+        self.executor = ThreadPoolExecutor(max_workers=max(ahead, 1), thread_name_prefix='resolve')
+
+    def _cancelled(self):
+        return self.closed or bool(self.job and self.job.cancel_requested)
+
+    def _resolve(self, entry):
+        """Full info dict of entry and its expiry time, or None if extraction failed"""
+        if self._cancelled() or not isinstance(entry, dict):
+            return None
+        with profiled_thread(self.job):
+            return self._extract(entry)
+
+    def _ydl(self):
+        ydl = getattr(self.local, 'ydl', None)
+        if ydl is None:
+            ydl = self.local.ydl = count_extractions(yt_dlp.YoutubeDL(self.ydl_opts),
+                                                     self.job.state if self.job else None)
+            with self.lock:
+                self.instances.append(ydl)
+        return ydl
+
+    def _extract(self, entry):
+        url = entry_url(entry)
+        if not url:
+            return None
+        try:
+            with PHASE_SECONDS.time(phase='resolve'):
+                info = self._ydl().extract_info(url, download=False)
+        except Exception:
+            return None
+        if not info or info.get('_type', 'video') != 'video':
+            return None
+        return info, expires_at(info, time.time())
+
+    def _take(self, entry, future):
+        """entry resolved for download, or the flat entry when it could not be"""
+        waited = not future.done()
+        resolved = future.result()
+        if resolved is None:
+            PRERESOLVED.inc(result='failed')
+            return entry
+
+        info, expiry = resolved
+        if expiry - time.time() < self.margin:
+            # Expired or about to while it waited: resolve it again, now
+            PRERESOLVED.inc(result='refreshed')
+            resolved = self._extract(entry)
+            return resolved[0] if resolved else entry
+        PRERESOLVED.inc(result='waited' if waited else 'ready')
+        return info
+
+    def iterate(self, pairs):
+        """Yield (key, target) for each (key, flat entry) pair, resolved ahead of being asked for
+
+        Not safe to advance from several threads at once; consumers
+        take turns under a lock of their own.
+        """
+        pairs = iter(pairs)
+        while True:
+            while len(self.window) <= self.ahead and not self._cancelled():
+                pair = next(pairs, None)
+                if pair is None:
+                    break
+                self.window.append((pair, self.executor.submit(self._resolve, pair[1])))
+            if not self.window:
+                # All handed out, or cancelled: what is left goes out unresolved, for the download to skip
+                yield from pairs
+                return
+            (key, entry), future = self.window.popleft()
+            yield key, self._take(entry, future)
+
+    def close(self):
+        """Drop the resolutions nobody will ask for"""
+        self.closed = True
+        for _, future in self.window:
+            future.cancel()
+        self.window.clear()
+        # Resolutions already running finish before their YoutubeDL closes
+        self.executor.shutdown(wait=True)
+        for ydl in self.instances:
+            ydl.close()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# modules/download/retry.py
+# Per-entry retry engine for YT Media Backup
+
+import random
+import time
+from modules.config.settings import RETRY_BUDGET, RETRY_BASE_DELAY, RETRY_MAX_DELAY
+
+# Errors that no retry will fix; entries failing with these are skipped
+PERMANENT_ERROR_PATTERNS = (
+    'private video',
+    'video unavailable',
+    'has been removed',
+    'account associated with this video has been terminated',
+    'members-only',
+    'join this channel',
+    'premieres in',
+    'this live event will begin',
+)
+
+def is_permanent_error(message):
+    """Check if an error message means the entry can never be downloaded"""
+    message = (message or '').lower()
+    return any(pattern in message for pattern in PERMANENT_ERROR_PATTERNS)
+
+# Retry strategies, one per attempt. Each takes the job's yt-dlp options and
+# download type, and returns (options, reextract): reextract means the entry
+# must be extracted again because the options change what extraction returns.
+def same_options(ydl_opts, download_type):
+    """Plain retry, for transient network errors"""
+    return ydl_opts, False
+
+def android_client(ydl_opts, download_type):
+    """Ask YouTube for the android player's formats instead"""
+    return dict(ydl_opts, extractor_args={'youtube': {'player_client': ['android']}}), True
+
+def fallback_format(ydl_opts, download_type):
+    """Accept any format when the preferred ones keep failing"""
+    return dict(ydl_opts, format='bestaudio/best' if download_type == 'audio' else 'best'), True
+
+RETRY_STRATEGIES = [
+    ('same_options', same_options),
+    ('android_client', android_client),
+    ('fallback_format', fallback_format),
+]
+
+def new_entry_result(target):
+    """Outcome record for one entry of a job"""
+    if isinstance(target, dict):
+        title = target.get('title') or target.get('url') or 'Unknown'
+        url = target.get('webpage_url') or target.get('url') or ''
+        entry_id = target.get('id')
+    else:
+        title = url = target
+        entry_id = None
+
+    return {
+        'id': entry_id,
+        'title': title,
+        'url': url,
+        'target': target,
+        'status': 'pending',
+        'attempts': 0,
+        'strategy': None,
+        'postprocess': None,  # 'transcode', 'remux' or 'passthrough' once converted
+        'error': None
+    }
+
+def public_entry_result(result):
+    """Entry result without the raw yt-dlp target, for state and history"""
+    return {key: value for key, value in result.items() if key != 'target'}
+
+class RetryEngine:
+    """Retries only the failed entries of a job
+
+    Each round waits an exponential backoff with jitter, then switches to
+    the next strategy. The job has a budget of entry retries in total;
+    once it is spent, entries still failing stay failed.
+    """
+    def __init__(self, budget=RETRY_BUDGET, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY,
+                 strategies=RETRY_STRATEGIES, is_cancelled=None, sleep=time.sleep):
+        self.budget = budget
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.strategies = strategies
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.sleep = sleep
+        self.used = 0
+
+    def delay(self, attempt):
+        """Backoff before the given retry round: half fixed, half random"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def wait(self, seconds):
+        """Sleep in short steps so a cancelled job does not sit out the backoff"""
+        deadline = time.monotonic() + seconds
+        while not self.is_cancelled():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            self.sleep(min(remaining, 0.5))
+
+    def retry(self, results, download, on_round=None):
+        """Retry failed results in place
+
+        download(targets, strategy) runs one round and returns a
+        (status, error) pair per target. on_round(attempt, name, count)
+        is called before each round, e.g. to update the job message.
+        """
+        for attempt, (name, strategy) in enumerate(self.strategies, 1):
+            failed = [r for r in results if r['status'] == 'failed']
+            remaining_budget = self.budget - self.used
+            if not failed or remaining_budget <= 0 or self.is_cancelled():
+                break
+
+            failed = failed[:remaining_budget]
+            if on_round:
+                on_round(attempt, name, len(failed))
+
+            self.wait(self.delay(attempt))
+            if self.is_cancelled():
+                break
+
+            self.used += len(failed)
+            outcomes = download([r['target'] for r in failed], strategy)
+            for result, (status, error) in zip(failed, outcomes):
+                result['attempts'] += 1
+                result['strategy'] = name
+                result['status'] = status
+                result['error'] = error
+        return results
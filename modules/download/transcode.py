@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+# modules/download/transcode.py
+# Post-processing stage for YT Media Backup
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import yt_dlp
+from modules.config.settings import TRANSCODE_WORKERS
+from modules.utils.metrics import ERRORS, postprocessor_timer
+
+# Audio codecs the fast profile keeps, and the extension each ends up with
+FAST_AUDIO_CODECS = {
+    'aac': 'm4a',
+    'mp4a': 'm4a',
+    'opus': 'opus',
+    'vorbis': 'ogg',
+    'mp3': 'mp3',
+    'flac': 'flac',
+}
+
+# Full decode and encode to 192k mp3
+MP3_POSTPROCESSORS = [{
+    'key': 'FFmpegExtractAudio',
+    'preferredcodec': 'mp3',
+    'preferredquality': '192',
+}]
+
+# 'best' makes FFmpegExtractAudio copy the stream into its codec's own container
+REMUX_POSTPROCESSORS = [{
+    'key': 'FFmpegExtractAudio',
+    'preferredcodec': 'best',
+}]
+
+# Audio profiles a job can ask for
+AUDIO_PROFILES = ('mp3', 'fast')
+
+def audio_plan(info, profile='mp3'):
+    """Decide how a downloaded audio file is post-processed
+
+    Returns (path, postprocessors), path being 'transcode' (re-encode to
+    mp3), 'remux' (copy the stream into another container) or
+    'passthrough' (keep the file as downloaded). Only the fast profile
+    avoids transcoding, and only when the selected format's codec is one
+    of FAST_AUDIO_CODECS.
+    """
+    if profile == 'fast':
+        codec = (info.get('acodec') or '').split('.')[0].lower()
+        extension = FAST_AUDIO_CODECS.get(codec)
+        if extension:
+            if info.get('ext') == extension:
+                return 'passthrough', []
+            return 'remux', REMUX_POSTPROCESSORS
+    return 'transcode', MP3_POSTPROCESSORS
+
+# Shared by every job, so all downloads together never run more ffmpeg
+# processes than the machine has cores
+_pool = None
+_pool_lock = threading.Lock()
+
+def transcode_pool():
+    """Executor that runs post-processing, created on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # The encoding happens in ffmpeg child processes, so threads
+            # that start and wait on them are all the pool needs
+            _pool = ThreadPoolExecutor(max_workers=TRANSCODE_WORKERS, thread_name_prefix='transcode')
+        return _pool
+
+class PostProcessLogger:
+    """yt-dlp logger that keeps the error messages of one post-processing run"""
+    def __init__(self):
+        self.errors = []
+
+    def debug(self, msg):
+        pass
+
+    def info(self, msg):
+        pass
+
+    def warning(self, msg):
+        pass
+
+    def error(self, msg):
+        self.errors.append(msg)
+        print(msg)
+
+class TranscodeStage:
+    """Post-processing of one job, run on the shared transcode pool
+
+    The download stage hands each finished file over with submit() and
+    moves on to the next entry straight away, so the link and the CPUs
+    are busy at the same time. plan(info) returns the (path, postprocessors)
+    to use for each file, as audio_plan does. Stage counters, including
+    how many files took each path, are published in the job state under
+    'transcode'. on_outcome(video_id, outcome) hears how each file went
+    as soon as it is processed, so the stage only keeps the files still
+    queued or running, however many the job has.
+    """
+    def __init__(self, plan, state, is_cancelled=None, on_finished=None, profiler=None, on_outcome=None):
+        self.plan = plan
+        self.state = state
+        self.is_cancelled = is_cancelled or (lambda: False)
+        self.on_finished = on_finished  # Called with the final info dict of each file
+        self.on_outcome = on_outcome  # Called with the video ID and {'path': ..., 'error': ...} of each file
+        self.profiler = profiler  # JobProfiler of a profiled job, or None
+        self.futures = set()  # Files not processed yet
+        self.submitted = 0
+        self.counts = {'queued': 0, 'running': 0, 'done': 0, 'failed': 0}
+        self.paths = {}  # Files that took each path ('transcode', 'remux', 'passthrough')
+        self.lock = threading.Lock()
+        self.idle = threading.Condition(self.lock)
+
+    def _count(self, path=None, **changes):
+        with self.lock:
+            for key, delta in changes.items():
+                self.counts[key] += delta
+            if path:
+                self.paths[path] = self.paths.get(path, 0) + 1
+            counts = dict(self.counts, total=self.submitted, paths=dict(self.paths))
+        self.state['transcode'] = counts
+
+    def submit(self, info):
+        """Queue one downloaded file for post-processing"""
+        with self.lock:
+            future = transcode_pool().submit(self._profiled_run, dict(info))
+            self.futures.add(future)
+            self.submitted += 1
+        self._count(queued=1)
+        future.add_done_callback(self._collect)
+
+    def _collect(self, future):
+        # Runs once the file is processed; retried entries are submitted
+        # again, and their last outcome is the one that counts
+        try:
+            video_id, outcome = future.result()
+            if self.on_outcome:
+                self.on_outcome(video_id, outcome)
+        finally:
+            with self.lock:
+                self.futures.discard(future)
+                self.idle.notify_all()
+
+    def _profiled_run(self, info):
+        if self.profiler is None:
+            return info.get('id'), self._run(info)
+        with self.profiler.thread():
+            return info.get('id'), self._run(info)
+
+    def _run(self, info):
+        """Post-process one file; returns {'path': ..., 'error': ...}"""
+        path, postprocessors = self.plan(info)
+        self._count(queued=-1, running=1)
+        if self.is_cancelled():
+            self._count(running=-1, failed=1)
+            return {'path': path, 'error': 'Download cancelled by user'}
+
+        logger = PostProcessLogger()
+        try:
+            if postprocessors:
+                with yt_dlp.YoutubeDL({'postprocessors': postprocessors, 'logger': logger, 'keepvideo': False,
+                                       'postprocessor_hooks': [postprocessor_timer]}) as ydl:
+                    info = ydl.run_all_pps('post_process', info)
+            if self.on_finished:
+                self.on_finished(info)
+        except Exception as e:
+            logger.errors.append(str(e))
+
+        if logger.errors:
+            ERRORS.inc(phase='postprocess')
+            self._count(running=-1, failed=1)
+            return {'path': path, 'error': logger.errors[-1]}
+        self._count(path, running=-1, done=1)
+        return {'path': path, 'error': None}
+
+    def pending(self):
+        """Number of files queued or being processed"""
+        with self.lock:
+            return self.counts['queued'] + self.counts['running']
+
+    def wait(self):
+        """Wait until every submitted file is processed and its outcome reported"""
+        with self.lock:
+            while self.futures:
+                self.idle.wait()
+
+class TranscodeHandoffPP(yt_dlp.postprocessor.PostProcessor):
+    """Last post-processor of the download stage: passes the file on to a
+    TranscodeStage instead of processing it inline"""
+    def __init__(self, stage):
+        super().__init__()
+        self.stage = stage
+
+    def run(self, info):
+        if info.get('filepath'):
+            self.stage.submit(info)
+        return [], info
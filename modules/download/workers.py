@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+# modules/download/workers.py
+# Download worker processes and their shared-memory progress board
+
+import multiprocessing
+import signal
+import struct
+import threading
+import time
+from modules.config.settings import WORKER_HANG_TIMEOUT, WORKER_STALL_TIMEOUT, PROGRESS_UPDATE_INTERVAL
+from modules.download.bandwidth import bandwidth_governor
+from modules.utils.metrics import metrics, ERRORS
+
+# Fresh interpreters: forking a process that runs Flask and download threads
+# would copy their locks in whatever state they happen to be in
+_context = multiprocessing.get_context('spawn')
+
+# Seconds between heartbeats (and control reads) of a worker process
+HEARTBEAT_INTERVAL = 0.5
+
+# Files in progress a slot holds, of the job's active_files list
+ACTIVE_FILE_SLOTS = 4
+
+# Slot header: seqlock counter and heartbeat, written by the worker process;
+# cancel flag and bandwidth share, written by the parent
+SEQUENCE = struct.Struct('<Q')
+HEARTBEAT = struct.Struct('<d')
+CANCEL = struct.Struct('<B')
+RATE = struct.Struct('<d')
+SEQUENCE_OFFSET, HEARTBEAT_OFFSET, CANCEL_OFFSET, RATE_OFFSET, BODY_OFFSET = 0, 8, 16, 24, 32
+
+# Job state fields a slot carries, with their struct formats; strings are
+# UTF-8, truncated to fit
+PROGRESS_FIELDS = (
+    ('status', '32s'),
+    ('message', '256s'),
+    ('current_file', '256s'),
+    ('playlist_title', '256s'),
+    ('is_playlist', '?'),
+    ('progress', 'd'),
+    ('total_progress', 'd'),
+    ('downloaded_bytes', 'Q'),
+    ('total_bytes', 'Q'),
+    ('speed', 'd'),
+    ('eta', 'q'),
+    ('completed_files', 'I'),
+    ('total_files', 'I'),
+    ('extractions', 'I'),
+    ('archived_entries', 'I'),
+    ('listed_entries', 'I'),
+    ('listing_complete', '?'),
+)
+ACTIVE_FILE_FORMAT = '128sd'
+BODY = struct.Struct('<' + ''.join(fmt for _, fmt in PROGRESS_FIELDS) + ACTIVE_FILE_FORMAT * ACTIVE_FILE_SLOTS)
+SLOT_SIZE = BODY_OFFSET + BODY.size
+
+class WorkerLost(Exception):
+    """The worker process running a job died or stopped responding"""
+
+class BoardSlot:
+    """One worker's fixed-layout progress record in the shared board
+
+    The worker process is the only writer of the progress fields and
+    publishes them under a seqlock: the counter is odd while a write is
+    under way, and a reader that sees it odd or changed reads again. So
+    the parent reads a consistent record without a lock or pickling.
+    """
+    def __init__(self, array, index):
+        self.array = array
+        self.offset = index * SLOT_SIZE
+
+    def _get(self, fmt, offset):
+        return fmt.unpack_from(self.array, self.offset + offset)[0]
+
+    def _set(self, fmt, offset, value):
+        fmt.pack_into(self.array, self.offset + offset, value)
+
+    # Worker process side
+    def beat(self):
+        self._set(HEARTBEAT, HEARTBEAT_OFFSET, time.time())
+
+    def cancel_requested(self):
+        return bool(self._get(CANCEL, CANCEL_OFFSET))
+
+    def rate(self):
+        return self._get(RATE, RATE_OFFSET)
+
+    def publish(self, state):
+        """Write a job state snapshot; only one thread of the worker may call this at a time"""
+        values = []
+        for name, fmt in PROGRESS_FIELDS:
+            value = state.get(name)
+            if fmt.endswith('s'):
+                value = str(value or '').encode('utf-8')[:int(fmt[:-1])]
+            elif fmt == '?':
+                value = bool(value)
+            elif fmt == 'd':
+                value = float(value or 0)
+            elif fmt == 'q':
+                value = int(value or 0)
+            else:
+                # Unsigned
+                value = max(int(value or 0), 0)
+            values.append(value)
+        active = list(state.get('active_files') or [])[:ACTIVE_FILE_SLOTS]
+        for i in range(ACTIVE_FILE_SLOTS):
+            entry = active[i] if i < len(active) else {}
+            values.append(str(entry.get('file') or '').encode('utf-8')[:128])
+            values.append(float(entry.get('progress') or 0))
+
+        sequence = self._get(SEQUENCE, SEQUENCE_OFFSET)
+        self._set(SEQUENCE, SEQUENCE_OFFSET, sequence + 1)
+        BODY.pack_into(self.array, self.offset + BODY_OFFSET, *values)
+        self._set(SEQUENCE, SEQUENCE_OFFSET, sequence + 2)
+
+    # Parent side
+    def reset(self):
+        """Prepare the slot for a new worker process or job"""
+        self._set(CANCEL, CANCEL_OFFSET, 0)
+        self._set(RATE, RATE_OFFSET, 0.0)
+        self.beat()
+
+    def set_controls(self, cancel, rate):
+        self._set(CANCEL, CANCEL_OFFSET, 1 if cancel else 0)
+        self._set(RATE, RATE_OFFSET, float(rate))
+
+    def heartbeat(self):
+        return self._get(HEARTBEAT, HEARTBEAT_OFFSET)
+
+    def sequence(self):
+        return self._get(SEQUENCE, SEQUENCE_OFFSET)
+
+    def read(self):
+        """(sequence, state fields) of the last complete write, or (sequence, None) if torn every try"""
+        for _ in range(100):
+            sequence = self._get(SEQUENCE, SEQUENCE_OFFSET)
+            if sequence & 1:
+                time.sleep(0)
+                continue
+            values = BODY.unpack_from(self.array, self.offset + BODY_OFFSET)
+            if self._get(SEQUENCE, SEQUENCE_OFFSET) == sequence:
+                return sequence, self._decode(values)
+        return self._get(SEQUENCE, SEQUENCE_OFFSET), None
+
+    @staticmethod
+    def _decode(values):
+        state = {}
+        for (name, fmt), value in zip(PROGRESS_FIELDS, values):
+            if fmt.endswith('s'):
+                value = value.rstrip(b'\0').decode('utf-8', 'ignore')
+            state[name] = value
+        # The status is None until a job starts, as in current_download
+        state['status'] = state['status'] or None
+        active = values[len(PROGRESS_FIELDS):]
+        state['active_files'] = [{'file': active[i].rstrip(b'\0').decode('utf-8', 'ignore'),
+                                  'progress': active[i + 1]}
+                                 for i in range(0, len(active), 2) if active[i].strip(b'\0')]
+        return state
+
+class ProgressBoard:
+    """Shared memory holding one BoardSlot per download worker process"""
+    def __init__(self, slots):
+        # A RawArray has no lock; the seqlock in each slot makes reads safe
+        self.array = _context.RawArray('B', slots * SLOT_SIZE)
+        self.slots = [BoardSlot(self.array, index) for index in range(slots)]
+
+    def slot(self, index):
+        return self.slots[index]
+
+def job_request(job):
+    """What a worker process needs to run a job, sent once when it starts"""
+    return {
+        'job_id': job.id,
+        'url': job.url,
+        'output_dir': job.output_dir,
+        'download_type': job.download_type,
+        'playlist_mode': job.playlist_mode,
+        'parallel_entries': job.parallel_entries,
+        'use_archive': job.use_archive,
+        'audio_profile': job.audio_profile,
+        'weight': job.weight,
+        'profile': job.profile,
+        'completed_entries': set(job.completed_entries),
+    }
+
+class WorkerProcess:
+    """A download worker process, driven by one JobManager worker thread
+
+    run() hands the process a job and, until it finishes, copies the
+    job's board slot into its ProgressState (so event streams and the
+    API see it as for a job run in a thread), passes cancellation and the
+    job's bandwidth share down through the slot, and records completed
+    entries as the process reports them. A process that exits, or whose
+    heartbeat stops for hang_timeout seconds, is killed and WorkerLost
+    raised; the next job starts a fresh process. The heartbeat comes from
+    a thread of its own and only shows the process still runs, so a job
+    whose slot has not changed (no bytes, no status, no finished entry)
+    for stall_timeout seconds counts as lost too: its download threads
+    are stuck even though the process is not.
+    """
+    def __init__(self, board, index, hang_timeout=WORKER_HANG_TIMEOUT, stall_timeout=WORKER_STALL_TIMEOUT):
+        self.board = board
+        self.index = index
+        self.slot = board.slot(index)
+        self.hang_timeout = hang_timeout
+        self.stall_timeout = stall_timeout
+        self.process = None
+        self.connection = None
+
+    def _start(self):
+        parent_end, child_end = _context.Pipe()
+        self.slot.reset()
+        self.process = _context.Process(target=worker_main, args=(child_end, self.board.array, self.index),
+                                        name=f'download-process-{self.index}', daemon=True)
+        self.process.start()
+        child_end.close()
+        self.connection = parent_end
+
+    def _reap(self):
+        """Kill the process if it still runs and forget it"""
+        if self.process is not None:
+            if self.process.is_alive():
+                self.process.kill()
+            self.process.join(5)
+            self.connection.close()
+        self.process = None
+        self.connection = None
+
+    def stop(self):
+        """Ask an idle process to exit, killing it if it does not"""
+        if self.process is None:
+            return
+        try:
+            self.connection.send(None)
+        except OSError:
+            pass
+        self.process.join(5)
+        self._reap()
+
+    def run(self, job):
+        if self.process is None or not self.process.is_alive():
+            self._reap()
+            self._start()
+        # Shares of the global cap are still worked out here, among all jobs
+        bandwidth_governor.register(job.id, job.weight)
+        try:
+            # The job starts at its share of the cap, not uncapped until the first quiet poll
+            self.slot.reset()
+            self.slot.set_controls(job.cancel_requested, bandwidth_governor.share(job.id))
+            last_sequence = self.slot.sequence()
+            last_progress = time.monotonic()
+            self.connection.send(job_request(job))
+
+            while True:
+                message = None
+                try:
+                    if self.connection.poll(PROGRESS_UPDATE_INTERVAL):
+                        message = self.connection.recv()
+                except (EOFError, OSError):
+                    self._exited(job)
+
+                sequence, state = self.slot.read()
+                if state is not None and sequence != last_sequence:
+                    last_sequence = sequence
+                    last_progress = time.monotonic()
+                    job.state.update(state)
+
+                if message is not None:
+                    last_progress = time.monotonic()
+                    kind = message[0]
+                    if kind == 'entry':
+                        job.entry_done(message[1])
+                    elif kind == 'done':
+                        _, final_state, worker_metrics = message
+                        metrics.merge(worker_metrics)
+                        job.state.update(final_state)
+                        return
+                elif not self.process.is_alive():
+                    self._exited(job)
+
+                # Checked and passed down on every pass, however busy the process is reporting entries
+                if time.time() - self.slot.heartbeat() > self.hang_timeout:
+                    self._lost(job, f'Worker process stopped responding for {self.hang_timeout}s')
+                if self.stall_timeout and time.monotonic() - last_progress > self.stall_timeout:
+                    self._lost(job, f'Job made no progress for {self.stall_timeout}s')
+                self.slot.set_controls(job.cancel_requested, bandwidth_governor.share(job.id))
+        finally:
+            bandwidth_governor.unregister(job.id)
+
+    def _exited(self, job):
+        self.process.join(5)
+        self._lost(job, f'Worker process exited (code {self.process.exitcode})')
+
+    def _lost(self, job, reason):
+        ERRORS.inc(phase='worker')
+        print(f"Job {job.id}: {reason}")
+        self._reap()
+        raise WorkerLost(reason)
+
+def worker_main(connection, array, index):
+    """Entry point of a worker process: run the jobs sent over connection, one at a time"""
+    # Ctrl+C reaches the whole process group; the parent decides when workers stop
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    from modules.download.jobs import DownloadJob, job_events
+    from modules.download.media import download_media
+    from modules.download.profiling import JobProfiler
+
+    slot = BoardSlot(array, index)
+    current = {'job': None}
+    publish_lock = threading.Lock()
+    send_lock = threading.Lock()
+
+    def send(message):
+        with send_lock:
+            connection.send(message)
+
+    class WorkerJob(DownloadJob):
+        """The job as seen inside the worker; completed entries are reported to the parent"""
+        def entry_done(self, video_id):
+            if video_id:
+                self.completed_entries.add(video_id)
+                send(('entry', video_id))
+
+    def publish():
+        # Runs on whichever thread changed the job's state
+        job = current['job']
+        if job is not None:
+            with publish_lock:
+                slot.publish(job.state.snapshot())
+
+    def run(job):
+        download_media(job.url, job.output_dir, job.download_type, job.playlist_mode,
+                       job=job, parallel_entries=job.parallel_entries,
+                       use_archive=job.use_archive, audio_profile=job.audio_profile,
+                       weight=job.weight)
+
+    def control():
+        while True:
+            slot.beat()
+            job = current['job']
+            if job is not None and slot.cancel_requested():
+                job.cancel_requested = True
+            bandwidth_governor.set_rate(slot.rate())
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    job_events.subscribe(publish)
+    threading.Thread(target=control, name='worker-control', daemon=True).start()
+
+    while True:
+        try:
+            request = connection.recv()
+        except (EOFError, OSError):
+            return
+        if request is None:
+            return
+
+        completed_entries = request.pop('completed_entries')
+        job = WorkerJob(**request)
+        job.completed_entries = completed_entries
+        # The parent set the job's controls before sending it; they hold from the first byte
+        job.cancel_requested = slot.cancel_requested()
+        bandwidth_governor.set_rate(slot.rate())
+        current['job'] = job
+        publish()
+        try:
+            if job.profile:
+                job.profiler = JobProfiler(job)
+                with job.profiler:
+                    run(job)
+            else:
+                run(job)
+        except Exception as e:
+            job.state.update({'status': 'error', 'message': f'Error: {str(e)}'})
+        finally:
+            current['job'] = None
+        # Counters and timings of the job go to the parent, which serves /api/metrics
+        send(('done', dict(job.state.snapshot()), metrics.drain()))
@@ -2,81 +2,384 @@
 # modules/routes/api.py
 # API routes for YT Media Backup
 
-from flask import Blueprint, request, jsonify
-from modules.config.settings import current_download, default_download_path, cancel_requested
-from modules.download.media import get_video_info, start_download_thread
+import hashlib
+import json
+import math
+import time
+from datetime import datetime, timedelta
+from flask import Blueprint, Response, request, jsonify, send_from_directory
+from modules.config.settings import (current_download, default_download_path, PLAYLIST_WORKERS, MAX_PLAYLIST_WORKERS,
+                                     AUDIO_PROFILE, SSE_COALESCE_INTERVAL, SSE_KEEPALIVE_INTERVAL,
+                                     HISTORY_PAGE_SIZE, HISTORY_MAX_PAGE_SIZE, PROFILES_DIR)
+from modules.config.history import history_store
+from modules.download.archive import download_archive
+from modules.download.bulk import import_urls
+from modules.download.profiling import profiling, list_profiles
 from modules.utils.file_utils import open_folder
+from modules.utils.metrics import metrics
 
 # Create blueprint
 api_routes = Blueprint('api_routes', __name__)
 
+# The download modules import yt_dlp, the slowest import in the app, so the
+# routes import them when first called; app.warm_up() loads them in the
+# background while the window opens
+
 @api_routes.route('/api/check-url', methods=['POST'])
 def check_url():
     """Check if URL is a single video or playlist"""
+    from modules.download.media import get_video_info
     data = request.get_json()
     url = data.get('url', '')
     
     if not url:
         return jsonify({'error': 'No URL provided'})
     
-    info = get_video_info(url)
+    # bypass_cache forces a fresh extraction (and refreshes the cache)
+    info = get_video_info(url, use_cache=not data.get('bypass_cache', False))
     return jsonify(info)
 
+@api_routes.route('/api/metadata-cache')
+def metadata_cache_stats():
+    """Get hit/miss counters for the URL metadata cache"""
+    from modules.download.media import metadata_cache
+    return jsonify(metadata_cache.get_stats())
+
+@api_routes.route('/api/metadata-cache/clear', methods=['POST'])
+def clear_metadata_cache():
+    """Empty the URL metadata cache"""
+    from modules.download.media import metadata_cache
+    metadata_cache.clear()
+    return jsonify({'status': 'cleared'})
+
 @api_routes.route('/api/get-default-path')
 def get_default_path():
     """Get the default download path"""
     return jsonify({"path": default_download_path})
 
+def parse_weight(value):
+    """A job's bandwidth weight from a request; raises ValueError saying what is wrong with it"""
+    try:
+        weight = float(value)
+    except (TypeError, ValueError):
+        raise ValueError('Invalid weight')
+    if not math.isfinite(weight) or weight <= 0:
+        raise ValueError('Weight must be positive')
+    return weight
+
 @api_routes.route('/api/download', methods=['POST'])
 def start_download():
     """Start the download process"""
+    from modules.download.jobs import job_manager
+    from modules.download.transcode import AUDIO_PROFILES
     data = request.get_json()
     url = data.get('url', '')
     output_dir = data.get('output_dir', default_download_path)
     download_type = data.get('download_type', 'audio')
     playlist_mode = data.get('playlist_mode', 'single')
+    try:
+        parallel_entries = min(max(int(data.get('parallel_entries', PLAYLIST_WORKERS)), 1), MAX_PLAYLIST_WORKERS)
+    except (TypeError, ValueError, OverflowError):
+        return jsonify({'error': 'Invalid parallel_entries'}), 400
+    # Set use_archive to false to download again what was already downloaded
+    use_archive = bool(data.get('use_archive', True))
+    # 'fast' keeps audio streams already in a common codec instead of converting them to mp3
+    audio_profile = data.get('audio_profile', AUDIO_PROFILE)
+    # Share of the bandwidth cap relative to other jobs downloading at the same time
+    try:
+        weight = parse_weight(data.get('weight', 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Capture a cProfile and tracemalloc report of this job under data/profiles/<job id>/
+    profile = bool(data.get('profile', False))
     
     if not url:
         return jsonify({'error': 'No URL provided'})
     
-    # Start download in a separate thread
-    start_download_thread(url, output_dir, download_type, playlist_mode)
+    if audio_profile not in AUDIO_PROFILES:
+        return jsonify({'error': f'Unknown audio profile: {audio_profile}'})
+    
+    # Queue the download on the worker pool
+    job = job_manager.submit(url, output_dir, download_type, playlist_mode, parallel_entries, use_archive,
+                             audio_profile, weight, profile)
+    
+    return jsonify({'status': 'started', 'job_id': job.id})
+
+@api_routes.route('/api/download/bulk', methods=['POST'])
+def start_bulk_download():
+    """Queue a download for every URL in an uploaded text, CSV or JSON lines file
+    
+    Send the file as the 'file' field of a form, or as the raw request
+    body with options in the query string. Options: output_dir,
+    download_type, playlist_mode ('auto' by default: playlists for
+    playlist links only), audio_profile and dry_run=1 to only count.
+    The upload is read line by line, never held in memory whole.
+    """
+    from modules.download.jobs import job_manager
+    from modules.download.transcode import AUDIO_PROFILES
+    options = request.args if 'file' not in request.files else request.form
+    audio_profile = options.get('audio_profile', AUDIO_PROFILE)
+    if audio_profile not in AUDIO_PROFILES:
+        return jsonify({'error': f'Unknown audio profile: {audio_profile}'}), 400
+    
+    job_options = {
+        'output_dir': options.get('output_dir', default_download_path),
+        'download_type': options.get('download_type', 'audio'),
+        'playlist_mode': options.get('playlist_mode', 'auto'),
+        'audio_profile': audio_profile
+    }
+    dry_run = options.get('dry_run') in ('1', 'true')
     
-    return jsonify({'status': 'started'})
+    upload = request.files['file'].stream if 'file' in request.files else request.stream
+    summary = import_urls(upload, job_manager, job_options, dry_run=dry_run)
+    return jsonify(summary)
 
 @api_routes.route('/api/cancel-download', methods=['POST'])
 def cancel_download():
-    """Cancel the current download process"""
-    global cancel_requested
-    cancel_requested = True
-    
-    # Update the current download status
-    current_download["status"] = "cancelled"
-    current_download["message"] = "Download cancelled by user"
-    
-    return jsonify({"status": "cancelled"})
-    # Add cancelled download to history with Partial status
-    from modules.config.settings import download_history, save_download_history
-    
-    # Only add to history if we have current download info
-    if current_download.get('playlist_title') or current_download.get('current_file'):
-        # Create a title from playlist or current file
-        title = current_download.get('playlist_title') or current_download.get('current_file', 'Unknown')
-        download_history.append({
-            'url': '',  # URL might not be accessible here
-            'output_dir': current_download.get('output_path', ''),
-            'download_type': current_download.get('selected_mode', 'unknown'),
-            'is_playlist': current_download.get('is_playlist', False),
-            'title': title,
-            'status': 'completed_with_errors'  # This will show as 'Partial'
-        })
-        save_download_history()
-
+    """Cancel a download (the most recent one unless a job ID is given)"""
+    from modules.download.jobs import job_manager
+    data = request.get_json(silent=True) or {}
+    job_id = data.get('job_id')
+    
+    job = job_manager.get(job_id) if job_id else job_manager.latest()
+    if job is None:
+        return jsonify({'error': 'No download to cancel'})
+    
+    job_manager.cancel(job.id)
+    return jsonify({"status": "cancelled", "job_id": job.id})
 
 @api_routes.route('/api/download-status')
 def download_status():
-    """Get the current download status"""
-    return jsonify(current_download)
+    """Get the status of the most recent download"""
+    from modules.download.jobs import job_manager
+    job = job_manager.latest()
+    if job is None:
+        return jsonify(current_download)
+    return jsonify(job.to_dict())
+
+@api_routes.route('/api/events')
+def events():
+    """Stream job progress as Server-Sent Events
+    
+    An event is sent only when a job's state actually changed, and bursts of
+    changes are coalesced to at most one push per SSE_COALESCE_INTERVAL.
+    Pass ?job_id=... to follow a single job; that stream ends once the job
+    has finished.
+    """
+    from modules.download.jobs import job_manager, job_events
+    job_id = request.args.get('job_id')
+    if job_id and job_manager.get(job_id) is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def stream():
+        sent_versions = {}
+        # None makes the first pass send every job's current state
+        last_version = None
+        last_push = 0
+        
+        while True:
+            version = job_events.wait(last_version, SSE_KEEPALIVE_INTERVAL)
+            if version == last_version:
+                # Nothing changed; a comment line keeps proxies from closing the stream
+                yield ': keepalive\n\n'
+                continue
+            
+            # Let a burst of changes settle so the client only sees the latest state
+            wait = SSE_COALESCE_INTERVAL - (time.time() - last_push)
+            if wait > 0:
+                time.sleep(wait)
+            last_version = job_events.version
+            last_push = time.time()
+            
+            if job_id:
+                job = job_manager.get(job_id)
+                jobs = [job] if job else []
+            else:
+                jobs = job_manager.list_jobs()
+            
+            for job in jobs:
+                if sent_versions.get(job.id) == job.state.version:
+                    continue
+                sent_versions[job.id] = job.state.version
+                yield f'id: {last_version}\nevent: job\ndata: {json.dumps(job.to_dict())}\n\n'
+            
+            if job_id and (not jobs or jobs[0].is_finished):
+                return
+    
+    return Response(stream(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+@api_routes.route('/api/jobs')
+def list_jobs():
+    """List all tracked download jobs"""
+    from modules.download.jobs import job_manager
+    return jsonify({'jobs': [job.to_dict() for job in job_manager.list_jobs()]})
+
+@api_routes.route('/api/jobs/<job_id>')
+def get_job(job_id):
+    """Get the status of a single download job"""
+    from modules.download.jobs import job_manager
+    job = job_manager.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job.to_dict())
+
+@api_routes.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    """Cancel a single download job"""
+    from modules.download.jobs import job_manager
+    job = job_manager.cancel(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'status': job.state['status'], 'job_id': job.id})
+
+@api_routes.route('/api/jobs/<job_id>/weight', methods=['POST'])
+def set_job_weight(job_id):
+    """Change a job's share of the bandwidth cap"""
+    from modules.download.jobs import job_manager
+    data = request.get_json(silent=True) or {}
+    try:
+        weight = parse_weight(data.get('weight', 1))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    job = job_manager.set_weight(job_id, weight)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify({'job_id': job.id, 'weight': job.weight})
+
+@api_routes.route('/api/bandwidth')
+def bandwidth_stats():
+    """Get the bandwidth cap and how it is shared between downloading jobs"""
+    from modules.download.bandwidth import bandwidth_governor
+    return jsonify(bandwidth_governor.stats())
+
+@api_routes.route('/api/bandwidth', methods=['POST'])
+def set_bandwidth():
+    """Change the global bandwidth cap, in bytes per second or like '2M' (0 removes it)"""
+    from modules.download.bandwidth import bandwidth_governor, parse_rate
+    data = request.get_json(silent=True) or {}
+    try:
+        rate = parse_rate(data.get('limit', 0))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    bandwidth_governor.set_rate(rate)
+    return jsonify(bandwidth_governor.stats())
+
+@api_routes.route('/api/metrics')
+def prometheus_metrics():
+    """Phase timings, counters and job gauges in Prometheus text format"""
+    # Importing the job manager registers the job gauges
+    from modules.download.jobs import job_manager
+    return Response(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@api_routes.route('/api/profiling')
+def profiling_settings():
+    """Whether every job is being profiled"""
+    return jsonify({'all_jobs': profiling['all_jobs']})
+
+@api_routes.route('/api/profiling', methods=['POST'])
+def set_profiling():
+    """Turn profiling of every job that starts from now on or off: {"all_jobs": true}"""
+    data = request.get_json(silent=True) or {}
+    profiling['all_jobs'] = bool(data.get('all_jobs', False))
+    return jsonify({'all_jobs': profiling['all_jobs']})
+
+@api_routes.route('/api/profiles')
+def profiles():
+    """List the stored job profiles, newest first"""
+    return jsonify(list_profiles())
+
+@api_routes.route('/api/profiles/<job_id>')
+def profile_files(job_id):
+    """Summary and files of one job's profile"""
+    for summary in list_profiles():
+        if summary['job_id'] == job_id:
+            return jsonify(summary)
+    return jsonify({'error': 'Profile not found'}), 404
+
+@api_routes.route('/api/profiles/<job_id>/<filename>')
+def profile_file(job_id, filename):
+    """Download one report of a job's profile (cpu.prof, cpu.txt, memory.txt, summary.json)"""
+    return send_from_directory(PROFILES_DIR, f'{job_id}/{filename}', as_attachment=filename.endswith('.prof'))
+
+@api_routes.route('/api/archive')
+def archive_stats():
+    """Get the number of archived (already downloaded) items"""
+    return jsonify(download_archive.stats())
+
+@api_routes.route('/api/archive/backfill', methods=['POST'])
+def archive_backfill():
+    """Archive the entries of a URL that already exist in an output directory"""
+    from modules.download.media import backfill_archive
+    data = request.get_json()
+    url = data.get('url', '')
+    output_dir = data.get('output_dir', default_download_path)
+    download_type = data.get('download_type', 'audio')
+    
+    if not url:
+        return jsonify({'error': 'No URL provided'})
+    
+    return jsonify(backfill_archive(url, output_dir, download_type))
+
+def parse_history_date(value, end_of_day=False):
+    """Turn a YYYY-MM-DD date or a Unix timestamp into a timestamp
+
+    With end_of_day, a date means up to the end of that day. Raises
+    ValueError for anything else.
+    """
+    try:
+        return float(value)
+    except ValueError:
+        day = datetime.strptime(value, '%Y-%m-%d')
+        if end_of_day:
+            day += timedelta(days=1)
+        return day.timestamp()
+
+@api_routes.route('/api/history')
+def history():
+    """Page through download history, newest first
+
+    Query parameters: limit, cursor (next_cursor of the previous page),
+    status, type, since, until (YYYY-MM-DD or Unix time), q (title search)
+    and entries=1 to include per-entry results. Responses carry an ETag;
+    a matching If-None-Match gets 304 without touching the table.
+    """
+    args = request.args
+    try:
+        limit = min(max(int(args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+        before = int(args['cursor']) if args.get('cursor') else None
+        since = parse_history_date(args['since']) if args.get('since') else None
+        until = parse_history_date(args['until'], end_of_day=True) if args.get('until') else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit, cursor or date'}), 400
+
+    # The page only changes when the table does, so the ETag is the table
+    # version plus the query; checking it costs one indexed MIN/MAX lookup
+    query = sorted((key, value) for key, value in args.items(multi=True))
+    etag = hashlib.sha1(f'{history_store.version()}{query}'.encode('utf-8')).hexdigest()
+    if request.if_none_match.contains(etag):
+        return Response(status=304, headers={'ETag': f'"{etag}"', 'Cache-Control': 'no-cache'})
+
+    entries, next_cursor = history_store.query(
+        limit=limit, before=before, status=args.get('status') or None,
+        download_type=args.get('type') or None, since=since, until=until,
+        search=args.get('q') or None, include_entries=args.get('entries') == '1')
+
+    response = jsonify({'entries': entries, 'next_cursor': next_cursor})
+    response.set_etag(etag)
+    # Let browsers keep the page but revalidate it with If-None-Match each time
+    response.cache_control.no_cache = True
+    return response
+
+@api_routes.route('/api/history/<int:entry_id>')
+def history_entry(entry_id):
+    """Get one history entry, including its per-entry results"""
+    entry = history_store.get(entry_id)
+    if entry is None:
+        return jsonify({'error': 'History entry not found'}), 404
+    return jsonify(entry)
 
 @api_routes.route('/api/open-folder', methods=['POST'])
 def api_open_folder():
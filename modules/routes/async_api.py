@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# modules/routes/async_api.py
+# Coroutine versions of the busiest API routes, for the asyncio server
+
+import asyncio
+import json
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from modules.config.settings import (current_download, SSE_COALESCE_INTERVAL, SSE_KEEPALIVE_INTERVAL,
+                                     ASYNC_EXTRACT_WORKERS)
+from modules.download.jobs import job_manager, job_events
+from modules.download.media import get_video_info
+from modules.utils.async_server import Response, json_response
+
+class AsyncChanges:
+    """job_events seen from the event loop: wait for a change without a thread
+
+    Job state changes on worker threads; each wakes the loop at most once
+    until it has run, however many changes arrive in between.
+    """
+    def __init__(self):
+        self.loop = None
+        self.event = None
+        self.scheduled = False
+
+    def _start(self):
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.event = asyncio.Event()
+            job_events.subscribe(self._changed)
+
+    def _changed(self):
+        # Runs on the thread that changed a job
+        if not self.scheduled:
+            self.scheduled = True
+            try:
+                self.loop.call_soon_threadsafe(self._wake)
+            except RuntimeError:
+                # The server has stopped and its loop is closed
+                pass
+
+    def _wake(self):
+        self.scheduled = False
+        event, self.event = self.event, asyncio.Event()
+        event.set()
+
+    async def wait(self, last_version, timeout):
+        """Wait until job_events moved past last_version; returns False on timeout"""
+        self._start()
+        event = self.event
+        if job_events.version != last_version:
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job_events.version != last_version
+
+class AsyncAPI:
+    """Routes served on the event loop; the rest of api.py runs through WSGI
+
+    Status and job reads only copy in-memory snapshots, so they run on the
+    loop directly. Event streams wait on AsyncChanges instead of holding a
+    thread each, and metadata lookups run on their own bounded executor,
+    so slow extractions cannot take the threads other requests need.
+    """
+    def __init__(self, extract_workers=ASYNC_EXTRACT_WORKERS):
+        self.extractor = ThreadPoolExecutor(max_workers=extract_workers, thread_name_prefix='extract')
+        self.changes = AsyncChanges()
+
+    def routes(self):
+        return [
+            ('GET', re.compile(r'/api/download-status'), self.download_status),
+            ('GET', re.compile(r'/api/jobs'), self.list_jobs),
+            ('GET', re.compile(r'/api/jobs/(?P<job_id>[^/]+)'), self.get_job),
+            ('GET', re.compile(r'/api/events'), self.events),
+            ('POST', re.compile(r'/api/check-url'), self.check_url),
+        ]
+
+    async def download_status(self, request, match):
+        """Get the status of the most recent download"""
+        job = job_manager.latest()
+        if job is None:
+            return json_response(current_download)
+        return json_response(job.to_dict())
+
+    async def list_jobs(self, request, match):
+        """List all tracked download jobs"""
+        return json_response({'jobs': [job.to_dict() for job in job_manager.list_jobs()]})
+
+    async def get_job(self, request, match):
+        """Get the status of a single download job"""
+        job = job_manager.get(match.group('job_id'))
+        if job is None:
+            return json_response({'error': 'Job not found'}, 404)
+        return json_response(job.to_dict())
+
+    async def check_url(self, request, match):
+        """Check if URL is a single video or playlist, extracting on the lookup executor"""
+        data = request.json() or {}
+        url = data.get('url', '')
+
+        if not url:
+            return json_response({'error': 'No URL provided'})
+
+        info = await asyncio.get_running_loop().run_in_executor(
+            self.extractor, get_video_info, url, not data.get('bypass_cache', False))
+        return json_response(info)
+
+    async def events(self, request, match):
+        """Stream job progress as Server-Sent Events, as /api/events in api.py does"""
+        job_id = request.args.get('job_id')
+        if job_id and job_manager.get(job_id) is None:
+            return json_response({'error': 'Job not found'}, 404)
+        return Response(self._stream(job_id), content_type='text/event-stream',
+                        headers=[('Cache-Control', 'no-cache'), ('X-Accel-Buffering', 'no')])
+
+    async def _stream(self, job_id):
+        sent_versions = {}
+        # None makes the first pass send every job's current state
+        last_version = None
+        last_push = 0
+
+        while True:
+            if last_version is not None and not await self.changes.wait(last_version, SSE_KEEPALIVE_INTERVAL):
+                # Nothing changed; a comment line keeps proxies from closing the stream
+                yield b': keepalive\n\n'
+                continue
+
+            # Let a burst of changes settle so the client only sees the latest state
+            wait = SSE_COALESCE_INTERVAL - (time.time() - last_push)
+            if wait > 0:
+                await asyncio.sleep(wait)
+            last_version = job_events.version
+            last_push = time.time()
+
+            if job_id:
+                job = job_manager.get(job_id)
+                jobs = [job] if job else []
+            else:
+                jobs = job_manager.list_jobs()
+
+            for job in jobs:
+                if sent_versions.get(job.id) == job.state.version:
+                    continue
+                sent_versions[job.id] = job.state.version
+                yield f'id: {last_version}\nevent: job\ndata: {json.dumps(job.to_dict())}\n\n'.encode('utf-8')
+
+            if job_id and (not jobs or jobs[0].is_finished):
+                return
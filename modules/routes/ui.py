@@ -3,7 +3,6 @@
 # UI routes for YT Media Backup
 
 from flask import Blueprint, render_template
-from modules.config.settings import download_history
 
 # Create blueprint
 ui_routes = Blueprint('ui_routes', __name__)
@@ -15,8 +14,8 @@ def index():
 
 @ui_routes.route('/backups')
 def backups():
-    """Render the backups page"""
-    return render_template('backups.html', download_history=download_history)
+    """Render the backups page; its rows are fetched from /api/history"""
+    return render_template('backups.html')
 
 @ui_routes.route('/information')
 def information():
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+# modules/utils/async_server.py
+# asyncio HTTP server for YT Media Backup
+
+import asyncio
+import io
+import json
+import socket
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from http import HTTPStatus
+from urllib.parse import parse_qs, unquote_to_bytes
+
+# Seconds an idle kept-alive connection stays open, and request size limits
+KEEPALIVE_TIMEOUT = 75
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 64 * 1024 * 1024
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or HTTPStatus(status).phrase)
+        self.status = status
+
+class Request:
+    """One parsed HTTP request"""
+    def __init__(self, method, target, version, headers, body, remote_addr):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers  # Lower-cased names
+        self.body = body
+        self.remote_addr = remote_addr
+        self.path, _, self.query_string = target.partition('?')
+        self.args = {key: values[-1] for key, values in parse_qs(self.query_string).items()}
+
+    def json(self):
+        """The body decoded as JSON, or None when it is not valid JSON"""
+        try:
+            return json.loads(self.body or b'null')
+        except ValueError:
+            return None
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get('connection', '').lower()
+        if self.version == 'HTTP/1.1':
+            return connection != 'close'
+        return connection == 'keep-alive'
+
+class Response:
+    """A response: body is bytes, or an async iterator of bytes for a stream"""
+    def __init__(self, body=b'', status=200, content_type='application/json', headers=None):
+        self.body = body
+        self.status = status
+        self.headers = [('Content-Type', content_type)] + list(headers or [])
+
+def json_response(data, status=200):
+    # Same compact output as Flask's jsonify
+    return Response(json.dumps(data, separators=(',', ':')).encode('utf-8') + b'\n', status)
+
+class AsyncHTTPServer:
+    """asyncio HTTP/1.1 server with coroutine routes, falling back to a WSGI app
+
+    Connections, kept-alive or idle, and streams cost no thread; only
+    work handed to an executor does. Routes are (method, compiled regex,
+    coroutine function) tuples; the coroutine gets the Request and the
+    regex match, and returns a Response. Requests no route matches go to
+    the WSGI app, run on a pool of `threads` threads, so every endpoint
+    of the app is still served.
+    """
+    def __init__(self, host, port, app, threads, routes=()):
+        self.app = app
+        self.routes = list(routes)
+        self.threads = threads
+        self.executor = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='wsgi')
+        self.loop = None
+        self.stopped = None
+        self.ready = threading.Event()
+
+        # Bound now, so the port is known before serve_forever() runs
+        self.socket = socket.create_server((host, port), backlog=1024)
+        self.server_name, self.server_port = self.socket.getsockname()[:2]
+
+    def serve_forever(self):
+        """Run the event loop until shutdown() or KeyboardInterrupt"""
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self.loop = asyncio.get_running_loop()
+        self.stopped = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket, limit=MAX_HEADER_BYTES)
+        self.ready.set()
+        async with server:
+            await self.stopped.wait()
+
+    def shutdown(self):
+        """Stop serving; safe to call from any thread"""
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.stopped.set)
+
+    def server_close(self):
+        self.shutdown()
+        self.executor.shutdown(wait=False)
+        self.socket.close()
+
+    async def _read_request(self, reader, remote_addr):
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), KEEPALIVE_TIMEOUT)
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, version = lines[0].split(' ')
+        except ValueError:
+            raise HTTPError(400)
+        headers = {}
+        for line in lines[1:]:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            # Clients of this API always know their body size
+            raise HTTPError(411)
+        length = int(headers.get('content-length') or 0)
+        if length > MAX_BODY_BYTES:
+            raise HTTPError(413)
+        body = await reader.readexactly(length) if length else b''
+        return Request(method, target, version, headers, body, remote_addr)
+
+    async def _handle_connection(self, reader, writer):
+        remote_addr = (writer.get_extra_info('peername') or ('', 0))[0]
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader, remote_addr)
+                except HTTPError as e:
+                    await self._send(writer, None, json_response({'error': str(e)}, e.status), keep_alive=False)
+                    return
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError,
+                        ConnectionError, ValueError):
+                    return
+
+                response = await self._dispatch(request)
+                if not await self._send(writer, request, response, request.keep_alive):
+                    return
+        except ConnectionError:
+            pass
+        except asyncio.CancelledError:
+            # The server is stopping; end the connection quietly
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request):
+        for method, pattern, handler in self.routes:
+            if request.method != method:
+                continue
+            match = pattern.fullmatch(request.path)
+            if match:
+                try:
+                    return await handler(request, match)
+                except Exception as e:
+                    print(f"Error handling {request.method} {request.path}: {e}", file=sys.stderr)
+                    return json_response({'error': 'Internal server error'}, 500)
+        return await self.run_blocking(self._call_wsgi, request)
+
+    async def run_blocking(self, function, *args, executor=None):
+        """Run a blocking call in an executor (the WSGI pool by default) without blocking the loop"""
+        return await self.loop.run_in_executor(executor or self.executor, function, *args)
+
+    def _call_wsgi(self, request):
+        """Run the WSGI app for one request and collect its whole response"""
+        environ = {
+            'REQUEST_METHOD': request.method,
+            'SCRIPT_NAME': '',
+            'PATH_INFO': unquote_to_bytes(request.path).decode('latin-1'),
+            'QUERY_STRING': request.query_string,
+            'CONTENT_TYPE': request.headers.get('content-type', ''),
+            'CONTENT_LENGTH': str(len(request.body)),
+            'SERVER_NAME': self.server_name,
+            'SERVER_PORT': str(self.server_port),
+            'SERVER_PROTOCOL': request.version,
+            'REMOTE_ADDR': request.remote_addr,
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(request.body),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in request.headers.items():
+            key = 'HTTP_' + name.upper().replace('-', '_')
+            if key not in ('HTTP_CONTENT_TYPE', 'HTTP_CONTENT_LENGTH'):
+                environ[key] = value
+
+        started = {}
+        def start_response(status, headers, exc_info=None):
+            started['status'] = int(status.split(' ', 1)[0])
+            started['headers'] = headers
+
+        result = self.app(environ, start_response)
+        try:
+            body = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+
+        response = Response(body, started['status'])
+        # The length is worked out again when sending, except for HEAD where the body is left out
+        response.headers = [(name, value) for name, value in started['headers']
+                            if name.lower() != 'content-length' or request.method == 'HEAD']
+        return response
+
+    async def _send(self, writer, request, response, keep_alive):
+        """Write a response; returns whether the connection can take another request"""
+        streaming = not isinstance(response.body, (bytes, bytearray))
+        # A stream to an HTTP/1.0 client ends when the connection does
+        chunked = streaming and request is not None and request.version == 'HTTP/1.1'
+        lines = [f'HTTP/1.1 {response.status} {HTTPStatus(response.status).phrase}']
+        lines += [f'{name}: {value}' for name, value in response.headers]
+        if chunked:
+            lines.append('Transfer-Encoding: chunked')
+        elif not streaming and not any(name.lower() == 'content-length' for name, _ in response.headers):
+            lines.append(f'Content-Length: {len(response.body)}')
+        keep_alive = keep_alive and (chunked or not streaming)
+        lines.append('Connection: keep-alive' if keep_alive else 'Connection: close')
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+
+        if not streaming:
+            if request is None or request.method != 'HEAD':
+                writer.write(response.body)
+            await writer.drain()
+            return keep_alive
+
+        try:
+            async for chunk in response.body:
+                writer.write(b'%x\r\n%s\r\n' % (len(chunk), chunk) if chunked else chunk)
+                await writer.drain()
+            if chunked:
+                writer.write(b'0\r\n\r\n')
+                await writer.drain()
+        finally:
+            await response.body.aclose()
+        return keep_alive
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# modules/utils/cache.py
+# Metadata cache for YT Media Backup
+
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+class MetadataCache:
+    """Two-tier cache for URL metadata lookups
+
+    An in-memory LRU tier answers repeat lookups straight away; an optional
+    on-disk tier (one JSON file per key) keeps results across restarts.
+    Both tiers expire entries after ttl seconds, and the disk tier is kept
+    under max_disk_bytes by removing the oldest files first.
+    """
+    def __init__(self, max_entries=256, ttl=6 * 60 * 60, disk_dir=None, max_disk_bytes=20 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.disk_dir = disk_dir
+        self.max_disk_bytes = max_disk_bytes
+        self.memory = OrderedDict()
+        self.lock = threading.Lock()
+        self.disk_bytes = None  # Worked out on first disk write
+        self.stats = {'memory_hits': 0, 'disk_hits': 0, 'misses': 0, 'stores': 0, 'expired': 0}
+
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    def _disk_path(self, key):
+        return os.path.join(self.disk_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + '.json')
+
+    def get(self, key):
+        """Return the cached value for key, or None"""
+        now = time.time()
+        with self.lock:
+            entry = self.memory.get(key)
+            if entry is not None:
+                if now - entry[0] < self.ttl:
+                    self.memory.move_to_end(key)
+                    self.stats['memory_hits'] += 1
+                    return entry[1]
+                del self.memory[key]
+                self.stats['expired'] += 1
+
+        value = self._read_disk(key, now)
+        with self.lock:
+            if value is None:
+                self.stats['misses'] += 1
+                return None
+            self.stats['disk_hits'] += 1
+
+        # Promote disk hits to the memory tier
+        self._remember(key, value, now)
+        return value
+
+    def set(self, key, value):
+        """Store a JSON-serializable value under key in both tiers"""
+        now = time.time()
+        self._remember(key, value, now)
+        with self.lock:
+            self.stats['stores'] += 1
+        self._write_disk(key, value, now)
+
+    def clear(self):
+        """Drop every cached entry from both tiers"""
+        with self.lock:
+            self.memory.clear()
+            self.disk_bytes = 0
+            if self.disk_dir:
+                for name in os.listdir(self.disk_dir):
+                    if name.endswith('.json'):
+                        try:
+                            os.remove(os.path.join(self.disk_dir, name))
+                        except OSError:
+                            pass
+
+    def get_stats(self):
+        """Hit/miss counters plus current sizes"""
+        with self.lock:
+            stats = dict(self.stats)
+            stats['memory_entries'] = len(self.memory)
+            stats['disk_bytes'] = self.disk_bytes
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = (stats['memory_hits'] + stats['disk_hits']) / lookups if lookups else 0
+        return stats
+
+    def _remember(self, key, value, stored_at):
+        with self.lock:
+            self.memory[key] = (stored_at, value)
+            self.memory.move_to_end(key)
+            while len(self.memory) > self.max_entries:
+                self.memory.popitem(last=False)
+
+    def _read_disk(self, key, now):
+        if not self.disk_dir:
+            return None
+
+        path = self._disk_path(key)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        # Different keys hashing alike, or an expired entry, count as a miss
+        if entry.get('key') != key:
+            return None
+        if now - entry.get('stored_at', 0) >= self.ttl:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            with self.lock:
+                self.stats['expired'] += 1
+            return None
+        return entry.get('value')
+
+    def _write_disk(self, key, value, stored_at):
+        if not self.disk_dir:
+            return
+
+        path = self._disk_path(key)
+        temp_path = f'{path}.{threading.get_ident()}.tmp'
+        try:
+            with open(temp_path, 'w') as f:
+                json.dump({'key': key, 'stored_at': stored_at, 'value': value}, f)
+            size = os.path.getsize(temp_path)
+            # Atomic swap so readers never see a half-written file
+            os.replace(temp_path, path)
+        except (OSError, TypeError, ValueError) as e:
+            print(f"Error writing metadata cache: {e}")
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            return
+
+        with self.lock:
+            if self.disk_bytes is None:
+                self.disk_bytes = self._scan_disk_bytes()
+            else:
+                self.disk_bytes += size
+            if self.disk_bytes > self.max_disk_bytes:
+                self._prune_disk()
+
+    def _scan_disk_bytes(self):
+        total = 0
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.json'):
+                try:
+                    total += os.path.getsize(os.path.join(self.disk_dir, name))
+                except OSError:
+                    pass
+        return total
+
+    def _prune_disk(self):
+        """Remove the oldest files until the disk tier is back to 90% of its cap"""
+        files = []
+        for name in os.listdir(self.disk_dir):
+            if name.endswith('.json'):
+                path = os.path.join(self.disk_dir, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                files.append((stat.st_mtime, stat.st_size, path))
+
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.max_disk_bytes * 0.9
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        self.disk_bytes = total
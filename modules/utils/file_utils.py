@@ -39,6 +39,70 @@ def sanitize_filename(filename):
     # Add the extension back
     return sanitized + extension
 
+def claim_name(src, dst):
+    """Move src to dst unless dst already exists; returns whether it moved
+    
+    The check and the move are one step, so two threads or processes
+    never both get the same name and no file overwrites another.
+    """
+    try:
+        os.link(src, dst)
+    except (FileExistsError, FileNotFoundError):
+        if os.path.lexists(dst):
+            return False
+        raise
+    except OSError:
+        # No hard links on this filesystem; reserve the name with an empty file instead
+        try:
+            os.close(os.open(dst, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+        except FileExistsError:
+            return False
+        os.replace(src, dst)
+        return True
+    os.unlink(src)
+    return True
+
+def move_file(src, dst, tag=None):
+    """Move src to dst, or to the first free name after it, and return the new path
+    
+    When dst is taken, name_<tag>.ext is tried next, then the same with
+    _2, _3, ... appended (name_2.ext, name_3.ext, ... without a tag).
+    """
+    if claim_name(src, dst):
+        return dst
+    base, extension = os.path.splitext(dst)
+    if tag:
+        # Cleaned as sanitize_filename would, so the name stays as it is when sanitized again
+        base = base + '_' + re.sub(r'[\W_]+', '_', str(tag)).strip('_')
+        candidate = base + extension
+        if candidate != src and claim_name(src, candidate):
+            return candidate
+    counter = 2
+    while True:
+        candidate = f"{base}_{counter}{extension}"
+        if candidate != src and claim_name(src, candidate):
+            return candidate
+        counter += 1
+
+def sanitize_file(filepath, tag=None):
+    """Rename a file to its sanitized name and return the new path
+    
+    If another file already has that name, the file gets one derived from
+    tag (the video ID) instead, as move_file does, so no file is ever
+    overwritten and the name a file gets does not depend on how many
+    others got there first. Returns the original path when renaming fails.
+    """
+    directory, filename = os.path.split(filepath)
+    sanitized = sanitize_filename(filename)
+    if sanitized == filename:
+        return filepath
+    
+    try:
+        return move_file(filepath, os.path.join(directory, sanitized), tag)
+    except Exception as e:
+        print(f"Error renaming {filename}: {e}")
+        return filepath
+
 def open_folder(folder_path):
     """Open a folder in the file explorer"""
     # Ensure the path is absolute
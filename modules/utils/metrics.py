@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# modules/utils/metrics.py
+# Runtime metrics for YT Media Backup, in Prometheus text format
+
+import threading
+import time
+from contextlib import contextmanager
+
+# Phases range from cache hits to hour-long playlists
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _number(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class Counter:
+    """Value that only goes up, one per combination of label values"""
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def drain(self):
+        """Take the values counted so far, starting again from zero"""
+        with self.lock:
+            values, self.values = self.values, {}
+        return values
+
+    def merge(self, values):
+        """Add values taken by drain() from another process"""
+        with self.lock:
+            for key, value in values.items():
+                self.values[key] = self.values.get(key, 0) + value
+
+    def samples(self):
+        with self.lock:
+            values = dict(self.values)
+        for key, value in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, key)} {_number(value)}'
+
+class Gauge:
+    """Value read at scrape time from a callback
+
+    The callback returns a number, or a dict of {label values tuple: number}
+    when the gauge has labels.
+    """
+    kind = 'gauge'
+
+    def __init__(self, name, documentation, callback, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.labelnames = tuple(labelnames)
+
+    def samples(self):
+        value = self.callback()
+        values = value if isinstance(value, dict) else {(): value}
+        for key, number in sorted(values.items()):
+            yield f'{self.name}{_labels(self.labelnames, key)} {_number(number)}'
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.series = {}  # Label values -> [bucket counts, sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self.lock:
+            series = self.series.get(key)
+            if series is None:
+                series = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[0][i] += 1
+                    break
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe how long the with block takes, in seconds, even if it raises"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def drain(self):
+        """Take the observations so far, starting again from none"""
+        with self.lock:
+            series, self.series = self.series, {}
+        return series
+
+    def merge(self, series):
+        """Add observations taken by drain() from another process"""
+        with self.lock:
+            for key, (counts, total, count) in series.items():
+                mine = self.series.get(key)
+                if mine is None:
+                    mine = self.series[key] = [[0] * len(self.buckets), 0.0, 0]
+                mine[0] = [a + b for a, b in zip(mine[0], counts)]
+                mine[1] += total
+                mine[2] += count
+
+    def samples(self):
+        with self.lock:
+            series = {key: (list(counts), total, count) for key, (counts, total, count) in self.series.items()}
+        for key, (counts, total, count) in sorted(series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                yield f'{self.name}_bucket{_labels(self.labelnames, key, [("le", _number(bound))])} {cumulative}'
+            yield f'{self.name}_sum{_labels(self.labelnames, key)} {_number(total)}'
+            yield f'{self.name}_count{_labels(self.labelnames, key)} {count}'
+
+class MetricsRegistry:
+    """The set of metrics exposed at /api/metrics"""
+    def __init__(self):
+        self.metrics = {}
+        self.lock = threading.Lock()
+
+    def _register(self, metric):
+        with self.lock:
+            # Registering a name again (a module imported twice) keeps the first one
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, callback, labelnames=()):
+        return self._register(Gauge(name, documentation, callback, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def drain(self):
+        """Counter and histogram data recorded so far, reset to empty, for merge() in another process
+
+        Download worker processes send theirs to the parent after each job.
+        """
+        with self.lock:
+            metrics = list(self.metrics.values())
+        return {metric.name: metric.drain() for metric in metrics if hasattr(metric, 'drain')}
+
+    def merge(self, drained):
+        """Add the data drain() returned in another process"""
+        for name, data in drained.items():
+            with self.lock:
+                metric = self.metrics.get(name)
+            if metric is not None and hasattr(metric, 'merge'):
+                metric.merge(data)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self.lock:
+            metrics = list(self.metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f'# HELP {metric.name} {_escape(metric.documentation)}')
+            lines.append(f'# TYPE {metric.name} {metric.kind}')
+            try:
+                lines.extend(metric.samples())
+            except Exception as e:
+                # One failing gauge callback must not break the whole scrape
+                lines.append(f'# Error reading {metric.name}: {_escape(e)}')
+        return '\n'.join(lines) + '\n'
+
+# Shared registry and the metrics the download code reports into
+metrics = MetricsRegistry()
+
+PHASE_SECONDS = metrics.histogram(
+    'ytmb_phase_duration_seconds',
+    'Time spent in each phase of a download: video_info, extract, resolve, download, transcode_wait, sanitize',
+    ('phase',))
+POSTPROCESSOR_SECONDS = metrics.histogram(
+    'ytmb_postprocessor_duration_seconds', 'Time spent in each yt-dlp post-processor run', ('postprocessor',))
+JOB_SECONDS = metrics.histogram(
+    'ytmb_job_duration_seconds', 'Time from a job starting to it finishing', ('download_type',))
+DOWNLOADED_BYTES = metrics.counter('ytmb_downloaded_bytes_total', 'Bytes received by downloads')
+FILES = metrics.counter('ytmb_files_total', 'Playlist entries and videos by outcome', ('result',))
+RETRIES = metrics.counter('ytmb_retries_total', 'Entry download attempts retried after a failure')
+ERRORS = metrics.counter('ytmb_errors_total', 'Errors by where they happened', ('phase',))
+JOBS = metrics.counter('ytmb_jobs_total', 'Finished jobs by final status', ('status',))
+PRERESOLVED = metrics.counter(
+    'ytmb_preresolved_entries_total',
+    'Playlist entries resolved ahead of their download: ready, waited (still resolving), refreshed (expired), failed',
+    ('result',))
+
+class PostProcessorTimer:
+    """yt-dlp postprocessor hook feeding POSTPROCESSOR_SECONDS
+
+    yt-dlp reports 'started' and 'finished' for every run of a
+    post-processor, on the thread doing the run.
+    """
+    def __init__(self):
+        self.started = {}
+        self.lock = threading.Lock()
+
+    def __call__(self, d):
+        key = (threading.get_ident(), d.get('postprocessor'))
+        if d.get('status') == 'started':
+            with self.lock:
+                self.started[key] = time.perf_counter()
+        elif d.get('status') == 'finished':
+            with self.lock:
+                start = self.started.pop(key, None)
+            if start is not None:
+                POSTPROCESSOR_SECONDS.observe(time.perf_counter() - start, postprocessor=d.get('postprocessor'))
+
+# Passed as postprocessor_hooks to every YoutubeDL that post-processes
+postprocessor_timer = PostProcessorTimer()
+
+EXTRACTIONS = metrics.counter('ytmb_extractions_total', 'yt-dlp extractor runs (extract_info calls, nested ones included)')
+
+# Serializes the read-modify-write of a job's extraction count
+_extractions_lock = threading.Lock()
+
+def count_extractions(ydl, state=None):
+    """Count every extractor run ydl makes in EXTRACTIONS and state['extractions']
+
+    yt-dlp resolves URL results (flat playlist entries, redirects) by
+    calling its own extract_info again, so wrapping it on the instance
+    also counts the extractions done inside process_ie_result and
+    download. Returns ydl.
+    """
+    extract_info = ydl.extract_info
+
+    def counted(*args, **kwargs):
+        EXTRACTIONS.inc()
+        if state is not None:
+            with _extractions_lock:
+                state['extractions'] = state.get('extractions', 0) + 1
+        return extract_info(*args, **kwargs)
+
+    ydl.extract_info = counted
+    return ydl
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# modules/utils/server.py
+# WSGI servers for running YT Media Backup headless
+
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.serving import BaseWSGIServer, WSGIRequestHandler
+
+try:
+    import waitress
+except ImportError:
+    waitress = None
+
+class PooledRequestHandler(WSGIRequestHandler):
+    # One request per connection: a kept-alive idle connection would hold
+    # one of the pool's threads for as long as the client keeps it open
+    protocol_version = 'HTTP/1.0'
+
+class PooledWSGIServer(BaseWSGIServer):
+    """Werkzeug server handing each connection to a fixed pool of threads
+
+    Unlike the development server, which starts a thread per request with
+    no upper bound, at most `threads` requests run at once and the rest
+    wait their turn, so a crowd of polling clients cannot exhaust the
+    machine. Long-lived responses (/api/events) each hold a thread.
+    """
+    multithread = True
+
+    def __init__(self, host, port, app, threads):
+        super().__init__(host, port, app, handler=PooledRequestHandler)
+        self.threads = threads
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='http')
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._process_request, request, client_address)
+
+    def _process_request(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False)
+
+class WaitressServer:
+    """waitress behind the same serve_forever()/server_close() interface
+
+    waitress waits on idle connections without a thread and only uses its
+    threads to run requests, so it copes better with many clients.
+    """
+    def __init__(self, host, port, app, threads):
+        self.server = waitress.create_server(app, host=host, port=port, threads=threads)
+        self.server_port = self.server.effective_port
+        self.threads = threads
+
+    def serve_forever(self):
+        # Returns when interrupted by KeyboardInterrupt
+        self.server.run()
+
+    def server_close(self):
+        self.server.close()
+
+SERVERS = ('auto', 'waitress', 'builtin', 'asyncio')
+
+def make_daemon_server(app, host, port, threads, server='auto', async_routes=()):
+    """Create the server for daemon mode: waitress when installed, or PooledWSGIServer
+
+    server forces one of them: 'waitress' or 'builtin', or picks the
+    asyncio server, which serves async_routes on its event loop and the
+    rest of the app on `threads` threads.
+    """
+    if server == 'asyncio':
+        from modules.utils.async_server import AsyncHTTPServer
+        return AsyncHTTPServer(host, port, app, threads, async_routes)
+    if server == 'waitress' and waitress is None:
+        raise RuntimeError('waitress is not installed (pip install waitress)')
+    if server in ('auto', 'waitress') and waitress is not None:
+        return WaitressServer(host, port, app, threads)
+    return PooledWSGIServer(host, port, app, threads)
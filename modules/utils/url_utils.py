@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# modules/utils/url_utils.py
+# URL helpers for YT Media Backup
+
+import re
+from urllib.parse import urlsplit, parse_qs
+
+# YouTube hosts we know how to canonicalize
+YOUTUBE_HOSTS = ('youtube.com', 'www.youtube.com', 'm.youtube.com', 'music.youtube.com', 'youtu.be')
+
+# Video and playlist IDs as YouTube issues them
+VIDEO_ID_RE = re.compile(r'^[\w-]{11}$')
+PLAYLIST_ID_RE = re.compile(r'^[\w-]{2,}$')
+
+def canonical_media_id(url):
+    """Return a stable key for the media a URL points at
+
+    YouTube URLs become 'youtube:video:<id>', 'youtube:playlist:<id>' or
+    'youtube:video:<id>:playlist:<id>' whatever form they were pasted in.
+    Other URLs fall back to the URL without fragment and trailing slash.
+    Returns None for text that is not an http(s) URL.
+    """
+    url = (url or '').strip()
+    if not url or any(ch.isspace() for ch in url):
+        return None
+
+    if '://' not in url:
+        url = 'https://' + url
+
+    parts = urlsplit(url)
+    if parts.scheme not in ('http', 'https') or not parts.netloc:
+        return None
+
+    host = parts.netloc.lower()
+    # A bare word is not a host name, even with https:// put in front
+    hostname = parts.hostname or ''
+    if '.' not in hostname and ':' not in hostname and hostname != 'localhost':
+        return None
+    
+    if host in YOUTUBE_HOSTS:
+        query = parse_qs(parts.query)
+        video_id = None
+        playlist_id = None
+
+        # youtu.be/<id>, /shorts/<id>, /live/<id> and /embed/<id> carry the ID in the path
+        path = parts.path.strip('/').split('/')
+        if host == 'youtu.be' and path[0]:
+            video_id = path[0]
+        elif len(path) >= 2 and path[0] in ('shorts', 'live', 'embed'):
+            video_id = path[1]
+        elif query.get('v'):
+            video_id = query['v'][0]
+
+        if query.get('list'):
+            playlist_id = query['list'][0]
+
+        if video_id and not VIDEO_ID_RE.match(video_id):
+            video_id = None
+        if playlist_id and not PLAYLIST_ID_RE.match(playlist_id):
+            playlist_id = None
+
+        if video_id and playlist_id:
+            return f'youtube:video:{video_id}:playlist:{playlist_id}'
+        if video_id:
+            return f'youtube:video:{video_id}'
+        if playlist_id:
+            return f'youtube:playlist:{playlist_id}'
+
+    # Anything else is keyed by the URL itself
+    return f'{parts.scheme}://{host}{parts.path.rstrip("/")}' + (f'?{parts.query}' if parts.query else '')